@@ -0,0 +1,87 @@
+"""Measures the cold start of pybart: importing the API, and the first conversion, in new processes.
+
+Usage:
+    python benchmarks/import_time.py [--runs N] [--spacy] [--output results.json]
+
+Each run is a new interpreter (as a short lived worker, or a serverless handler, would be), which times:
+    import: import pybart.api.
+    first_conversion: converting the first (well formed) sentence of the corpus (building the conversion plan on the way).
+    second_conversion: converting it again, for the cost of a conversion once everything is loaded.
+    spacy_converter (with --spacy): making a Converter and converting a doc of that sentence with it (spaCy is imported before,
+        by making the doc, as in throughput.py).
+    process: the whole process, from its start to its exit, as the parent process sees it.
+The minimum and median (in milliseconds) of each over the runs are printed as JSON (and written to --output).
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).parent.parent.absolute()
+
+# the code of a run, it prints the timings (in seconds) as JSON
+RUN_CODE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+timings = dict()
+
+start = time.perf_counter()
+import pybart.api
+timings["import"] = time.perf_counter() - start
+
+# (see throughput.py, which imports the API as well)
+sys.path.insert(0, {benchmarks!r})
+import throughput
+blocks, sentences = throughput.load_corpus({conllu_file!r}, 1)
+for name in ("first_conversion", "second_conversion"):
+    start = time.perf_counter()
+    pybart.api.convert_bart_conllu(blocks[0])
+    timings[name] = time.perf_counter() - start
+
+if {spacy}:
+    doc, = throughput.make_spacy(blocks[:1], sentences[:1])
+    start = time.perf_counter()
+    pybart.api.Converter()(doc)
+    timings["spacy_converter"] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def run_once(conllu_file, with_spacy):
+    code = RUN_CODE.format(root=str(ROOT), benchmarks=str(ROOT / "benchmarks"), conllu_file=conllu_file, spacy=with_spacy)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    timings = json.loads(out)
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--conllu-file", default=str(ROOT / "tests" / "handcrafted_tests.conllu"))
+    arg_parser.add_argument("--runs", type=int, default=10)
+    arg_parser.add_argument("--spacy", action="store_true", help="time a Converter (the spaCy pipeline component) as well")
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+    
+    runs = [run_once(args.conllu_file, args.spacy) for _ in range(args.runs)]
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "runs": args.runs,
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": {name: {"min_ms": 1000 * min(run[name] for run in runs), "median_ms": 1000 * statistics.median(run[name] for run in runs)}
+                    for name in runs[0]},
+    }
+    
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
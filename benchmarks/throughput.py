@@ -0,0 +1,255 @@
+"""Measures the conversion throughput, per sentence latency and peak memory of the API entry points.
+
+Usage:
+    python benchmarks/throughput.py [--repeat N] [--rounds N] [--latency-sentences N]
+                                    [--entry-points conllu odin tacred spacy] [--configs eud eudpp bart query_mode]
+                                    [--output results.json] [--baseline baseline.json] [--tolerance 0.1]
+
+Each entry point (convert_bart_conllu, convert_bart_odin, convert_bart_tacred and the spaCy Converter,
+over a blank pipeline whose parse is set by hand, so no model is needed) converts the handcrafted tests corpus
+(its well formed trees), repeated --repeat times, under each configuration:
+    throughput: sentences (and tokens) per second, of the best of --rounds runs.
+    latency: percentiles of the time it takes to convert a single sentence (that is, an input of one sentence).
+    peak memory: the peak of the memory allocated during a run (traced in a separate run, as tracing slows it down).
+The results are printed as JSON (and written to --output). Given a --baseline (a previous --output),
+the throughput of each case is compared to it, and the exit code is 1 if any case is slower than the tolerance allows.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from pybart import api
+from pybart.conllu_wrapper import parse_conllu
+
+CONFIGS = {
+    "eud": dict(enhanced_plus_plus=False, enhanced_extra=False),
+    "eudpp": dict(enhanced_extra=False),
+    "bart": dict(),
+    "query_mode": dict(query_mode=True),
+}
+
+
+def load_corpus(conllu_file, repeat):
+    """
+    returns:
+        (list(str)) The CoNLL-U blocks of the corpus' well formed trees (no copy nodes, every head is another token of the sentence), repeated.
+        (list(list(tuple))) The (form, lemma, upos, xpos, head, deprel) of each token of each of these sentences.
+    """
+    with open(conllu_file) as f:
+        blocks = f.read().strip().split("\n\n")
+    trees = []
+    for block in blocks:
+        (sentence,), _ = parse_conllu(block)
+        if sorted(sentence) != list(range(len(sentence))) or \
+                any(token.get_conllu_field("head") not in sentence or token.get_conllu_field("head") == i for i, token in sentence.items() if i):
+            continue
+        lines = [line for line in block.strip().split("\n") if not line.startswith("#")]
+        trees.append((lines, [tuple(sentence[i].get_conllu_field(field) for field in ("form", "lemma", "upos", "xpos", "head", "deprel")) for i in range(1, len(sentence))]))
+    trees = trees * repeat
+    return ["\n".join(lines) for lines, _ in trees], [tokens for _, tokens in trees]
+
+
+# ------------------------------------------ entry points ------------------------------------------ #
+# each one makes its input of the given sentences (outside the timing), and converts it
+
+
+def make_conllu(blocks, sentences):
+    return "\n\n".join(blocks) + "\n"
+
+
+def run_conllu(conllu_text, config):
+    return api.convert_bart_conllu(conllu_text, **config)
+
+
+def make_odin(blocks, sentences):
+    odin_sentences = []
+    texts = []
+    offset = 0
+    for tokens in sentences:
+        starts, ends = [], []
+        for form, *_ in tokens:
+            starts.append(offset)
+            offset += len(form)
+            ends.append(offset)
+            offset += 1
+        texts.append(" ".join(form for form, *_ in tokens))
+        odin_sentences.append({
+            "words": [form for form, *_ in tokens], "lemmas": [lemma for _, lemma, *_ in tokens], "tags": [xpos for _, _, _, xpos, _, _ in tokens],
+            "startOffsets": starts, "endOffsets": ends,
+            "graphs": {"universal-basic": {
+                "edges": [{"source": head - 1, "destination": i, "relation": deprel} for i, (_, _, _, _, head, deprel) in enumerate(tokens) if head != 0],
+                "roots": [i for i, (_, _, _, _, head, _) in enumerate(tokens) if head == 0]}}})
+    return {"documents": {"doc": {"id": "doc", "text": " ".join(texts), "sentences": odin_sentences}}, "mentions": []}
+
+
+def run_odin(odin_json, config):
+    return api.convert_bart_odin(odin_json, **config)
+
+
+def make_tacred(blocks, sentences):
+    return [{"token": [form for form, *_ in tokens], "stanford_pos": [xpos for _, _, _, xpos, _, _ in tokens],
+             "stanford_head": [head for _, _, _, _, head, _ in tokens], "stanford_deprel": [deprel for *_, deprel in tokens]}
+            for tokens in sentences]
+
+
+def run_tacred(tacred_json, config):
+    return api.convert_bart_tacred(tacred_json, **config)
+
+
+# the sentences of each spaCy doc (so a doc is about the size of a paragraph)
+SPACY_DOC_SENTENCES = 10
+
+
+def make_spacy(blocks, sentences):
+    import numpy
+    import spacy
+    from spacy import attrs
+    
+    nlp = getattr(make_spacy, "nlp", None) or spacy.blank("en")
+    make_spacy.nlp = nlp
+    docs = []
+    for start in range(0, len(sentences), SPACY_DOC_SENTENCES):
+        doc_sentences = sentences[start:start + SPACY_DOC_SENTENCES]
+        doc = spacy.tokens.Doc(nlp.vocab, words=[form for tokens in doc_sentences for form, *_ in tokens])
+        # heads are relative to the token (as unsigned), and the root is its own head
+        rows = [[((head - i - 1) if head else 0) % 2 ** 64, nlp.vocab.strings.add("ROOT" if head == 0 else deprel), nlp.vocab.strings.add(xpos),
+                 nlp.vocab.strings.add(lemma)]
+                for tokens in doc_sentences for i, (_, lemma, _, xpos, head, deprel) in enumerate(tokens)]
+        doc.from_array([attrs.HEAD, attrs.DEP, attrs.TAG, attrs.LEMMA], numpy.array(rows, dtype="uint64"))
+        docs.append(doc)
+    return docs
+
+
+def run_spacy(docs, config):
+    converter = api.Converter(**config)
+    return [converter(doc) for doc in docs]
+
+
+ENTRY_POINTS = {
+    "conllu": (make_conllu, run_conllu),
+    "odin": (make_odin, run_odin),
+    "tacred": (make_tacred, run_tacred),
+    "spacy": (make_spacy, run_spacy),
+}
+
+
+# ------------------------------------------ measuring ------------------------------------------ #
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def measure(make_input, run, config, blocks, sentences, rounds, latency_sentences):
+    n_tokens = sum(len(tokens) for tokens in sentences)
+    times = []
+    for _ in range(rounds):
+        # a fresh input for every run, as some conversions change their input (e.g. the odin json)
+        round_input = make_input(blocks, sentences)
+        start = time.perf_counter()
+        run(round_input, config)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    
+    latencies = []
+    for block, tokens in zip(blocks[:latency_sentences], sentences[:latency_sentences]):
+        sentence_input = make_input([block], [tokens])
+        start = time.perf_counter()
+        run(sentence_input, config)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    
+    round_input = make_input(blocks, sentences)
+    tracemalloc.start()
+    run(round_input, config)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "sentences": len(sentences),
+        "tokens": n_tokens,
+        "seconds": best,
+        "sentences_per_second": len(sentences) / best,
+        "tokens_per_second": n_tokens / best,
+        "latency_ms": {name: 1000 * percentile(latencies, q) for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))} if latencies else None,
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Purpose: compares the throughput of each case to the baseline's.
+    
+    returns:
+        (list(str)) A line per case found in both (the throughput ratio).
+        (list(str)) The cases which are slower than the tolerance allows.
+    """
+    lines = []
+    regressions = []
+    for case, result in results["results"].items():
+        if case not in baseline["results"]:
+            continue
+        if result["sentences"] != baseline["results"][case]["sentences"]:
+            # a different corpus size (--repeat) takes a different share of warm up
+            lines.append(f"{case:<20} (not comparable: {result['sentences']} sentences, {baseline['results'][case]['sentences']} in the baseline)")
+            continue
+        ratio = result["sentences_per_second"] / baseline["results"][case]["sentences_per_second"]
+        lines.append(f"{case:<20} {ratio:>6.2f}x")
+        if ratio < 1 - tolerance:
+            regressions.append(case)
+    return lines, regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--conllu-file", default=str(pathlib.Path(__file__).parent.parent / "tests" / "handcrafted_tests.conllu"))
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    arg_parser.add_argument("--rounds", type=int, default=3)
+    arg_parser.add_argument("--latency-sentences", type=int, default=200)
+    arg_parser.add_argument("--entry-points", nargs="+", choices=list(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    arg_parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    arg_parser.add_argument("--output")
+    arg_parser.add_argument("--baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.1)
+    args = arg_parser.parse_args()
+    
+    blocks, sentences = load_corpus(args.conllu_file, args.repeat)
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "repeat": args.repeat, "rounds": args.rounds,
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": dict(),
+        "skipped": dict(),
+    }
+    for entry_point in args.entry_points:
+        make_input, run = ENTRY_POINTS[entry_point]
+        for config_name in args.configs:
+            try:
+                results["results"][f"{entry_point}/{config_name}"] = measure(
+                    make_input, run, CONFIGS[config_name], blocks, sentences, args.rounds, args.latency_sentences)
+            except ImportError as e:
+                # e.g. spaCy is not installed
+                results["skipped"][entry_point] = str(e)
+                break
+    
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.tolerance)
+        print("\nthroughput compared to the baseline:", *lines, sep="\n", file=sys.stderr)
+        if regressions:
+            print(f"slower than the baseline (by more than {args.tolerance:.0%}):", ", ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
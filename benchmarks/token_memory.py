@@ -0,0 +1,54 @@
+"""Measures the memory the sentence graphs take, in bytes per token.
+
+Usage:
+    python benchmarks/token_memory.py [conllu_file] [--repeat N]
+
+By default the handcrafted tests corpus is used (repeated, to get a big enough batch).
+Both the parsed (basic) graphs and the converted (BART) graphs are measured.
+"""
+import argparse
+import gc
+import math
+import pathlib
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from pybart.conllu_wrapper import parse_conllu
+from pybart.converter import convert, ConvsCanceler
+
+
+def measure(text):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    parsed, _ = parse_conllu(text)
+    parsed_bytes = tracemalloc.get_traced_memory()[0] - before
+    n_tokens = sum(len(sentence) - 1 for sentence in parsed)
+    
+    convert(parsed, True, True, True, math.inf, False, False, False, False, False, ConvsCanceler())
+    gc.collect()
+    converted_bytes = tracemalloc.get_traced_memory()[0] - before
+    n_nodes = sum(len(sentence) - 1 for sentence in parsed)
+    tracemalloc.stop()
+    return n_tokens, parsed_bytes / n_tokens, n_nodes, converted_bytes / n_nodes
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("conllu_file", nargs="?", default=str(pathlib.Path(__file__).parent.parent / "tests" / "handcrafted_tests.conllu"))
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+    
+    with open(args.conllu_file) as f:
+        text = "\n\n".join([f.read().strip()] * args.repeat)
+    
+    n_tokens, parsed_per_token, n_nodes, converted_per_node = measure(text)
+    print(f"tokens: {n_tokens}")
+    print(f"parsed (basic) graphs: {parsed_per_token:.0f} bytes/token")
+    print(f"converted (BART) graphs: {converted_per_node:.0f} bytes/node ({n_nodes} nodes, copy nodes included)")
+
+
+if __name__ == "__main__":
+    main()
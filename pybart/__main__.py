@@ -0,0 +1,181 @@
+"""Converts CoNLL-U, Odin JSON and TACRED files to BART, in batches, over worker processes.
+
+The output is written in the order of the input, and the progress (with the sentences per second) on stderr.
+
+examples:
+  python -m pybart in.conllu out.conllu --workers 8
+  python -m pybart in.conllu out.conllu --sentences 5000000 5001000
+  python -m pybart --format odin-lines docs.jsonl out.jsonl --workers 4
+  python -m pybart --format tacred train.json train.bart.jsonl --label-ids labels.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from . import api
+from .cache import ConversionCache
+from .conllu_wrapper import iter_tacred
+from .converter import ConvsCanceler
+
+# the input formats: a CoNLL-U file, an odin json (of a document, or of documents), a document per line,
+#   and TACRED examples (a JSON list, or an example per line)
+FORMATS = ("conllu", "odin", "odin-lines", "tacred")
+# the least time (in seconds) between two progress reports
+PROGRESS_INTERVAL = 2.0
+
+
+class Progress(object):
+    """Purpose: counts the converted sentences, and reports them (with their rate) on stderr, at most once an interval."""
+    def __init__(self, out_file=None, interval=PROGRESS_INTERVAL, quiet=False):
+        # (stderr by default, as it is at the time of the reports)
+        self.out_file = out_file
+        self.interval = interval
+        self.quiet = quiet
+        self.sentences = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+    
+    def __call__(self, n_sentences):
+        self.sentences += n_sentences
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self._report("converted", now)
+    
+    def _report(self, prefix, now):
+        if self.quiet:
+            return
+        elapsed = now - self.start
+        rate = self.sentences / elapsed if elapsed > 0 else 0.0
+        print(f"{prefix} {self.sentences} sentences in {elapsed:.1f}s ({rate:.1f} sentences/s)", file=self.out_file or sys.stderr, flush=True)
+    
+    def finish(self):
+        self._report("done:", time.perf_counter())
+
+
+def get_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog="python -m pybart", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("input", nargs="?", help="the input file, or - for stdin (with a single worker)")
+    arg_parser.add_argument("output", nargs="?", default="-", help="the output file, or - for stdout (the default)")
+    arg_parser.add_argument("--format", choices=FORMATS, default="conllu", help="the input format (default: conllu)")
+    arg_parser.add_argument("--workers", type=int, default=1, help="the number of worker processes (default: 1)")
+    arg_parser.add_argument("--batch-size", type=int,
+                            help="the sentences (odin-lines: documents, tacred: examples) per batch, each batch is a worker task")
+    arg_parser.add_argument("--sentences", type=int, nargs=2, metavar=("START", "END"),
+                            help="conllu: convert only the sentences START to END (excluded), read through the file's offsets index")
+    arg_parser.add_argument("--preserve-comments", action="store_true", help="conllu: keep the comments of the sentences")
+    arg_parser.add_argument("--label-ids", metavar="PATH",
+                            help="tacred: a JSON file of the ids of the labels (of bart_edges), read if it exists, and written with the new labels")
+    arg_parser.add_argument("--quiet", action="store_true", help="do not report the progress")
+    
+    conversion = arg_parser.add_argument_group("conversion options (see converter.convert)")
+    conversion.add_argument("--no-enhance-ud", dest="enhance_ud", action="store_false")
+    conversion.add_argument("--no-enhanced-plus-plus", dest="enhanced_plus_plus", action="store_false")
+    conversion.add_argument("--no-enhanced-extra", dest="enhanced_extra", action="store_false")
+    conversion.add_argument("--conv-iterations", type=int, help="the most conversion passes over a sentence (default: till it converges)")
+    conversion.add_argument("--remove-eud-info", action="store_true")
+    conversion.add_argument("--remove-extra-info", action="store_true")
+    conversion.add_argument("--remove-node-adding-conversions", action="store_true")
+    conversion.add_argument("--remove-unc", action="store_true")
+    conversion.add_argument("--query-mode", action="store_true")
+    conversion.add_argument("--cancel", nargs="+", default=[], metavar="CONVERSION", help="conversions not to run (see --list-conversions)")
+    conversion.add_argument("--cancel-prefix", nargs="+", default=[], metavar="PREFIX", help="do not run the conversions of these name prefixes")
+    conversion.add_argument("--list-conversions", action="store_true", help="list the names of the conversions, and exit")
+    conversion.add_argument("--cache-size", type=int, help="keep this many converted sentences in an in-memory cache (see cache.py)")
+    conversion.add_argument("--cache-path", help="an on-disk (sqlite) cache of converted sentences, shared by runs and processes")
+    return arg_parser
+
+
+def get_convert_kwargs(args):
+    """Purpose: the arguments of the api calls (the conversion options and the cache) which the parsed flags give."""
+    funcs_to_cancel = ConvsCanceler()
+    if args.cancel:
+        funcs_to_cancel.update_funcs(list(args.cancel))
+    for prefix in args.cancel_prefix:
+        funcs_to_cancel.update_funcs_by_prefix(prefix)
+    cache = None
+    if (args.cache_size is not None) or (args.cache_path is not None):
+        cache = ConversionCache(max_size=args.cache_size if args.cache_size is not None else 10000, path=args.cache_path)
+    return dict(enhance_ud=args.enhance_ud, enhanced_plus_plus=args.enhanced_plus_plus, enhanced_extra=args.enhanced_extra,
+                conv_iterations=args.conv_iterations if args.conv_iterations is not None else math.inf,
+                remove_eud_info=args.remove_eud_info, remove_extra_info=args.remove_extra_info,
+                remove_node_adding_conversions=args.remove_node_adding_conversions, remove_unc=args.remove_unc,
+                query_mode=args.query_mode, funcs_to_cancel=funcs_to_cancel, cache=cache)
+
+
+def convert_files(args, in_file, out_file, progress):
+    kwargs = get_convert_kwargs(args)
+    batch_kwargs = dict(batch_size=args.batch_size) if args.batch_size is not None else dict()
+    
+    if args.format == "conllu":
+        if in_file is None:
+            api.convert_bart_conllu_file(args.input, out_file, preserve_comments=args.preserve_comments, sentences=args.sentences,
+                                         workers=args.workers, progress=progress, **batch_kwargs, **kwargs)
+        else:
+            api.convert_bart_conllu_stream(in_file, out_file, preserve_comments=args.preserve_comments, progress=progress, **batch_kwargs, **kwargs)
+    
+    elif args.format == "odin":
+        converted = api.convert_bart_odin(json.load(in_file), workers=args.workers, **kwargs)
+        json.dump(converted, out_file)
+        out_file.write("\n")
+        docs = converted["documents"].values() if "documents" in converted else [converted]
+        progress(sum(len(doc["sentences"]) for doc in docs))
+    
+    elif args.format == "odin-lines":
+        api.convert_bart_odin_stream(in_file, out_file, workers=args.workers, progress=progress, **batch_kwargs, **kwargs)
+    
+    elif args.format == "tacred":
+        label_ids = dict()
+        if args.label_ids and os.path.exists(args.label_ids):
+            with open(args.label_ids) as f:
+                label_ids = json.load(f)
+        for example in api.convert_bart_tacred_stream(iter_tacred(in_file), workers=args.workers, label_ids=label_ids, **batch_kwargs, **kwargs):
+            out_file.write(json.dumps(example) + "\n")
+            progress(1)
+        if args.label_ids:
+            with open(args.label_ids, "w") as f:
+                json.dump(label_ids, f)
+
+
+def main(argv=None):
+    arg_parser = get_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if args.list_conversions:
+        print("\n".join(sorted(api.get_conversion_names())))
+        return 0
+    if args.input is None:
+        arg_parser.error("the input file is required")
+    unknown = set(args.cancel) - api.get_conversion_names()
+    if unknown:
+        arg_parser.error(f"unknown conversions to cancel: {', '.join(sorted(unknown))} (see --list-conversions)")
+    if args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+    if (args.sentences is not None) and ((args.format != "conllu") or (args.input == "-")):
+        arg_parser.error("--sentences is for a conllu input file (not stdin)")
+    if (args.input == "-") and (args.workers > 1) and (args.format == "conllu"):
+        arg_parser.error("a conllu input from stdin is converted by a single worker, give a file for more")
+    
+    progress = Progress(quiet=args.quiet)
+    # a conllu file is read through its offsets index (by the workers), any other input is read here
+    in_file = None
+    if args.input == "-":
+        in_file = sys.stdin
+    elif args.format != "conllu":
+        in_file = open(args.input, encoding="utf-8")
+    out_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        convert_files(args, in_file, out_file, progress)
+    finally:
+        if (in_file is not None) and (in_file is not sys.stdin):
+            in_file.close()
+        if out_file is not sys.stdout:
+            out_file.close()
+    progress.finish()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,321 @@
+import json
 import math
+from itertools import islice, accumulate
 
-from .conllu_wrapper import parse_conllu, serialize_conllu, parse_odin, conllu_to_odin, parsed_tacred_json
-from .converter import convert, ConvsCanceler
+from .conllu_wrapper import parse_conllu, iter_conllu, serialize_conllu, write_conllu, parse_odin, conllu_to_odin, parsed_tacred_json
+from .converter import convert, ConvsCanceler, get_conversion_plan
+from .stats import ConversionStats
+from .incremental import apply_basic_edits, get_changed_nodes, reconvert_sentence
+from .parallel import parallel_convert_conllu, parallel_convert_odin, parallel_convert_odin_docs, map_batches, convert_tacred_edges_chunk, parallel_convert_tacred, relabel_sentences, doc_iid_mappings, \
+    convert_conllu_range_chunk, relabel_conllu
+from .conllu_index import ConlluFile
 
 
-def convert_bart_conllu(conllu_text, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, preserve_comments=False, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler()):
+def convert_bart_conllu(conllu_text, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, preserve_comments=False, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), workers=1, cache=None):
+    if workers > 1:
+        return parallel_convert_conllu(conllu_text, preserve_comments, (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache), workers)
     parsed, all_comments = parse_conllu(conllu_text)
-    converted, _ = convert(parsed, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+    converted, _ = convert(parsed, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache=cache)
     return serialize_conllu(converted, all_comments, preserve_comments)
 
 
-def _convert_bart_odin_sent(doc, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel):
+def convert_bart_conllu_stream(in_file, out_file, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, preserve_comments=False, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), batch_size=1000, cache=None, progress=None):
+    """Purpose: converts a CoNLL-U file to another, reading, converting and writing a batch of sentences at a time,
+        so the memory in use does not depend on the size of the file.
+    
+    The output is that of convert_bart_conllu, except for the alternative ids (#iid) numbering,
+    which is by batch (and yet unique over the whole file).
+    
+    Args:
+        (iterable(str)) The input file (or any other iterable of lines).
+        (file) The output (text) file.
+        (int) The number of sentences per batch.
+        (function) Called with the number of sentences of each batch, once it was written, or None.
+        (the rest as in convert_bart_conllu)
+    """
+    sentences = iter_conllu(in_file)
+    first_iid = 0
+    is_first_batch = True
+    while True:
+        batch = list(islice(sentences, batch_size))
+        if not batch:
+            break
+        parsed, all_comments = zip(*batch)
+        iid_log = []
+        converted, _ = convert(list(parsed), enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, iid_log=iid_log, cache=cache)
+        
+        # continue the alternative ids numbering of the previous batches
+        batch_iids = max((last for (_, _, _, last) in iid_log), default=0)
+        if first_iid and batch_iids:
+            relabel_sentences([converted[i] for i in sorted({i for (_, i, _, _) in iid_log})], {iid: first_iid + iid for iid in range(batch_iids)})
+        first_iid += batch_iids
+        
+        if not is_first_batch:
+            out_file.write("\n")
+        write_conllu(out_file, converted, all_comments, preserve_comments)
+        is_first_batch = False
+        if progress is not None:
+            progress(len(converted))
+
+
+def convert_bart_conllu_file(in_path, out_file, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, preserve_comments=False, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), sentences=None, batch_size=1000, workers=1, cache=None, progress=None):
+    """Purpose: converts a CoNLL-U file (or a range of its sentences), a batch of sentences at a time,
+        through the file's sentence offsets index (see conllu_index.ConlluFile).
+    
+    Each batch is read (through mmap) and parsed by the worker which converts it, and only the batches of the range
+    are read, so neither this process nor any worker reads the file as a whole (but for indexing it, once).
+    The output is that of convert_bart_conllu_stream over the same sentences, with the same batch size.
+    
+    Args:
+        (str) The input CoNLL-U file.
+        (file) The output (text) file.
+        (tuple(int, int)) The (start, end) range of the sentences to convert (by index, the end excluded), or None for all.
+        (int) The number of sentences per batch.
+        (int) The number of worker processes.
+        (function) Called with the number of sentences of each batch, once it was written, or None.
+        (the rest as in convert_bart_conllu)
+    """
+    conllu_file = ConlluFile(in_path)
+    start, end, _ = slice(*(sentences or (None, None))).indices(len(conllu_file))
+    # (the number of sentences of a shard comes last, and is not used by the workers)
+    shards = [(in_path,) + conllu_file.get_byte_range(batch_start, min(batch_start + batch_size, end)) + (preserve_comments, min(batch_size, end - batch_start))
+              for batch_start in range(start, end, batch_size)]
+    convert_args = (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache)
+    
+    first_iid = 0
+    for i, ((shard,), ((text, batch_iids),)) in enumerate(map_batches(convert_conllu_range_chunk, shards, convert_args, workers, 1)):
+        # continue the alternative ids numbering of the previous batches
+        if first_iid and batch_iids:
+            text = relabel_conllu(text, {iid: first_iid + iid for iid in range(batch_iids)})
+        first_iid += batch_iids
+        
+        if i:
+            out_file.write("\n")
+        out_file.write(text)
+        if progress is not None:
+            progress(shard[-1])
+
+
+def _convert_bart_odin_sent(doc, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache=None):
     sents = parse_odin(doc)
-    converted_sents, _ = convert(sents, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+    converted_sents, _ = convert(sents, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache=cache)
     return conllu_to_odin(converted_sents, doc)
 
 
-def convert_bart_odin(odin_json, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler()):
+def convert_bart_odin(odin_json, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), workers=1, cache=None):
+    if workers > 1:
+        return parallel_convert_odin(odin_json, (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache), workers)
+    
     if "documents" in odin_json:
         for doc_key, doc in odin_json["documents"].items():
-            odin_json["documents"][doc_key] = _convert_bart_odin_sent(doc, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+            odin_json["documents"][doc_key] = _convert_bart_odin_sent(doc, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache)
     else:
-        odin_json = _convert_bart_odin_sent(odin_json, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+        odin_json = _convert_bart_odin_sent(odin_json, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache)
     
     return odin_json
 
 
-def convert_bart_tacred(tacred_json, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler()):
+def convert_bart_odin_stream(in_file, out_file, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), workers=1, batch_size=16, cache=None, progress=None):
+    """Purpose: converts a JSON-lines odin dump (a document per line) to another, a document at a time,
+        so the memory in use does not depend on the size of the dump.
+    
+    Each document is converted (and its offsets fixed) on its own, as convert_bart_odin does with the documents of an odin json.
+    
+    Args:
+        (iterable(str)) The input file (or any other iterable of lines).
+        (file) The output (text) file.
+        (int) The number of worker processes.
+        (int) The number of documents per worker task (when workers > 1).
+        (function) Called with the number of sentences of each document, once it was written, or None.
+        (the rest as in convert_bart_conllu)
+    """
+    docs = (json.loads(line) for line in in_file if line.strip())
+    convert_args = (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache)
+    if workers > 1:
+        converted_docs = parallel_convert_odin_docs(docs, convert_args, workers, batch_size)
+    else:
+        converted_docs = (_convert_bart_odin_sent(doc, *convert_args) for doc in docs)
+    
+    for converted_doc in converted_docs:
+        out_file.write(json.dumps(converted_doc) + "\n")
+        if progress is not None:
+            progress(len(converted_doc["sentences"]))
+
+
+def convert_bart_tacred(tacred_json, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), workers=1, cache=None):
+    if workers > 1:
+        return parallel_convert_tacred(tacred_json, (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache), workers)
+    
     sents = parsed_tacred_json(tacred_json)
-    converted_sents, _ = convert(sents, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+    converted_sents, _ = convert(sents, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache=cache)
     
     return converted_sents
 
 
-def convert_spacy_doc(doc, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler()):
-    from .spacy_wrapper import parse_spacy_sent, serialize_spacy_doc
-    parsed_doc = [parse_spacy_sent(sent) for sent in doc.sents]
-    converted, convs_done = convert(parsed_doc, enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
-    return serialize_spacy_doc(doc, converted), parsed_doc, convs_done
+def convert_bart_tacred_stream(examples, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), batch_size=1000, workers=1, label_ids=None, cache=None):
+    """Purpose: converts TACRED examples a batch at a time, into compact (integer) edge lists rather than Token graphs,
+        so the memory in use does not depend on the number of examples.
+    
+    The alternative ids (#iid) of the labels are numbered per example (from 0), as if each example was converted alone.
+    
+    Args:
+        (iterable(dict)) The TACRED examples (e.g. conllu_wrapper.iter_tacred of a JSON or JSON-lines file).
+        (int) The number of examples per batch.
+        (int) The number of worker processes.
+        (dict(str, int)) The ids of the labels, new labels are added to it (with the next free id). A new one by default.
+        (the rest as in convert_bart_conllu)
+    
+    returns:
+        (generator(dict)) Per example, its fields and:
+            bart_edges: the [head, dependent, label id] edges, the tokens are numbered from 0,
+                the new (copy and STATE) nodes after them, and a root head is -1 (see conllu_wrapper.sentence_to_edges).
+            bart_copy_nodes: the token each new node copies, -1 for a STATE node.
+    """
+    label_ids = dict() if label_ids is None else label_ids
+    convert_args = (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, cache)
+    for batch, results in map_batches(convert_tacred_edges_chunk, examples, convert_args, workers, batch_size):
+        for example, (edges, copies) in zip(batch, results):
+            converted_example = dict(example)
+            converted_example["bart_edges"] = [[head, dep, label_ids.setdefault(rel, len(label_ids))] for head, dep, rel in edges]
+            converted_example["bart_copy_nodes"] = copies
+            yield converted_example
+
+
+def convert_spacy_docs(docs, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), stats=None, cache=None):
+    """Purpose: converts a batch of spaCy docs in a single conversion, with the same results as converting each alone.
+    
+    Args:
+        (list(Doc)) The (parsed) docs.
+        (ConversionStats) A collector of per conversion stats (see stats.py), or None.
+        (ConversionCache) A cache of converted sentences (see cache.py), or None.
+        (the rest as in convert_bart_conllu)
+    
+    returns:
+        (list(Doc)) The converted docs (see spacy_wrapper for their extensions).
+    """
+    from .spacy_wrapper import parse_spacy_sent, serialize_spacy_doc, set_conversion_results
+    parsed_docs = [[parse_spacy_sent(sent) for sent in doc.sents] for doc in docs]
+    doc_starts = list(accumulate([0] + [len(parsed_doc) for parsed_doc in parsed_docs[:-1]]))
+    iid_log = []
+    converted, convs_done = convert([sentence for parsed_doc in parsed_docs for sentence in parsed_doc], enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, iid_log=iid_log, stats=stats, cache=cache)
+    
+    # number the alternative ids (#iid) of each doc from 0, as its conversion alone would
+    mappings = doc_iid_mappings(iid_log, doc_starts) if len(docs) > 1 else [None]
+    
+    converted_docs = []
+    for doc, parsed_doc, start, mapping in zip(docs, parsed_docs, doc_starts, mappings):
+        doc_converted = converted[start:start + len(parsed_doc)]
+        if mapping:
+            relabel_sentences(doc_converted, mapping)
+        converted_doc = serialize_spacy_doc(doc, doc_converted)
+        set_conversion_results(converted_doc, doc_converted, convs_done[start:start + len(parsed_doc)])
+        converted_docs.append(converted_doc)
+    return converted_docs
+
+
+def convert_spacy_doc(doc, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), stats=None, cache=None):
+    """
+    returns:
+        (Doc) The converted doc.
+        (list(dict(Token))) The converted graphs of its sentences.
+        (int) The most conversion passes which changed one of its sentences (see doc._.convs_done for each sentence's).
+    """
+    converted_doc, = convert_spacy_docs([doc], enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, stats=stats, cache=cache)
+    return converted_doc, converted_doc._.parsed_doc, max(converted_doc._.convs_done, default=0)
+
+
+def reconvert_bart_sentence(sentence, edits, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), stats=None, cache=None, trace=None):
+    """Purpose: converts a sentence again after edits to its basic tree (e.g. in an annotation tool),
+        with the same results as converting the edited tree from scratch.
+    
+    The sentence is taken as it is, that is, with no CoNLL-U text to parse or write, and nothing but it is converted.
+    With a trace of the sentence's last conversion, only the conversion rule runs which the edits may change run again,
+    and the rest are replayed from the trace (see incremental.reconvert_sentence), so the edges the edits can not reach are
+    not matched again. Without one, the whole sentence is converted again. Edits which leave the tree as it was convert nothing,
+    and with a cache (and no trace), a tree seen before (e.g. once an edit is undone) is not converted again.
+    The alternative ids (#iid) are numbered from 0, as if the sentence was converted alone.
+    
+    Args:
+        (dict(Token)) The (converted or parsed) sentence, which is left as it is.
+        (list(incremental.BasicEdit)) The edits of its words' heads, deprels, forms (or other basic fields), in order.
+        (ConversionStats) A collector of per conversion stats (see stats.py), or None.
+        (ConversionCache) A cache of converted sentences (see cache.py), or None.
+        (incremental.ConversionTrace) The trace of the sentence's last conversion, which is updated to the new one, or None.
+            A trace of another sentence (e.g. a new ConversionTrace) has the sentence converted in full, even with no edits.
+        (the rest as in convert_bart_conllu)
+    
+    returns:
+        (dict(Token)) The converted sentence (the given one if the edits changed nothing).
+        (set) The ids of its nodes which changed (see incremental.get_changed_nodes).
+    
+    Raises:
+        ValueError: (see incremental.apply_basic_edits)
+    """
+    if trace is not None:
+        plan = get_conversion_plan(enhance_ud, enhanced_plus_plus, enhanced_extra, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+        return reconvert_sentence(plan, sentence, edits, conv_iterations, trace, stats)
+    
+    edited = apply_basic_edits(sentence, edits)
+    if edited is None:
+        return sentence, set()
+    (converted,), _ = convert([edited], enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, stats=stats, cache=cache)
+    return converted, get_changed_nodes(sentence, converted)
+
+
+# the results used to be kept on the Converter (of the last doc it converted), so these methods took no doc
+_no_doc_message = "Converter.{method} takes the converted doc, e.g. converter.{method}(doc), " \
+                  "as the results are kept on each doc (not on the converter), see {extension}."
 
 
 class Converter:
-    def __init__(self, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler()):
+    """Purpose: the spaCy pipeline component.
+    
+    Its results are kept on the converted docs, not on the component: token._.parent_list, doc._.parsed_doc (the BART graphs)
+    and doc._.convs_done (the conversion passes which changed each sentence). So it can run in nlp.pipe,
+    which converts a batch of docs at once (see pipe), with or without n_process.
+    """
+    def __init__(self, enhance_ud=True, enhanced_plus_plus=True, enhanced_extra=True, conv_iterations=math.inf, remove_eud_info=False, remove_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=ConvsCanceler(), collect_stats=False, cache=None):
         self.config = (enhance_ud, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_eud_info, remove_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+        # per conversion rule stats, summed over all the converted docs (of this process)
+        self._stats = ConversionStats() if collect_stats else None
+        # a ConversionCache (see cache.py) of the converted sentences, or None
+        self._cache = cache
+        # (so the docs converted by worker processes, e.g. of nlp.pipe's n_process, can be read in this one)
+        from .spacy_wrapper import register_extensions
+        register_extensions()
     
     def __call__(self, doc):
-        serialized_spacy_doc, parsed_doc, convs_done = convert_spacy_doc(doc, *self.config)
-        self._parsed_doc = parsed_doc
-        self._convs_done = convs_done
-        return serialized_spacy_doc
+        converted_doc, = convert_spacy_docs([doc], *self.config, stats=self._stats, cache=self._cache)
+        return converted_doc
+    
+    def pipe(self, docs, batch_size=128):
+        docs = iter(docs)
+        while True:
+            batch = list(islice(docs, batch_size))
+            if not batch:
+                break
+            yield from convert_spacy_docs(batch, *self.config, stats=self._stats, cache=self._cache)
+    
+    @staticmethod
+    def get_parsed_doc(doc=None):
+        if doc is None:
+            raise TypeError(_no_doc_message.format(method="get_parsed_doc", extension="doc._.parsed_doc"))
+        return doc._.parsed_doc
+    
+    @staticmethod
+    def get_max_convs(doc=None):
+        if doc is None:
+            raise TypeError(_no_doc_message.format(method="get_max_convs", extension="max(doc._.convs_done)"))
+        return max(doc._.convs_done, default=0)
     
-    def get_parsed_doc(self):
-        return self._parsed_doc
+    @staticmethod
+    def get_convs_done(doc):
+        # the number of conversion passes which changed each of the doc's sentences
+        return doc._.convs_done
     
-    def get_max_convs(self):
-        return self._convs_done
+    def get_stats(self):
+        # the ConversionStats (see stats.py) if the converter was created with collect_stats, otherwise None
+        return self._stats
 
 
 def get_conversion_names():
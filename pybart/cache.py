@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+from collections import OrderedDict, deque
+
+from .converter import run_conversion_plan
+from .graph_token import sentence_to_state, sentence_from_state
+from .parallel import relabel_sentences
+
+# bump when a change to the conversions (or to the cached entries) makes the stored results stale,
+#   the key of every entry includes it, so a disk cache of an older version simply misses
+CACHE_VERSION = 2
+# the worker side caches a process keeps alive (the most recently used ones), so the tasks it gets share their cache
+PROCESS_CACHES = 4
+
+# the worker side caches of this process (see ConversionCache.__reduce__), by the ids of the caches they stand for
+_process_caches = weakref.WeakValueDictionary()
+_recent_process_caches = deque(maxlen=PROCESS_CACHES)
+
+
+class CacheStats(object):
+    """Purpose: the hit and miss counters of a ConversionCache (counted per sentence).
+    
+    memory_hits, disk_hits: the sentences found in the in-memory (LRU) tier, and in the on-disk one.
+    batch_hits: the sentences which repeat an earlier sentence of the same convert call (and so were converted once).
+    misses: the sentences which were converted.
+    """
+    __slots__ = ("memory_hits", "disk_hits", "batch_hits", "misses")
+    
+    def __init__(self):
+        for counter in self.__slots__:
+            setattr(self, counter, 0)
+    
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits + self.batch_hits
+    
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return dict({counter: getattr(self, counter) for counter in self.__slots__},
+                    hits=self.hits, hit_rate=(self.hits / lookups) if lookups else 0.0)
+
+
+class ConversionCache(object):
+    """Purpose: a content addressed cache of converted sentences (pass it as the cache argument of converter.convert,
+        or of the api calls).
+    
+    A sentence's key is a hash of its whole graph (its tokens' CoNLL-U fields and edges, that is, the basic tree
+    for a parsed sentence) together with the conversion configuration, so a sentence seen before (with the same
+    configuration) is not converted again. The entries are kept in an in-memory LRU tier, and optionally
+    in an on-disk (sqlite) tier which outlives the process and can be shared between processes.
+    
+    The results are the same as with no cache, including the alternative ids (#iid) numbering,
+    but the conversion stats (see stats.py) count only the sentences which were actually converted.
+    When sent to worker processes, each process gets a cache of its own (with its own memory tier and counters)
+    over the same disk tier.
+    """
+    def __init__(self, max_size=10000, path=None):
+        """
+        Args:
+            (int) The number of sentences the in-memory tier keeps (the least recently used are dropped first).
+            (str) The sqlite file of the on-disk tier (created if needed), or None for none.
+        """
+        self.max_size = max_size
+        self.path = path
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._connection = None
+        self._lock = threading.Lock()
+        self._id = uuid.uuid4().hex
+    
+    def __reduce__(self):
+        # the entries, the sqlite connection and the lock stay in this process
+        return _get_process_cache, (self._id, self.max_size, self.path)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB)")
+        return self._connection
+    
+    def get(self, key):
+        """
+        returns:
+            (tuple) The entry of the key (see convert_with_cache), or None if the key is in neither tier.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats.memory_hits += 1
+                return self._entries[key]
+            if self.path is not None:
+                row = self._get_connection().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.stats.disk_hits += 1
+                    entry = _entry_from_json(row[0])
+                    self._put_in_memory(key, entry)
+                    return entry
+            self.stats.misses += 1
+            return None
+    
+    def add_batch_hits(self, count=1):
+        with self._lock:
+            self.stats.batch_hits += count
+    
+    def put_many(self, items):
+        """
+        Args:
+            (list(tuple(str, tuple))) The (key, entry) pairs to store, in both tiers.
+        """
+        with self._lock:
+            for key, entry in items:
+                self._put_in_memory(key, entry)
+            if (self.path is not None) and items:
+                with self._get_connection() as connection:
+                    connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)", [(key, json.dumps(entry)) for key, entry in items])
+    
+    def _put_in_memory(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        # drops the entries of both tiers (the counters are kept)
+        with self._lock:
+            self._entries.clear()
+            if self.path is not None:
+                with self._get_connection() as connection:
+                    connection.execute("DELETE FROM entries")
+    
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def _entry_from_json(value):
+    # the disk tier keeps the entries as JSON (plain data, unlike pickles, which could run code when read),
+    #   the labels are interned again by sentence_from_state
+    state, convs_done, iids_passes = json.loads(value)
+    return state, convs_done, [tuple(pass_iids) for pass_iids in iids_passes]
+
+
+def _get_process_cache(cache_id, max_size, path):
+    cache = _process_caches.get(cache_id)
+    if cache is None:
+        cache = ConversionCache(max_size, path)
+        cache._id = cache_id
+        _process_caches[cache_id] = cache
+    # so the next tasks (of this cache) a worker process gets would share it
+    if cache not in _recent_process_caches:
+        _recent_process_caches.append(cache)
+    return cache
+
+
+def _after_fork():
+    # a forked (e.g. worker) process must not use the sqlite connections (or locks) of its parent
+    for cache in list(_process_caches.values()):
+        cache._connection = None
+        cache._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_config_key(plan, conv_iterations):
+    # the parts of the configuration which the results depend on (the plan is the canceled conversions and the label flags)
+    return (CACHE_VERSION, tuple(sorted(plan.canceled)), plan.remove_enhanced_extra_info, plan.remove_bart_extra_info,
+            plan.remove_node_adding_conversions, conv_iterations)
+
+
+def get_sentence_key(state, config_key):
+    """Purpose: the content address of a sentence (given as sentence_to_state flattened it) under a configuration."""
+    return hashlib.blake2b(repr((config_key, state)).encode(), digest_size=16).hexdigest()
+
+
+def convert_with_cache(cache, plan, parsed, conv_iterations, iid_log=None, stats=None):
+    """Purpose: converter.convert through the cache: converts (once) only the sentences which are not in the cache,
+        and stores their results.
+    
+    An entry is the converted sentence (flattened), its number of changing passes, and the passes in which
+    it got alternative ids (as (pass, count) pairs). Its alternative ids are numbered from 0, and are renumbered
+    for each conversion, in the order a conversion with no cache would give them.
+    
+    returns:
+        (as in convert) The converted sentences (sentences found in the cache are new ones, not the given ones)
+            and the number of passes which changed each.
+    """
+    config_key = get_config_key(plan, conv_iterations)
+    keys = [get_sentence_key(sentence_to_state(sentence), config_key) for sentence in parsed]
+    
+    entries = dict()
+    to_convert = dict()
+    for i, key in enumerate(keys):
+        if key in entries or key in to_convert:
+            cache.add_batch_hits()
+            continue
+        entry = cache.get(key)
+        if entry is None:
+            to_convert[key] = i
+        else:
+            entries[key] = entry
+    
+    converted_sentences = dict()
+    if to_convert:
+        misses_log = []
+        converted, convs_done = run_conversion_plan(plan, [parsed[i] for i in to_convert.values()], conv_iterations, misses_log, stats)
+        sentence_logs = [[] for _ in converted]
+        for (pass_num, j, first, last) in misses_log:
+            sentence_logs[j].append((pass_num, first, last))
+        
+        new_entries = []
+        for key, sentence, sentence_convs_done, sentence_log in zip(to_convert, converted, convs_done, sentence_logs):
+            # store the sentence with its alternative ids numbered from 0
+            iids = [iid for (_, first, last) in sentence_log for iid in range(first, last)]
+            if any(local_iid != iid for local_iid, iid in enumerate(iids)):
+                relabel_sentences([sentence], {iid: local_iid for local_iid, iid in enumerate(iids)})
+            entry = (sentence_to_state(sentence), sentence_convs_done, [(pass_num, last - first) for (pass_num, first, last) in sentence_log])
+            new_entries.append((key, entry))
+            entries[key] = entry
+            converted_sentences[key] = sentence
+        cache.put_many(new_entries)
+    
+    # number the alternative ids in the order they would have been created, that is by pass, then by sentence
+    events = []
+    for i, key in enumerate(keys):
+        local_first = 0
+        for pass_num, count in entries[key][2]:
+            events.append((pass_num, i, local_first, count))
+            local_first += count
+    events.sort()
+    mappings = dict()
+    next_iid = 0
+    for pass_num, i, local_first, count in events:
+        mappings.setdefault(i, dict()).update({local_first + k: next_iid + k for k in range(count)})
+        if iid_log is not None:
+            iid_log.append((pass_num, i, next_iid, next_iid + count))
+        next_iid += count
+    
+    results = []
+    for i, key in enumerate(keys):
+        # a converted sentence is used as is (once), any other occurrence is rebuilt from its entry
+        sentence = converted_sentences.pop(key, None) or sentence_from_state(entries[key][0])
+        if any(local_iid != iid for local_iid, iid in mappings.get(i, dict()).items()):
+            relabel_sentences([sentence], mappings[i])
+        results.append(sentence)
+    
+    return results, [entries[key][1] for key in keys]
+
@@ -0,0 +1,187 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .conllu_wrapper import iter_conllu
+
+# the first bytes of an index (sidecar) file, bump the digit when the layout changes
+INDEX_MAGIC = b"PYBARTI1"
+# the suffix of the sidecar index of a CoNLL-U file
+INDEX_SUFFIX = ".bartidx"
+# the size and modification time of the indexed file, and its number of sentences
+_index_header = struct.Struct("<3q")
+
+_little_endian = sys.byteorder == "little"
+
+
+def index_conllu(path):
+    """Purpose: finds the byte range of each sentence of a CoNLL-U file, in a single pass (with no parsing).
+    
+    The sentences are split as iter_conllu splits them, by (whitespace only) blank lines.
+    
+    Args:
+        (str) The CoNLL-U file.
+    
+    returns:
+        (array(int), array(int)) The byte offset each sentence starts at, and the one it ends at (past its last line).
+    """
+    starts = array('q')
+    ends = array('q')
+    offset = 0
+    in_sentence = False
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                if not in_sentence:
+                    starts.append(offset)
+                    in_sentence = True
+                offset += len(line)
+                continue
+            if in_sentence:
+                ends.append(offset)
+                in_sentence = False
+            offset += len(line)
+    if in_sentence:
+        ends.append(offset)
+    return starts, ends
+
+
+def get_index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def write_index(path, starts, ends, index_path=None):
+    """Purpose: saves the sentence offsets of a CoNLL-U file in a sidecar file (by default, next to it).
+    
+    Args:
+        (str) The CoNLL-U file.
+        (array(int), array(int)) Its sentence offsets (see index_conllu).
+        (str) The index file, or None for the default one (see get_index_path).
+    """
+    stat = os.stat(path)
+    with open(index_path or get_index_path(path), "wb") as f:
+        f.write(INDEX_MAGIC + _index_header.pack(stat.st_size, stat.st_mtime_ns, len(starts)))
+        for offsets in (starts, ends):
+            offsets = array('q', offsets)
+            if not _little_endian:
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+
+
+def read_index(path, index_path=None):
+    """Purpose: loads the sentence offsets of a CoNLL-U file from its sidecar file.
+    
+    Args:
+        (str) The CoNLL-U file.
+        (str) The index file, or None for the default one (see get_index_path).
+    
+    returns:
+        (array(int), array(int)) The sentence offsets (see index_conllu), or None if there is no index,
+            or if the file changed (in size or modification time) since it was indexed.
+    """
+    index_path = index_path or get_index_path(path)
+    if not os.path.exists(index_path):
+        return None
+    stat = os.stat(path)
+    with open(index_path, "rb") as f:
+        header = f.read(len(INDEX_MAGIC) + _index_header.size)
+        if (len(header) != len(INDEX_MAGIC) + _index_header.size) or (header[:len(INDEX_MAGIC)] != INDEX_MAGIC):
+            return None
+        size, mtime_ns, n_sentences = _index_header.unpack_from(header, len(INDEX_MAGIC))
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        starts = array('q')
+        ends = array('q')
+        try:
+            starts.fromfile(f, n_sentences)
+            ends.fromfile(f, n_sentences)
+        except EOFError:
+            return None
+    if not _little_endian:
+        starts.byteswap()
+        ends.byteswap()
+    return starts, ends
+
+
+def read_conllu_range(path, byte_start, byte_end):
+    # the text of a byte range of the file, read through mmap (so no more than the range is read)
+    if byte_end <= byte_start:
+        return ""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped[byte_start:byte_end].decode()
+
+
+def parse_conllu_range(path, byte_start, byte_end):
+    """Purpose: parses the sentences in a byte range of a CoNLL-U file, reading only that range.
+    
+    Args:
+        (str) The CoNLL-U file.
+        (int) The offset the range starts at (a sentence start, see index_conllu).
+        (int) The offset it ends at.
+    
+    returns:
+        (as in conllu_wrapper.parse_conllu) The sentences and their comments.
+    """
+    parsed = list(iter_conllu(read_conllu_range(path, byte_start, byte_end).split("\n")))
+    return [sentence for sentence, _ in parsed], [comments for _, comments in parsed]
+
+
+class ConlluFile(object):
+    """Purpose: a CoNLL-U file with random access by sentence index, through its sentence offsets index.
+    
+    The index is read from the file's sidecar (see write_index), or built (in a single pass) and saved there,
+    once the sidecar is missing or older than the file. The file itself is read (through mmap) only in the ranges
+    asked for, so sentence 5,000,000 is parsed with no read of the sentences before it,
+    and workers can each take a shard (see get_shards) of a file which none of them reads as a whole.
+    """
+    def __init__(self, path, index_path=None, save_index=True):
+        """
+        Args:
+            (str) The CoNLL-U file.
+            (str) The sidecar index file, or None for the default one (see get_index_path).
+            (bool) Whether to save a built index in the sidecar file.
+        """
+        self.path = path
+        index = read_index(path, index_path)
+        if index is None:
+            index = index_conllu(path)
+            if save_index:
+                write_index(path, *index, index_path=index_path)
+        self.starts, self.ends = index
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def get_byte_range(self, start, end):
+        """
+        returns:
+            (int, int) The byte range of the sentences start to end (excluded), (0, 0) for no sentences.
+        """
+        start, end, _ = slice(start, end).indices(len(self))
+        if start >= end:
+            return 0, 0
+        return self.starts[start], self.ends[end - 1]
+    
+    def get_text(self, start, end):
+        # the CoNLL-U text of the sentences start to end (excluded), as in the file
+        return read_conllu_range(self.path, *self.get_byte_range(start, end))
+    
+    def parse(self, start, end):
+        """Purpose: parses the sentences start to end (excluded).
+        
+        returns:
+            (as in conllu_wrapper.parse_conllu) The sentences and their comments.
+        """
+        return parse_conllu_range(self.path, *self.get_byte_range(start, end))
+    
+    def get_shards(self, n_shards):
+        """Purpose: splits the sentences into contiguous shards of about the same size (in bytes).
+        
+        returns:
+            (list(tuple(int, int))) The (start, end) sentence ranges of the shards, at most n_shards of them.
+        """
+        # imported here, as the parallel module imports this one
+        from .parallel import balanced_chunks
+        return balanced_chunks([end - start for start, end in zip(self.starts, self.ends)], n_shards)
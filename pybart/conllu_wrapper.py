@@ -1,6 +1,69 @@
-import uuid
+import json
+from sys import intern
+from io import StringIO
+from itertools import chain
+
 from .graph_token import Token, add_basic_edges
 
+# the number of lines write_conllu writes at a time
+CONLLU_WRITE_CHUNK = 4096
+# the (characters) chunk size in which iter_tacred reads a JSON list
+TACRED_READ_SIZE = 1 << 16
+
+
+def parse_conllu_sentence(lines):
+    """Purpose: parses the lines of a single CoNLL-U formatted sentence.
+    
+    Args:
+        (list(str)) The sentence's lines.
+    
+    returns:
+        (dict(Token)) The sentence dict, a mapping from id to token/word.
+        (list(str)) The sentence's comments.
+        
+     Raises:
+         ValueError: (see parse_conllu)
+    """
+    comments = []
+    sentence = dict()
+    
+    # for each line (either comment or token)
+    for line in lines:
+        # store comments
+        if line.startswith('#'):
+            comments.append(line)
+            continue
+        
+        # split line by any whitespace, and store the first 10 columns.
+        parts = line.split()
+        if len(parts) > 10:
+            parts = line.split("\t")
+            if len(parts) > 10:
+                raise ValueError("text must be a basic CoNLL-U format, received too many columns or separators.")
+        
+        new_id, form, lemma, upos, xpos, feats, head, deprel, deps, misc = parts[:10]
+        
+        # validate input
+        if '-' in new_id:
+            raise ValueError("text must be a basic CoNLL-U format, received a CoNLL-X format.")
+        if deps != '_' or '.' in new_id:
+            raise ValueError("text must be a basic CoNLL-U, received an enhanced one.")
+        
+        # fix xpos if empty to a copy of upos
+        xpos = upos if xpos == '_' else xpos
+        
+        # add current token to current sentence,
+        #   the closed class fields are interned, so all their repetitions share one string
+        sentence[int(new_id)] = Token(
+                int(new_id), form, lemma, intern(upos), intern(xpos), intern(feats) if feats == '_' else feats, int(head), intern(deprel), intern(deps), intern(misc) if misc == '_' else misc)
+    
+    # add root
+    sentence[0] = Token(0, None, None, None, None, None, None, None, None, None)
+    
+    # after parsing entire sentence, add basic deprel edges
+    add_basic_edges(sentence)
+    return sentence, comments
+
 
 def parse_conllu(text):
     """Purpose: parses the given CoNLL-U formatted text.
@@ -25,50 +88,65 @@ def parse_conllu(text):
         lines = sent.strip().split('\n')
         if not lines:
             continue
-        comments = []
-        sentence = dict()
-        
-        # for each line (either comment or token)
-        for line in lines:
-            # store comments
-            if line.startswith('#'):
-                comments.append(line)
-                continue
-            
-            # split line by any whitespace, and store the first 10 columns.
-            parts = line.split()
-            if len(parts) > 10:
-                parts = line.split("\t")
-                if len(parts) > 10:
-                    raise ValueError("text must be a basic CoNLL-U format, received too many columns or separators.")
-            
-            new_id, form, lemma, upos, xpos, feats, head, deprel, deps, misc = parts[:10]
-            
-            # validate input
-            if '-' in new_id:
-                raise ValueError("text must be a basic CoNLL-U format, received a CoNLL-X format.")
-            if deps != '_' or '.' in new_id:
-                raise ValueError("text must be a basic CoNLL-U, received an enhanced one.")
-            
-            # fix xpos if empty to a copy of upos
-            xpos = upos if xpos == '_' else xpos
-            
-            # add current token to current sentence
-            sentence[int(new_id)] = Token(
-                    int(new_id), form, lemma, upos, xpos, feats, int(head), deprel, deps, misc)
-        
-        # add root
-        sentence[0] = Token(0, None, None, None, None, None, None, None, None, None)
-        
-        # after parsing entire sentence, add basic deprel edges,
-        # and add sentence to output list
-        add_basic_edges(sentence)
+        sentence, comments = parse_conllu_sentence(lines)
         sentences.append(sentence)
         all_comments.append(comments)
     
     return sentences, all_comments
 
 
+def iter_conllu(file):
+    """Purpose: lazily parses a CoNLL-U formatted file, one sentence at a time.
+    
+    Args:
+        (iterable(str)) The file (or any other iterable of lines).
+    
+    returns:
+        (generator(tuple(dict(Token), list(str)))) yields each sentence dict together with its comments.
+        
+     Raises:
+         ValueError: (see parse_conllu)
+    """
+    lines = []
+    for line in file:
+        if line.strip():
+            lines.append(line.rstrip("\r\n"))
+        elif lines:
+            yield parse_conllu_sentence(lines)
+            lines = []
+    if lines:
+        yield parse_conllu_sentence(lines)
+
+
+def write_conllu(out_file, converted, all_comments, preserve_comments=False):
+    """Purpose: writes the sentence list to a text stream in the CoNLL-U format, a chunk of lines at a time.
+    
+    Args:
+        (file) The output (text) stream.
+        (list(dict(Token))) The sentence list.
+        (list(list(str))) The comments of each sentence.
+        (bool) Whether to write the comments.
+    """
+    chunk = []
+    for i, (sentence, per_sent_comments) in enumerate(zip(converted, all_comments)):
+        if i:
+            chunk.append("\n")
+        # recover comments from original file
+        if preserve_comments:
+            chunk.append("\n".join(per_sent_comments) + "\n")
+        
+        # parsed sentences are in id order (but for the root), so only sentences which got copy nodes need sorting
+        ids = [cur_id for cur_id in sentence if cur_id != 0]
+        if any(prev_id > cur_id for prev_id, cur_id in zip(ids, ids[1:])):
+            ids.sort()
+        chunk.extend(sentence[cur_id].get_conllu_string() + "\n" for cur_id in ids)
+        
+        if len(chunk) >= CONLLU_WRITE_CHUNK:
+            out_file.write("".join(chunk))
+            chunk.clear()
+    out_file.write("".join(chunk))
+
+
 def serialize_conllu(converted, all_comments, preserve_comments=False):
     """Purpose: create a CoNLL-U formatted text from a sentence list.
     
@@ -78,17 +156,9 @@ def serialize_conllu(converted, all_comments, preserve_comments=False):
     returns:
         (str) the text corresponding to the sentence list in the CoNLL-U format.
      """
-    text = []
-    comments = []
-    for (sentence, per_sent_comments) in zip(converted, all_comments):
-        # recover comments from original file
-        if preserve_comments:
-            comments = ["\n".join(per_sent_comments)]
-        
-        # TODO - fix case of more than 9 copy nodes - needs special ordering e.g 1.1 ... 1.9 1.10 and not 1.1 1.10 ... 1.9
-        text.append(comments + [token.get_conllu_string() for (cur_id, token) in sorted(sentence.items()) if cur_id != 0])
-    
-    return "\n".join(["\n".join(sent) + "\n" for sent in text])
+    out_file = StringIO()
+    write_conllu(out_file, converted, all_comments, preserve_comments)
+    return out_file.getvalue()
 
 
 # fw.conllu_to_odin(converter.convert(fw.parse_conllu(fw.odin_to_conllu(json_buf)[0])))
@@ -222,11 +292,19 @@ def conllu_to_odin(conllu_sentences, odin_to_enhance=None, is_basic=False, push_
     texts = []
     summed_offset = 0
     
+    previous_end = None
+    
     for i, conllu_sentence in enumerate(conllu_sentences):
         fixed_sentence = conllu_sentence
         
         if odin_to_enhance:
-            text = odin_to_enhance['text'][odin_to_enhance['sentences'][i]['startOffsets'][0]: odin_to_enhance['sentences'][i]['endOffsets'][-1]]
+            start, end = odin_to_enhance['sentences'][i]['startOffsets'][0], odin_to_enhance['sentences'][i]['endOffsets'][-1]
+            text = odin_to_enhance['text'][start: end]
+            
+            # the new text starts with the first sentence and separates the sentences by a single new line,
+            #   so whatever came before the sentence (if more than a single character) moves it back
+            summed_offset -= start - (previous_end + 1 if previous_end is not None else 0)
+            previous_end = end
             
             # fixing offsets may be to all sentences, as previous sentences may have become longer, changing all following offsets
             fix_offsets(odin_to_enhance['sentences'][i], summed_offset)
@@ -255,6 +333,8 @@ def conllu_to_odin(conllu_sentences, odin_to_enhance=None, is_basic=False, push_
         odin_to_enhance['text'] = "\n".join(texts)
         odin = odin_to_enhance
     else:
+        # imported here, as it takes about as long to import as the rest of this module (for its platform import)
+        import uuid
         odin = {"documents": {"": {
             "id": str(uuid.uuid4()),
             "text": " ".join([token.get_conllu_field("form") for conllu_sentence in fixed_sentences for (_, token) in
@@ -279,3 +359,65 @@ def parsed_tacred_json(data):
         sentences.append(sentence)
     
     return sentences
+
+
+def iter_tacred(in_file):
+    """Purpose: reads TACRED examples lazily, from either a JSON list (as TACRED is distributed) or JSON-lines.
+    
+    Args:
+        (file) The input (text) file.
+    
+    returns:
+        (generator(dict)) The examples.
+    """
+    decoder = json.JSONDecoder()
+    buffer = in_file.read(TACRED_READ_SIZE).lstrip()
+    if not buffer.startswith("["):
+        # JSON-lines, whose first lines are already (partly) read
+        for line in chain((buffer + in_file.readline()).splitlines(), in_file):
+            if line.strip():
+                yield json.loads(line)
+        return
+    
+    # a JSON list: decode one example at a time, reading more whenever the buffer holds no whole example
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            example, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = in_file.read(TACRED_READ_SIZE)
+            if not more:
+                raise
+            buffer += more
+            continue
+        yield example
+        buffer = buffer[end:]
+
+
+def sentence_to_edges(sentence, n_tokens):
+    """Purpose: the compact form of a converted sentence (e.g. for tensors): integer edges, with no Token objects.
+    
+    Args:
+        (dict) The converted sentence.
+        (int) The number of its (original) tokens.
+    
+    returns:
+        (list(tuple(int, int, str))) The (head, dependent, label) edges. The tokens are numbered from 0, the new nodes
+            (copy nodes and STATE nodes, in their order) after them, and a root head is -1.
+        (list(int)) The token each new node copies, or -1 for a node which copies none (a STATE node).
+    """
+    index = dict()
+    copies = []
+    for iid, token in sentence.items():
+        if iid != 0 and int(iid) == iid:
+            index[token] = int(iid) - 1
+    for iid, token in sentence.items():
+        if int(iid) != iid:
+            index[token] = n_tokens + len(copies)
+            # (a STATE node is a new node after its predecessor, see extra_inner_weak_modifier_verb_reconstruction, not a copy of it)
+            copies.append(int(iid) - 1 if "CopyOf" in token.get_conllu_field("misc") else -1)
+    
+    return [(index.get(head, -1), index[token], rel) for token in index for head, rel in token.get_new_relations()], copies
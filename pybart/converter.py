@@ -4,13 +4,18 @@
 #   2. we think like a multi-graph, so we operate on every relation/edge between two nodes, while they on first one found.
 #   3. we look for all fathers as we can have multiple fathers, while in SC they look at first one found.
 
-import sys
 import re
 from math import copysign
-import inspect
 from typing import List
+from functools import lru_cache, partial
+from contextvars import ContextVar
+from time import perf_counter
+from types import CodeType, FunctionType
 
-from .matcher import match, Restriction
+from .matcher import match, Restriction, CompiledRestriction, compile_restriction, compile_pattern, restriction_requirement, SentenceSignature
+from .graph_token import get_sentence_edge_index, copy_node_id
+from .labels import get_label
+from .stats import current_rule_stats
 
 # constants
 nmod_advmod_complex = ["back_to", "back_in", "back_at", "early_in", "late_in", "earlier_in"]
@@ -30,32 +35,12 @@ evidential_list = "^(seem|appear|be|sound)$"
 aspectual_list = "^(begin|continue|delay|discontinue|finish|postpone|quit|resume|start|complete)$"
 reported_list = "^(report|say|declare|announce|tell|state|mention|proclaim|replay|point|inform|explain|clarify|define|expound|describe|illustrate|justify|demonstrate|interpret|elucidate|reveal|confess|admit|accept|affirm|swear|agree|recognise|testify|assert|think|claim|allege|argue|assume|feel|guess|imagine|presume|suggest|argue|boast|contest|deny|refute|dispute|defend|warn|maintain|contradict)$"
 EXTRA_INFO_STUB = 1
-g_remove_enhanced_extra_info = False
-g_remove_bart_extra_info = False
-g_remove_node_adding_conversions = False
 
 
 class ConvsCanceler:
+    # the names of the conversions to cancel (see ConversionPlan for how they are canceled)
     def __init__(self, cancel_list: List[str] = None):
         self.cancel_list = cancel_list
-        self.original = {func_name: func_pointer for (func_name, func_pointer) in inspect.getmembers(sys.modules[__name__], inspect.isfunction)
-                         if (func_name.startswith("eud") or func_name.startswith("eudpp") or func_name.startswith("extra"))}
-        self._func_names = self.original.keys()
-    
-    def restore_funcs(self):
-        # best effort in cleanup
-        try:
-            for func_name, func_pointer in self.original.items():
-                setattr(sys.modules[__name__], func_name, func_pointer)
-        except KeyError:
-            pass
-    
-    def override_funcs(self):
-        if self.cancel_list:
-            for func_name in self.cancel_list:
-                if func_name not in self._func_names:
-                    raise ValueError(f"{func_name} is not a real function name")
-                setattr(sys.modules[__name__], func_name, lambda *x: None)
     
     def update_funcs(self, func_names: List[str]):
         if self.cancel_list:
@@ -64,50 +49,50 @@ class ConvsCanceler:
             self.cancel_list = func_names
     
     def update_funcs_by_prefix(self, prefix: str):
-        func_names = list()
-        for func_name in self._func_names:
-            if func_name.startswith(prefix):
-                func_names.append(func_name)
-        self.update_funcs(func_names)
+        self.update_funcs([func_name for func_name in conversion_names if func_name.startswith(prefix)])
     
     @staticmethod
     def get_conversion_names():
-        return set(ConvsCanceler()._func_names)
+        return set(conversion_names)
 
 
 def split_by_at(label):
-    # For the rare case which involvs a '@' preposition,
-    # we temporarily replace it with 'at', instead of simply doing rel.split("@")
-    return [x.replace(":at", ":@") for x in label.replace(":@", ":at").split("@")]
+    # the relation and the source of the label (see labels.Label)
+    label = get_label(label)
+    return [label.relation] if label.source is None else [label.relation, label.source]
 
 
 def naked_label(label):
-    return split_by_at(label)[0].split(":")[0]
+    return get_label(label).base
 
 
 def add_eud_info(orig, extra):
-    at = orig.split("@")
-    base = at[0]
-    if ":" in orig:
-        base = at[0].split(":")[0]
-    return base + ((":" + extra) if not g_remove_enhanced_extra_info else "") + (("@" + at[1]) if len(at) > 1 else "")
+    orig = get_label(orig)
+    return get_label(orig.base + ((":" + extra) if not current_plan.get().remove_enhanced_extra_info else "") +
+                     (("@" + orig.source) if orig.source is not None else ""))
 
 
 def add_extra_info(orig, dep, dep_type=None, phrase=None, iid=None, uncertain=False, prevs=None):
-    global g_remove_bart_extra_info
-    
     source_str = ""
-    if not g_remove_bart_extra_info:
+    if not current_plan.get().remove_bart_extra_info:
         iid_str = ""
         if iid is not None:
             iid_str = "#" + str(iid)
         prevs_str = ""
-        if (prevs is not None) and (len(prevs.split("@")) > 1):
-            prevs_str = "+" + prevs.split("@")[-1]
+        if (prevs is not None) and (get_label(prevs).source is not None):
+            prevs_str = "+" + get_label(prevs).source
         dep_args = ", ".join([x for x in [dep_type, phrase, "UNC" if uncertain else None] if x])
         source_str = "@" + dep + "(" + dep_args + ")" + iid_str + prevs_str
     
-    return orig + source_str
+    return get_label(orig + source_str)
+
+
+subj_pass_rest = compile_restriction(Restriction(name="root", nested=[[
+    Restriction(gov='auxpass', name="aux"),
+    # the SC regex (which was "^(nsubj|csubj).*$") was changed here
+    # to avoid the need to filter .subjpass relations in the graph-rewriting part
+    Restriction(gov="^(.subj|.subj(?!pass).*)$", name="subj")
+]]))
 
 
 # correctDependencies - correctSubjPass
@@ -117,14 +102,7 @@ def add_extra_info(orig, dep, dep_type=None, phrase=None, iid=None, uncertain=Fa
 # correctDependencies - processNames and removeExactDuplicates: have been skipped.
 # processNames for future treatment, removeExactDuplicates for redundancy.
 def eud_correct_subj_pass(sentence):
-    restriction = Restriction(name="root", nested=[[
-        Restriction(gov='auxpass', name="aux"),
-        # the SC regex (which was "^(nsubj|csubj).*$") was changed here
-        # to avoid the need to filter .subjpass relations in the graph-rewriting part
-        Restriction(gov="^(.subj|.subj(?!pass).*)$", name="subj")
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[subj_pass_rest]])
     if not ret:
         return
     
@@ -140,16 +118,17 @@ def eud_correct_subj_pass(sentence):
         subj.replace_edge(subj_rel, substitute_rel, subj_head, subj_head)
 
 
-# add 'agent' to nmods if it is cased by 'by', and have an auxpass sibling
-def eud_passive_agent(sentence):
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(gov='auxpass'),
-        Restriction(name="mod", gov="^(nmod)$", nested=[[
-            Restriction(gov='case', form="^(?i:by)$")
-        ]])
+passive_agent_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(gov='auxpass'),
+    Restriction(name="mod", gov="^(nmod)$", nested=[[
+        Restriction(gov='case', form="^(?i:by)$")
     ]])
+]]))
 
-    ret = match(sentence.values(), [[restriction]])
+
+# add 'agent' to nmods if it is cased by 'by', and have an auxpass sibling
+def eud_passive_agent(sentence):
+    ret = match(sentence.values(), [[passive_agent_rest]])
     if not ret:
         return
 
@@ -205,7 +184,7 @@ def prep_patterns_per_type(sentence, restriction):
             mod.add_edge(add_eud_info(mod_rel, prep_sequence.lower()), mod_head)
 
 
-def prep_patterns_inner(sentence, first_gov, second_gov):
+def prep_patterns_rests(first_gov, second_gov):
     restriction_3w = Restriction(name="gov", nested=[[
         Restriction(name="mod", gov=first_gov, nested=[[
             Restriction(name="c1", gov=second_gov, nested=[[
@@ -230,25 +209,34 @@ def prep_patterns_inner(sentence, first_gov, second_gov):
         ]])
     ]])
     
+    return [compile_restriction(rest) for rest in [restriction_3w, restriction_2w, restriction_1w]]
+
+
+nmod_prep_rests = prep_patterns_rests('^nmod$', 'case')
+advcl_acl_prep_rests = prep_patterns_rests('^(advcl|acl)$', '^(mark|case)$')
+
+
+def prep_patterns_inner(sentence, prep_rests):
     # NOTE: in SC since they replace the modifier (nmod/advcl/acl) it won't come up again in future matches,
     # as they use the exact (^$) symbols. and so we imitate this behavior.
-    for rest in [restriction_3w, restriction_2w, restriction_1w]:
+    for rest in prep_rests:
         prep_patterns_per_type(sentence, rest)
 
 
 def eud_prep_patterns(sentence):
-    prep_patterns_inner(sentence, '^nmod$', 'case')
-    prep_patterns_inner(sentence, '^(advcl|acl)$', '^(mark|case)$')
+    prep_patterns_inner(sentence, nmod_prep_rests)
+    prep_patterns_inner(sentence, advcl_acl_prep_rests)
 
 
-def eud_heads_of_conjuncts(sentence):
-    restriction = Restriction(name="new_gov", nested=[[
-        Restriction(name="gov", gov="^((?!root|case).)*$", nested=[[
-             Restriction(name="dep", gov="conj.*")
-        ]])
+heads_of_conjuncts_rest = compile_restriction(Restriction(name="new_gov", nested=[[
+    Restriction(name="gov", gov="^((?!root|case).)*$", nested=[[
+         Restriction(name="dep", gov="conj.*")
     ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+]]))
+
+
+def eud_heads_of_conjuncts(sentence):
+    ret = match(sentence.values(), [[heads_of_conjuncts_rest]])
     if not ret:
         return
     
@@ -280,6 +268,12 @@ def eud_heads_of_conjuncts(sentence):
         #   "The boy and the girl, who lived, told the tale."
 
 
+subj_of_conjoined_verbs_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="conj", gov="conj", no_sons_of=".subj", xpos="(VB|JJ)"),
+    Restriction(name="subj", gov=".subj")
+]]))
+
+
 # we propagate only subj (for now) as this is what the original code stated:
 #     cdm july 2010: This bit of code would copy a dobj from the first
 #     clause to a later conjoined clause if it didn't
@@ -289,12 +283,7 @@ def eud_heads_of_conjuncts(sentence):
 #     done always, and see no good "sometimes" heuristic.
 #     IF WE WERE TO REINSTATE, SHOULD ALSO NOT ADD OBJ IF THERE IS A ccomp (SBAR).
 def eud_subj_of_conjoined_verbs(sentence):
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(name="conj", gov="conj", no_sons_of=".subj", xpos="(VB|JJ)"),
-        Restriction(name="subj", gov=".subj")
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[subj_of_conjoined_verbs_rest]])
     if not ret:
         return
     
@@ -310,12 +299,14 @@ def eud_subj_of_conjoined_verbs(sentence):
         subj.add_edge(subj_rel, conj)
 
 
-def xcomp_propagation_per_type(sentence, restriction, is_extra=False):
-    outer_restriction = Restriction(nested=[
+def xcomp_propagation_rest(restriction):
+    return compile_restriction(Restriction(nested=[
         [restriction, Restriction(name="new_subj", gov=".?obj")],
         [restriction, Restriction(name="new_subj", gov="nsubj.*")]
-    ])
-    
+    ]))
+
+
+def xcomp_propagation_per_type(sentence, outer_restriction, is_extra=False):
     ret = match(sentence.values(), [[outer_restriction]])
     if not ret:
         return
@@ -327,6 +318,14 @@ def xcomp_propagation_per_type(sentence, restriction, is_extra=False):
                           add_extra_info("nsubj", "xcomp", dep_type="GERUND", prevs=rel), dep)
 
 
+to_xcomp_rest = xcomp_propagation_rest(
+    Restriction(name="dep", gov="xcomp", no_sons_of="^(nsubj.*|aux|mark)$", xpos="^(TO)$"))
+basic_xcomp_rest = xcomp_propagation_rest(
+    Restriction(name="dep", gov="xcomp", no_sons_of="nsubj.*", xpos="(?!(^(TO)$)).", nested=[[
+        Restriction(gov="^(aux|mark)$", xpos="(^(TO)$)")
+    ]]))
+
+
 # Add extra nsubj dependencies when collapsing basic dependencies.
 # Some notes copied from SC:
 # 1. In the general case, we look for an aux modifier under an xcomp
@@ -344,18 +343,15 @@ def xcomp_propagation_per_type(sentence, restriction, is_extra=False):
 #   Similarly, "The law tells them when to do so"
 #   Instead of nsubj(do, law) we want nsubj(do, them)
 def eud_xcomp_propagation(sentence):
-    to_xcomp_rest = Restriction(name="dep", gov="xcomp", no_sons_of="^(nsubj.*|aux|mark)$", xpos="^(TO)$")
-    basic_xcomp_rest = Restriction(name="dep", gov="xcomp", no_sons_of="nsubj.*", xpos="(?!(^(TO)$)).", nested=[[
-        Restriction(gov="^(aux|mark)$", xpos="(^(TO)$)")
-    ]])
-
     for xcomp_restriction in [to_xcomp_rest, basic_xcomp_rest]:
         xcomp_propagation_per_type(sentence, xcomp_restriction)
 
 
+xcomp_no_to_rest = xcomp_propagation_rest(
+    Restriction(name="dep", gov="xcomp", no_sons_of="^(aux|mark|nsubj.*)$", xpos="(VB.?)"))
+
+
 def extra_xcomp_propagation_no_to(sentence):
-    xcomp_no_to_rest = Restriction(name="dep", gov="xcomp", no_sons_of="^(aux|mark|nsubj.*)$", xpos="(VB.?)")
-    
     xcomp_propagation_per_type(sentence, xcomp_no_to_rest, True)
 
 
@@ -374,7 +370,7 @@ def advcl_or_dep_propagation_per_type(sentence, restriction, type_, unc, iids):
                 continue
         else:
             if dep not in iids:
-                iids[dep] = 0 if len(iids.values()) == 0 else (max(iids.values()) + 1)
+                iids[dep] = len(iids)
             cur_iid = iids[dep]
             new_subj_str = 'new_subj_opt'
         
@@ -384,54 +380,62 @@ def advcl_or_dep_propagation_per_type(sentence, restriction, type_, unc, iids):
         new_subj.add_edge(add_extra_info("nsubj", type_, phrase=phrase, prevs=rel, iid=cur_iid, uncertain=unc), dep)
 
 
+advcl_to_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
+        Restriction(name="mark", gov="^(aux|mark)$", form="(^(?i:to)$)")
+    ]]),
+    Restriction(name="new_subj", gov=".?obj")
+]]))
+
+
+basic_advcl_rest = compile_restriction(Restriction(name="father", no_sons_of=".?obj", nested=[[
+    Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
+        Restriction(name="mark", gov="^(aux|mark)$", form="(?!(^(?i:as|so|when|if)$)).")
+    ]]),
+    Restriction(name="new_subj", gov="nsubj.*")
+]]))
+
+
+basic_advcl_rest_no_mark = compile_restriction(Restriction(name="father", no_sons_of=".?obj", nested=[[
+    Restriction(name="dep", gov="advcl", no_sons_of="(.subj.*|aux|mark)"),
+    Restriction(name="new_subj", gov="nsubj.*")
+]]))
+
+
 def extra_advcl_propagation(sentence, iids):
-    advcl_to_rest = Restriction(name="father", nested=[[
-        Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
-            Restriction(name="mark", gov="^(aux|mark)$", form="(^(?i:to)$)")
-        ]]),
-        Restriction(name="new_subj", gov=".?obj")
-    ]])
-    
-    basic_advcl_rest = Restriction(name="father", no_sons_of=".?obj", nested=[[
-        Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
-            Restriction(name="mark", gov="^(aux|mark)$", form="(?!(^(?i:as|so|when|if)$)).")
-        ]]),
-        Restriction(name="new_subj", gov="nsubj.*")
-    ]])
-    basic_advcl_rest_no_mark = Restriction(name="father", no_sons_of=".?obj", nested=[[
-        Restriction(name="dep", gov="advcl", no_sons_of="(.subj.*|aux|mark)"),
-        Restriction(name="new_subj", gov="nsubj.*")
-    ]])
-    
     for advcl_restriction in [advcl_to_rest, basic_advcl_rest, basic_advcl_rest_no_mark]:
         advcl_or_dep_propagation_per_type(sentence, advcl_restriction, "advcl", False, iids)
 
 
+ambiguous_advcl_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
+        Restriction(name="mark", gov="^(aux|mark)$", form="(?!(^(?i:as|so|when|if)$)).")
+    ]]),
+    Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
+]]))
+
+
+ambiguous_advcl_rest_no_mark = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="dep", gov="advcl", no_sons_of="(.subj.*|aux|mark)"),
+    Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
+]]))
+
+
 def extra_advcl_ambiguous_propagation(sentence, iids):
-    ambiguous_advcl_rest = Restriction(name="father", nested=[[
-        Restriction(name="dep", gov="advcl", no_sons_of=".subj.*", nested=[[
-            Restriction(name="mark", gov="^(aux|mark)$", form="(?!(^(?i:as|so|when|if)$)).")
-        ]]),
-        Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
-    ]])
-    ambiguous_advcl_rest_no_mark = Restriction(name="father", nested=[[
-        Restriction(name="dep", gov="advcl", no_sons_of="(.subj.*|aux|mark)"),
-        Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
-    ]])
-    
     for advcl_restriction in [ambiguous_advcl_rest, ambiguous_advcl_rest_no_mark]:
         advcl_or_dep_propagation_per_type(sentence, advcl_restriction, "advcl", False, iids)
 
 
-def extra_of_prep_alteration(sentence):
-    of_prep_rest = Restriction(name="root", nested=[[
-        Restriction(name="father", xpos="NN.*", nested=[[
-            Restriction(name="nmod", xpos="NN.*", gov="nmod", nested=[[
-                Restriction(gov="case", form="(?i:of)")
-            ]])
+of_prep_rest = compile_restriction(Restriction(name="root", nested=[[
+    Restriction(name="father", xpos="NN.*", nested=[[
+        Restriction(name="nmod", xpos="NN.*", gov="nmod", nested=[[
+            Restriction(gov="case", form="(?i:of)")
         ]])
     ]])
-    
+]]))
+
+
+def extra_of_prep_alteration(sentence):
     ret = match(sentence.values(), [[of_prep_rest]])
     if not ret:
         return
@@ -442,13 +446,14 @@ def extra_of_prep_alteration(sentence):
         nmod.add_edge(add_extra_info("compound", "nmod", phrase="of", prevs=rel), father)
 
 
-def extra_compound_propagation(sentence):
-    compound_rest = Restriction(name="father", nested=[[
-        Restriction(name="middle_man", gov="(.obj|.subj.*)", xpos="NN.*", nested=[[
-            Restriction(name="compound", gov="compound", xpos="NN.*")
-        ]])
+compound_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="middle_man", gov="(.obj|.subj.*)", xpos="NN.*", nested=[[
+        Restriction(name="compound", gov="compound", xpos="NN.*")
     ]])
-    
+]]))
+
+
+def extra_compound_propagation(sentence):
     ret = match(sentence.values(), [[compound_rest]])
     if not ret:
         return
@@ -457,17 +462,18 @@ def extra_compound_propagation(sentence):
         father, _, _ = name_space['father']
         _, _, rel = name_space['middle_man']
         compound, _, _ = name_space['compound']
-        pure_rel = split_by_at(rel)[0]
+        pure_rel = get_label(rel).relation
         if any([re.match("(.obj|.subj.*)", rel) for head, rel in compound.get_new_relations()]):
             continue
         compound.add_edge(add_extra_info(pure_rel, "compound", dep_type="NULL", uncertain=True, prevs=rel), father)
 
 
+amod_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="amod", gov="amod", no_sons_of="nsubj.*")
+]]))
+
+
 def extra_amod_propagation(sentence):
-    amod_rest = Restriction(name="father", nested=[[
-        Restriction(name="amod", gov="amod", no_sons_of="nsubj.*")
-    ]])
-    
     ret = match(sentence.values(), [[amod_rest]])
     if not ret:
         return
@@ -478,19 +484,25 @@ def extra_amod_propagation(sentence):
         father.add_edge(add_extra_info("nsubj", "amod", prevs=rel), amod)
 
 
-def extra_acl_propagation(sentence):
-    # part1: take care of all acl's that are marked by 'to'
-    acl_to_rest = Restriction(name="root_or_so", nested=[[
-        Restriction(name="verb", xpos="(VB.?)", nested=[[
-            Restriction(name="subj", gov=".subj.*"),
-            Restriction(name="father", diff="subj", nested=[[
-                Restriction(name="acl", gov="acl(?!:relcl)", no_sons_of="nsubj.*", nested=[[
-                    Restriction(name="to", gov="mark", xpos="TO")
-                ]])
+acl_to_rest = compile_restriction(Restriction(name="root_or_so", nested=[[
+    Restriction(name="verb", xpos="(VB.?)", nested=[[
+        Restriction(name="subj", gov=".subj.*"),
+        Restriction(name="father", diff="subj", nested=[[
+            Restriction(name="acl", gov="acl(?!:relcl)", no_sons_of="nsubj.*", nested=[[
+                Restriction(name="to", gov="mark", xpos="TO")
             ]])
         ]])
     ]])
-    
+]]))
+
+
+acl_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="acl", gov="acl(?!:relcl)", no_sons_of="(nsubj.*|mark)")  # TODO: validate that mark can be here only 'to'.
+]]))
+
+
+def extra_acl_propagation(sentence):
+    # part1: take care of all acl's that are marked by 'to'
     ret = match(sentence.values(), [[acl_to_rest]])
     if ret:
         for name_space in ret:
@@ -499,10 +511,6 @@ def extra_acl_propagation(sentence):
             subj.add_edge(add_extra_info("nsubj", "acl", dep_type="NULL", phrase='to', prevs=rel), acl)
     
     # part2: take care of all acl's that are not marked by 'to'
-    acl_rest = Restriction(name="father", nested=[[
-        Restriction(name="acl", gov="acl(?!:relcl)", no_sons_of="(nsubj.*|mark)")  # TODO: validate that mark can be here only 'to'.
-    ]])
-    
     ret = match(sentence.values(), [[acl_rest]])
     if not ret:
         return
@@ -513,35 +521,38 @@ def extra_acl_propagation(sentence):
         father.add_edge(add_extra_info("nsubj", "acl", dep_type="NULL", phrase="REDUCED", prevs=rel), acl)
 
 
+dep_rest = compile_restriction(Restriction(name="father", no_sons_of = ".?obj", nested=[[
+    Restriction(name="dep", gov="dep", no_sons_of=".subj.*"),
+    Restriction(name="new_subj", gov="(nsubj.*)")
+]]))
+
+
+ambiguous_dep_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="dep", gov="dep", no_sons_of=".subj.*"),
+    Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
+]]))
+
+
 def extra_dep_propagation(sentence, iids):
-    dep_rest = Restriction(name="father", no_sons_of = ".?obj", nested=[[
-        Restriction(name="dep", gov="dep", no_sons_of=".subj.*"),
-        Restriction(name="new_subj", gov="(nsubj.*)")
-    ]])
+    for rest in [dep_rest, ambiguous_dep_rest]:
+        advcl_or_dep_propagation_per_type(sentence, rest, "dep", True, iids)
 
-    ambiguous_dea_rest = Restriction(name="father", nested=[[
-        Restriction(name="dep", gov="dep", no_sons_of=".subj.*"),
-        Restriction(name="new_subj_opt", gov="(.?obj|nsubj.*)")
+
+subj_obj_nmod_rest = compile_restriction(Restriction(name="receiver", nested=[[
+    Restriction(name="mediator", gov="(dobj|.subj.*|nmod)", nested=[[
+        Restriction(name="nmod", gov="nmod", nested=[
+            [Restriction(name="like", gov="case", form="like")],
+            [Restriction(name="such_as", gov="case", form="such", nested= [[
+                Restriction(gov="mwe", form="as")
+            ]])]
+        ])
     ]])
-    
-    for rest in [dep_rest, ambiguous_dea_rest]:
-        advcl_or_dep_propagation_per_type(sentence, rest, "dep", True, iids)
+]]))
 
 
 # TODO - unify with other nmods props
 def extra_subj_obj_nmod_propagation_of_nmods(sentence):
-    rest = Restriction(name="receiver", nested=[[
-        Restriction(name="mediator", gov="(dobj|.subj.*|nmod)", nested=[[
-            Restriction(name="nmod", gov="nmod", nested=[
-                [Restriction(name="like", gov="case", form="like")],
-                [Restriction(name="such_as", gov="case", form="such", nested= [[
-                    Restriction(gov="mwe", form="as")
-                ]])]
-            ])
-        ]])
-    ]])
-
-    ret = match(sentence.values(), [[rest]])
+    ret = match(sentence.values(), [[subj_obj_nmod_rest]])
     if not ret:
         return
 
@@ -551,7 +562,7 @@ def extra_subj_obj_nmod_propagation_of_nmods(sentence):
         mediator_rel = name_space['mediator'][2]
     
         phrase = "like" if "like" in name_space else "such_as"
-        nmod.add_edge(add_extra_info(split_by_at(mediator_rel)[0], "nmod", phrase=phrase, prevs=mediator_rel), receiver)
+        nmod.add_edge(add_extra_info(get_label(mediator_rel).relation, "nmod", phrase=phrase, prevs=mediator_rel), receiver)
 
 
 def conj_propagation_of_nmods_per_type(sentence, rest, dont_check_precedence=False):
@@ -582,42 +593,47 @@ def conj_propagation_of_nmods_per_type(sentence, rest, dont_check_precedence=Fal
         
         if '.' not in str(receiver.get_conllu_field("id")) and \
                 (dont_check_precedence or nmod.get_conllu_field("id") > receiver.get_conllu_field("id")):
-            nmod.add_edge(add_extra_info(split_by_at(nmod_rel)[0], "conj", uncertain=True, phrase=cc_assignments[conj], prevs=nmod_rel), receiver)
+            nmod.add_edge(add_extra_info(get_label(nmod_rel).relation, "conj", uncertain=True, phrase=cc_assignments[conj], prevs=nmod_rel), receiver)
 
 
-def extra_conj_propagation_of_nmods(sentence):
-    son_rest = Restriction(name="receiver", no_sons_of="nmod", nested=[[
-        Restriction(name="conj", gov="conj", nested=[[
-            Restriction(name="nmod", gov="nmod(?!(.*@|:poss.*))")
-        ]])
-    ]])
-
-    father_rest = Restriction(nested=[[
-        Restriction(name="receiver", gov="conj"),  # TODO: validate no_sons_of="nmod" isn't needed.
+conj_nmod_son_rest = compile_restriction(Restriction(name="receiver", no_sons_of="nmod", nested=[[
+    Restriction(name="conj", gov="conj", nested=[[
         Restriction(name="nmod", gov="nmod(?!(.*@|:poss.*))")
     ]])
-    
-    for conj_restriction in [son_rest, father_rest]:
+]]))
+
+
+conj_nmod_father_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="receiver", gov="conj"),  # TODO: validate no_sons_of="nmod" isn't needed.
+    Restriction(name="nmod", gov="nmod(?!(.*@|:poss.*))")
+]]))
+
+
+def extra_conj_propagation_of_nmods(sentence):
+    for conj_restriction in [conj_nmod_son_rest, conj_nmod_father_rest]:
         conj_propagation_of_nmods_per_type(sentence, conj_restriction)
 
 
+poss_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="receiver", no_sons_of="(nmod:poss.*|det)", gov="conj", xpos="(?!(PRP|NNP.?|WP))"),
+    Restriction(name="nmod", gov="nmod:poss(?!.*@)")
+]]))
+
+
 def extra_conj_propagation_of_poss(sentence):
-    poss_rest = Restriction(nested=[[
-        Restriction(name="receiver", no_sons_of="(nmod:poss.*|det)", gov="conj", xpos="(?!(PRP|NNP.?|WP))"),
-        Restriction(name="nmod", gov="nmod:poss(?!.*@)")
-    ]])
-    
     conj_propagation_of_nmods_per_type(sentence, poss_rest, True)
 
 
+advmod_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="middle_man", gov="(nmod.*)", nested=[[
+        Restriction(name="advmod", gov="advmod", form=advmod_list),
+        Restriction(name="case", gov="case")
+    ]])
+]]))
+
+
 # phenomena: indexicals
 def extra_advmod_propagation(sentence):
-    advmod_rest = Restriction(name="gov", nested=[[
-        Restriction(name="middle_man", gov="(nmod.*)", nested=[[
-            Restriction(name="advmod", gov="advmod", form=advmod_list),
-            Restriction(name="case", gov="case")
-        ]])
-    ]])
     ret = match(sentence.values(), [[advmod_rest]])
     if not ret:
         return
@@ -629,19 +645,21 @@ def extra_advmod_propagation(sentence):
         case, _, _ = name_space['case']
         
         if gov not in advmod.get_parents():
-            advmod.add_edge(add_extra_info(split_by_at(advmod_rel)[0], "nmod", dep_type="INDEXICAL", phrase=case.get_conllu_field("form"), uncertain=True, prevs=middle_man_rel), gov)
+            advmod.add_edge(add_extra_info(get_label(advmod_rel).relation, "nmod", dep_type="INDEXICAL", phrase=case.get_conllu_field("form"), uncertain=True, prevs=middle_man_rel), gov)
 
 
-# "I went back to prison"
-def extra_nmod_advmod_reconstruction(sentence):
-    # the reason for the form restriction: we dont want to catch "all in all"
-    nmod_advmod_rest = Restriction(name="gov", nested=[[
-        Restriction(name="advmod", gov="advmod", form="(?!(^(?i:all)$))", nested=[[
-            Restriction(name="nmod", gov="nmod", nested=[[
-                Restriction(name="case", gov="case")
-            ]])
+# the reason for the form restriction: we dont want to catch "all in all"
+nmod_advmod_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="advmod", gov="advmod", form="(?!(^(?i:all)$))", nested=[[
+        Restriction(name="nmod", gov="nmod", nested=[[
+            Restriction(name="case", gov="case")
         ]])
     ]])
+]]))
+
+
+# "I went back to prison"
+def extra_nmod_advmod_reconstruction(sentence):
     ret = match(sentence.values(), [[nmod_advmod_rest]])
     if not ret:
         return
@@ -661,17 +679,19 @@ def extra_nmod_advmod_reconstruction(sentence):
         
         mwe = advmod.get_conllu_field("form").lower() + "_" + case.get_conllu_field("form").lower()
         if mwe in nmod_advmod_complex:
-            nmod.add_edge(add_extra_info(add_eud_info(split_by_at(nmod_rel)[0], case.get_conllu_field("form").lower()), "advmod_prep"), gov)
+            nmod.add_edge(add_extra_info(add_eud_info(get_label(nmod_rel).relation, case.get_conllu_field("form").lower()), "advmod_prep"), gov)
         else:
-            advmod.replace_edge(advmod_rel, add_extra_info(split_by_at(case_rel)[0], "advmod_prep"), gov, nmod)
+            advmod.replace_edge(advmod_rel, add_extra_info(get_label(case_rel).relation, "advmod_prep"), gov, nmod)
             case.replace_edge(case_rel, add_extra_info("mwe", "advmod_prep"), nmod, advmod)
-            nmod.replace_edge(nmod_rel, add_extra_info(add_eud_info(split_by_at(nmod_rel)[0], mwe), "advmod_prep"), advmod, gov)
+            nmod.replace_edge(nmod_rel, add_extra_info(add_eud_info(get_label(nmod_rel).relation, mwe), "advmod_prep"), advmod, gov)
+
+
+appos_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="appos", gov="appos")
+]]))
 
 
 def extra_appos_propagation(sentence):
-    appos_rest = Restriction(name="gov", nested=[[
-        Restriction(name="appos", gov="appos")
-    ]])
     ret = match(sentence.values(), [[appos_rest]])
     if not ret:
         return
@@ -682,11 +702,11 @@ def extra_appos_propagation(sentence):
         
         for (gov_head, gov_in_rel) in gov.get_new_relations():
             if (gov_head, gov_in_rel) not in appos.get_new_relations():
-                appos.add_edge(add_extra_info(split_by_at(gov_in_rel)[0], "appos", prevs=gov_in_rel), gov_head)
+                appos.add_edge(add_extra_info(get_label(gov_in_rel).relation, "appos", prevs=gov_in_rel), gov_head)
         
         for (gov_son, gov_out_rel) in gov.get_children_with_rels():
             if re.match("(acl|amod)", gov_out_rel) and (gov_son, gov_out_rel) not in appos.get_children_with_rels():
-                gov_son.add_edge(add_extra_info(split_by_at(gov_out_rel)[0], "appos", prevs=gov_out_rel), appos)
+                gov_son.add_edge(add_extra_info(get_label(gov_out_rel).relation, "appos", prevs=gov_out_rel), appos)
 
 
 # find the closest cc to the conj with precedence for left hand ccs
@@ -705,6 +725,12 @@ def attach_best_cc(conj, ccs, noun, verb):
 
 
 def extra_inner_weak_modifier_verb_reconstruction(sentence, cop_rest, evidential):
+    plan = current_plan.get()
+    # this conversion is called by the copula and evidential ones (rather than by the plan itself),
+    #   so it checks for itself whether it was canceled
+    if "extra_inner_weak_modifier_verb_reconstruction" in plan.canceled:
+        return
+    
     # NOTE: we do this as long as we find what to change, and each time change only one match, instead of fixing all matches found each time.
     #   As every change we do might change what can be found next, and old relations that are matched might be out dated.
     #   But this is bad practice. we dont use the matching properly, and we use while true which might run forever!
@@ -728,7 +754,7 @@ def extra_inner_weak_modifier_verb_reconstruction(sentence, cop_rest, evidential
             
             # The old_root's father cant be 'STATE' or connect via ev. as it means we were already handled.
             #   The old_root's children cant be 'xcomp'(+'JJ') or 'ccomp' as they are handled separately.
-            if any((head.get_conllu_field("form") == "STATE") or (split_by_at(rel)[0] == 'ev') for head, rel in old_root.get_new_relations()):
+            if any((head.get_conllu_field("form") == "STATE") or (get_label(rel).relation == 'ev') for head, rel in old_root.get_new_relations()):
                 old_root = None
                 predecessor = None
                 continue
@@ -738,8 +764,8 @@ def extra_inner_weak_modifier_verb_reconstruction(sentence, cop_rest, evidential
         if not old_root:
             return
         
-        if not g_remove_node_adding_conversions:
-            new_id = predecessor.get_conllu_field('id') + 0.1
+        if not plan.remove_node_adding_conversions:
+            new_id = copy_node_id(predecessor.get_conllu_field('id'))
             new_root = predecessor.copy(new_id=new_id, form="STATE", lemma="_", upos="_", xpos="_", feats="_", head="_", deprel="_", deps=None)
             sentence[new_id] = new_root
         else:
@@ -779,7 +805,7 @@ def extra_inner_weak_modifier_verb_reconstruction(sentence, cop_rest, evidential
             elif re.match("(case)", rel):
                 new_out_rel = "nmod"
             elif "cop" == rel:
-                if g_remove_node_adding_conversions:
+                if plan.remove_node_adding_conversions:
                     child.remove_edge(rel, old_root)
                 else:
                     # 'cop' becomes 'ev' (for event/evidential) to the new root
@@ -834,12 +860,12 @@ def per_type_weak_modified_verb_reconstruction(sentence, rest, type_, ccomp_case
                 new_root.remove_edge(rel, old_root)
                 # find lowest 'ev' of the new root, and make us his 'ev' son
                 inter_root = new_root
-                ev_sons = [c for c,r in inter_root.get_children_with_rels() if 'ev' == r.split('@')[0]]
+                ev_sons = [c for c,r in inter_root.get_children_with_rels() if 'ev' == get_label(r).relation]
                 while ev_sons:
                     inter_root = ev_sons[0]  # TODO2: change to 'ev' son with lowest index?
                     if inter_root == new_root:
                         break
-                    ev_sons = [c for c,r in inter_root.get_children_with_rels() if 'ev' == r.split('@')[0]]
+                    ev_sons = [c for c,r in inter_root.get_children_with_rels() if 'ev' == get_label(r).relation]
                 old_root.add_edge(add_extra_info('ev', rel, dep_type=type_), inter_root)
             elif rel == "mark":
                 # see notes in copula
@@ -853,69 +879,74 @@ def per_type_weak_modified_verb_reconstruction(sentence, rest, type_, ccomp_case
                 child.replace_edge(rel, rel, old_root, new_root)  # TODO4: consult regarding all cases in the world.
 
 
-def extra_copula_reconstruction(sentence):
-    # NOTE: the xpos restriction comes to make sure we catch only non verbal copulas to reconstruct
-    #   (even though it should have been 'aux' instead of 'cop')
-    cop_rest = Restriction(name="father", nested=[[
-        Restriction(name="old_root", xpos="(?!(VB.?))", nested=[[
-            Restriction(name="cop", gov="cop"),
-        ]])
+# NOTE: the xpos restriction comes to make sure we catch only non verbal copulas to reconstruct
+#   (even though it should have been 'aux' instead of 'cop')
+cop_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="old_root", xpos="(?!(VB.?))", nested=[[
+        Restriction(name="cop", gov="cop"),
     ]])
+]]))
+
 
+def extra_copula_reconstruction(sentence):
     extra_inner_weak_modifier_verb_reconstruction(sentence, cop_rest, False)
 
 
+ev_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="old_root", gov="(?!aux.*).", xpos="(VB.?)", lemma=evidential_list, nested=[[
+        Restriction(name="new_root", gov="(xcomp|nmod)", xpos="(JJ.*|NN.*)"),
+    ]])
+]]))
+
+
+ev_xcomp_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="old_root", xpos="(VB.?)", lemma=evidential_list, nested=[[
+        Restriction(name="new_root", gov="xcomp", xpos="(?!(JJ.*|NN.*))"),
+    ]])
+]]))
+
+
+ev_ccomp_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="old_root", xpos="(VB.?)", lemma=evidential_list, nested=[[
+        Restriction(name="new_root", gov="(ccomp)"),
+    ]])
+]]))
+
+
 def extra_evidential_reconstruction(sentence):
     # part1: find all evidential with no following(xcomp that is) main verb,
     #   and add a new node and transfer to him the rootness, like in copula
     # NOTE: we avoid the auxiliary sense of the evidential (in the 'be' case), with the gov restriction
-    ev_rest = Restriction(name="father", nested=[[
-        Restriction(name="old_root", gov="(?!aux.*).", xpos="(VB.?)", lemma=evidential_list, nested=[[
-            Restriction(name="new_root", gov="(xcomp|nmod)", xpos="(JJ.*|NN.*)"),
-        ]])
-    ]])
-    
-    if not g_remove_node_adding_conversions:
+    if not current_plan.get().remove_node_adding_conversions:
         extra_inner_weak_modifier_verb_reconstruction(sentence, ev_rest, True)
     
     # part2: find all evidential with following(xcomp that is) main verb,
     #   and transfer to the main verb rootness
     # NOTE:
     #   1. xpos rest. avoids adjectives as we already treated them.
-    ev_xcomp_rest = Restriction(name="father", nested=[[
-        Restriction(name="old_root", xpos="(VB.?)", lemma=evidential_list, nested=[[
-            Restriction(name="new_root", gov="xcomp", xpos="(?!(JJ.*|NN.*))"),
-        ]])
-    ]])
-
     per_type_weak_modified_verb_reconstruction(sentence, ev_xcomp_rest, "EVIDENTIAL", False)
-    
-    ev_ccomp_rest = Restriction(name="father", nested=[[
-        Restriction(name="old_root", xpos="(VB.?)", lemma=evidential_list, nested=[[
-            Restriction(name="new_root", gov="(ccomp)"),
-        ]])
-    ]])
-    
     per_type_weak_modified_verb_reconstruction(sentence, ev_ccomp_rest, "EVIDENTIAL", True)
 
 
-def extra_aspectual_reconstruction(sentence):
-    aspect_xcomp_rest = Restriction(name="father", nested=[[
-        Restriction(name="old_root", xpos="(VB.?)", lemma=aspectual_list, nested=[[
-            Restriction(name="new_root", gov="xcomp", xpos="(?!JJ)"),
-        ]])
+aspect_xcomp_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="old_root", xpos="(VB.?)", lemma=aspectual_list, nested=[[
+        Restriction(name="new_root", gov="xcomp", xpos="(?!JJ)"),
     ]])
-    
+]]))
+
+
+def extra_aspectual_reconstruction(sentence):
     per_type_weak_modified_verb_reconstruction(sentence, aspect_xcomp_rest, "ASPECTUAL", False)
 
 
-def extra_reported_evidentiality(sentence):
-    reported_rest = Restriction(name="father", nested=[[
-        Restriction(name="ev", lemma=reported_list, nested=[[
-            Restriction(name="new_root", gov="ccomp")
-        ]])
+reported_rest = compile_restriction(Restriction(name="father", nested=[[
+    Restriction(name="ev", lemma=reported_list, nested=[[
+        Restriction(name="new_root", gov="ccomp")
     ]])
-    
+]]))
+
+
+def extra_reported_evidentiality(sentence):
     ret = match(sentence.values(), [[reported_rest]])
     if not ret:
         return
@@ -948,10 +979,18 @@ def reattach_children(old_head, new_head):
 def split_concats_by_index(prep_list, prep_len):
     out = list()
     for i in range(prep_len):
-        out.append("|".join([prep.split("_")[i] for prep in prep_list]))
+        # the exact form (rather than a prefix of it) is what is_prep_seq validates anyway
+        out.append("^(" + "|".join([prep.split("_")[i] for prep in prep_list]) + ")$")
     return out
 
 
+simple_2wp_forms = split_concats_by_index(two_word_preps_regular, 2)
+simple_2wp_rest = compile_restriction(Restriction(nested=[[
+    Restriction(gov="(case|advmod)", no_sons_of=".*", name="w1", form=simple_2wp_forms[0]),
+    Restriction(gov="case", no_sons_of=".*", follows="w1", name="w2", form=simple_2wp_forms[1])
+]]))
+
+
 # for example The street is across from you.
 # The following relations:
 #   advmod(you-6, across-4)
@@ -960,13 +999,7 @@ def split_concats_by_index(prep_list, prep_len):
 #   case(you-6, across-4)
 #   mwe(across-4, from-5)
 def eudpp_process_simple_2wp(sentence):
-    forms = split_concats_by_index(two_word_preps_regular, 2)
-    
-    restriction = Restriction(nested=[[
-        Restriction(gov="(case|advmod)", no_sons_of=".*", name="w1", form="^" + forms[0] + "$"),
-        Restriction(gov="case", no_sons_of=".*", follows="w1", name="w2", form="^" + forms[1] + "$")
-    ]])
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[simple_2wp_rest]])
     if not ret:
         return
     
@@ -982,6 +1015,18 @@ def eudpp_process_simple_2wp(sentence):
         create_mwe([w1, w2], w1_head, "case")
 
 
+complex_2wp_forms = split_concats_by_index(two_word_preps_complex, 2)
+complex_2wp_inner_rest = Restriction(gov="nmod", name="gov2", nested=[[
+    Restriction(name="w2", no_sons_of=".*", form=complex_2wp_forms[1])
+]])
+complex_2wp_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="w1", followed_by="w2", form=complex_2wp_forms[0], nested=[
+        [complex_2wp_inner_rest, Restriction(name="cop", gov="cop")],  # TODO: after adding the copula reconstuction, maybe this would be redundant
+        [complex_2wp_inner_rest]
+    ])
+]]))
+
+
 # for example: He is close to me.
 # The following relations:
 #   nsubj(close-3, He-1)
@@ -996,19 +1041,7 @@ def eudpp_process_simple_2wp(sentence):
 #   mwe(close-3, to-4)
 #   root(ROOT-0, me-6)
 def eudpp_process_complex_2wp(sentence):
-    forms = split_concats_by_index(two_word_preps_complex, 2)
-
-    inner_rest = Restriction(gov="nmod", name="gov2", nested=[[
-        Restriction(name="w2", no_sons_of=".*", form="^" + forms[1] + "$")
-    ]])
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(name="w1", followed_by="w2", form="^" + forms[0] + "$", nested=[
-            [inner_rest, Restriction(name="cop", gov="cop")],  # TODO: after adding the copula reconstuction, maybe this would be redundant
-            [inner_rest]
-        ])
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[complex_2wp_rest]])
     if not ret:
         return
 
@@ -1036,6 +1069,17 @@ def eudpp_process_complex_2wp(sentence):
         create_mwe([w1, w2], gov2, "case")
 
 
+three_wp_forms = split_concats_by_index(three_word_preps, 3)
+three_wp_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="w2", followed_by="w3", follows="w1", form=three_wp_forms[1], nested=[[
+        Restriction(name="gov2", gov="(nmod|acl|advcl)", nested=[[
+            Restriction(name="w3", gov="(case|mark)", no_sons_of=".*", form=three_wp_forms[2])
+        ]]),
+        Restriction(name="w1", gov="^(case)$", no_sons_of=".*", form=three_wp_forms[0])
+    ]])
+]]))
+
+
 # for example: He is close to me.
 # The following relations:
 #   nsubj(front-4, I-1)
@@ -1052,18 +1096,7 @@ def eudpp_process_complex_2wp(sentence):
 #   mwe(in-3, of-5)
 #   root(ROOT-0, you-6)
 def eudpp_process_3wp(sentence):
-    forms = split_concats_by_index(three_word_preps, 3)
-    
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(name="w2", followed_by="w3", follows="w1", form="^" + forms[1] + "$", nested=[[
-            Restriction(name="gov2", gov="(nmod|acl|advcl)", nested=[[
-                Restriction(name="w3", gov="(case|mark)", no_sons_of=".*", form="^" + forms[2] + "$")
-            ]]),
-            Restriction(name="w1", gov="^(case)$", no_sons_of=".*", form="^" + forms[0] + "$")
-        ]])
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[three_wp_rest]])
     if not ret:
         return
     
@@ -1135,38 +1168,41 @@ def demote_per_type(sentence, restriction):
         [child.replace_edge(rel, rel, gov2_head, gov2) for (child, rel) in gov2_head.get_children_with_rels() if rel != "mwe"]
 
 
-def eudpp_demote_quantificational_modifiers(sentence):
-    quant_3w = Restriction(nested=[[
-        Restriction(name="w2", no_sons_of="amod", form=quant_mod_3w, followed_by="w3", nested=[[
-            Restriction(name="w1", gov="det", form="(?i:an?)"),
-            Restriction(name="gov2", gov="nmod", xpos="(NN.*|PRP.*)", nested=[[
-                Restriction(name="w3", gov="case", form="(?i:of)")
-            ]])
+quant_3w_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="w2", no_sons_of="amod", form=quant_mod_3w, followed_by="w3", nested=[[
+        Restriction(name="w1", gov="det", form="(?i:an?)"),
+        Restriction(name="gov2", gov="nmod", xpos="(NN.*|PRP.*)", nested=[[
+            Restriction(name="w3", gov="case", form="(?i:of)")
         ]])
     ]])
-    
-    quant_2w = Restriction(nested=[[
-        Restriction(name="w1", form=quant_mod_2w, followed_by="w2", nested=[[
-            Restriction(name="gov2", gov="nmod", xpos="(NN.*|PRP.*)", nested=[[
-                Restriction(name="w2", gov="case", form="(?i:of)")
-            ]])
+]]))
+
+
+quant_2w_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="w1", form=quant_mod_2w, followed_by="w2", nested=[[
+        Restriction(name="gov2", gov="nmod", xpos="(NN.*|PRP.*)", nested=[[
+            Restriction(name="w2", gov="case", form="(?i:of)")
         ]])
     ]])
-    
-    quant_2w_det = Restriction(nested=[[
-        Restriction(name="w1", form=quant_mod_2w_det, followed_by="w2", nested=[[
-            Restriction(name="gov2", gov="nmod", xpos="(NN.*)", nested=[[
-                Restriction(name="det", gov="det"),
-                Restriction(name="w2", gov="case", form="(?i:of)", followed_by="det")
-            ]])
-        ],
-            [Restriction(name="gov2", gov="nmod", xpos="(PRP.*)", nested=[[
-                Restriction(name="w2", gov="case", form="(?i:of)")
-            ]])
+]]))
+
+
+quant_2w_det_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="w1", form=quant_mod_2w_det, followed_by="w2", nested=[[
+        Restriction(name="gov2", gov="nmod", xpos="(NN.*)", nested=[[
+            Restriction(name="det", gov="det"),
+            Restriction(name="w2", gov="case", form="(?i:of)", followed_by="det")
+        ]])
+    ],
+        [Restriction(name="gov2", gov="nmod", xpos="(PRP.*)", nested=[[
+            Restriction(name="w2", gov="case", form="(?i:of)")
         ]])
     ]])
-    
-    for rl in [quant_3w, quant_2w, quant_2w_det]:
+]]))
+
+
+def eudpp_demote_quantificational_modifiers(sentence):
+    for rl in [quant_3w_rest, quant_2w_rest, quant_2w_det_rest]:
         demote_per_type(sentence, rl)
 
 
@@ -1189,6 +1225,20 @@ def assign_refs(ret):
     return ref_assignments
 
 
+relcl_child_rest = Restriction(name="child_ref", form=relativizing_word_regex)
+relcl_grandchild_rest = Restriction(nested=[[
+    Restriction(name="grand_ref", form=relativizing_word_regex)
+]])
+relcl_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="mod", gov='acl:relcl', nested=[
+        [relcl_grandchild_rest, relcl_child_rest],
+        [relcl_grandchild_rest],
+        [relcl_child_rest],
+        []
+    ]),
+]]))
+
+
 # Look for ref rules for a given word. We look through the
 # children and grandchildren of the acl:relcl dependency, and if any
 # children or grandchildren is a that/what/which/etc word,
@@ -1197,20 +1247,7 @@ def assign_refs(ret):
 # Then we collapse the referent relation such as follows. e.g.:
 # "The man that I love ... " dobj(love, that) -> ref(man, that) dobj(love, man)
 def add_ref_and_collapse_general(sentence, enhanced_plus_plus, enhanced_extra):
-    child_rest = Restriction(name="child_ref", form=relativizing_word_regex)
-    grandchild_rest = Restriction(nested=[[
-        Restriction(name="grand_ref", form=relativizing_word_regex)
-    ]])
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(name="mod", gov='acl:relcl', nested=[
-            [grandchild_rest, child_rest],
-            [grandchild_rest],
-            [child_rest],
-            []
-        ]),
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[relcl_rest]])
     if not ret:
         return
     
@@ -1332,15 +1369,16 @@ def assign_ccs_to_conjs(sentence, ret):
     return cc_assignments
 
 
+conj_info_rest = compile_restriction(Restriction(name="gov", nested=[[
+    Restriction(name="cc", gov="^(cc)$"),
+    Restriction(name="conj", gov="^(conj)$")
+]]))
+
+
 # Adds the type of conjunction to all conjunct relations
 # Some multi-word coordination markers are collapsed to conj:and or conj:negcc
 def eud_conj_info(sentence):
-    restriction = Restriction(name="gov", nested=[[
-        Restriction(name="cc", gov="^(cc)$"),
-        Restriction(name="conj", gov="^(conj)$")
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[conj_info_rest]])
     if not ret:
         return
     
@@ -1391,7 +1429,7 @@ def expand_per_type(sentence, restriction, is_pp):
         # add conj:cc_info('to_copy', copy_node)
         nodes_copied = 1 if to_copy.get_conllu_field('id') != last_copy_id else nodes_copied + 1
         last_copy_id = to_copy.get_conllu_field('id')
-        new_id = to_copy.get_conllu_field('id') + (0.1 * nodes_copied)
+        new_id = copy_node_id(to_copy.get_conllu_field('id'), nodes_copied)
         copy_node = to_copy.copy(
             new_id=new_id,
             head="_",
@@ -1413,6 +1451,27 @@ def expand_per_type(sentence, restriction, is_pp):
             modifier.add_edge(add_eud_info(modifier_rel, conj.get_conllu_field('form')), copy_node)
 
 
+pp_conj_rest = compile_restriction(Restriction(name="to_copy", nested=[[
+    Restriction(name="gov", gov="^(nmod|acl|advcl)$", nested=[[
+        Restriction(gov="case"),
+        Restriction(name="cc", gov="^(cc)$"),
+        Restriction(name="conj", gov="conj", nested=[[
+            Restriction(gov="case")
+        ]])
+    ]])
+]]))
+
+
+prep_conj_rest = compile_restriction(Restriction(name="to_copy", nested=[[
+    Restriction(name="modifier", nested=[[
+        Restriction(name="gov", gov="case", nested=[[
+            Restriction(name="cc", gov="^(cc)$"),
+            Restriction(name="conj", gov="conj")
+        ]])
+    ]])
+]]))
+
+
 # Expands PPs with conjunctions such as in the sentence
 # "Bill flies to France and from Serbia." by copying the verb
 # that governs the prepositional phrase resulting in the following new or changed relations:
@@ -1428,36 +1487,18 @@ def expand_per_type(sentence, restriction, is_pp):
 #   conj:and(flies, flies')
 #   nmod(flies', Serbia)
 def eudpp_expand_pp_or_prep_conjunctions(sentence):
-    pp_restriction = Restriction(name="to_copy", nested=[[
-        Restriction(name="gov", gov="^(nmod|acl|advcl)$", nested=[[
-            Restriction(gov="case"),
-            Restriction(name="cc", gov="^(cc)$"),
-            Restriction(name="conj", gov="conj", nested=[[
-                Restriction(gov="case")
-            ]])
-        ]])
-    ]])
-    
-    prep_restriction = Restriction(name="to_copy", nested=[[
-        Restriction(name="modifier", nested=[[
-            Restriction(name="gov", gov="case", nested=[[
-                Restriction(name="cc", gov="^(cc)$"),
-                Restriction(name="conj", gov="conj")
-            ]])
-        ]])
-    ]])
-    
-    for rl, is_pp in [(pp_restriction, True), (prep_restriction, False)]:
+    for rl, is_pp in [(pp_conj_rest, True), (prep_conj_rest, False)]:
         expand_per_type(sentence, rl, is_pp)
 
 
+npmod_rest = compile_restriction(Restriction(nested=[[
+    Restriction(name="npmod", gov="^nmod:npmod$")
+]]))
+
+
 # TODO: remove when moving to UD-version2
 def extra_fix_nmod_npmod(sentence):
-    restriction = Restriction(nested=[[
-        Restriction(name="npmod", gov="^nmod:npmod$")
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[npmod_rest]])
     if not ret:
         return
     
@@ -1466,15 +1507,16 @@ def extra_fix_nmod_npmod(sentence):
         npmod.replace_edge(npmod_rel, "compound", npmod_head, npmod_head)
 
 
+hyphen_rest = compile_restriction(Restriction(name="subj", nested=[[
+    Restriction(name="verb", gov="^(amod)$", xpos="VB.", nested=[[
+        Restriction(name="hyphen", form="-", gov="^(punct)$", xpos="HYPH"),
+        Restriction(name="noun", gov="^(compound)$", xpos="NN.?")
+    ]]),
+]]))
+
+
 def extra_hyphen_reconstruction(sentence):
-    restriction = Restriction(name="subj", nested=[[
-        Restriction(name="verb", gov="^(amod)$", xpos="VB.", nested=[[
-            Restriction(name="hyphen", form="-", gov="^(punct)$", xpos="HYPH"),
-            Restriction(name="noun", gov="^(compound)$", xpos="NN.?")
-        ]]),
-    ]])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[hyphen_rest]])
     if not ret:
         return
     
@@ -1487,19 +1529,20 @@ def extra_hyphen_reconstruction(sentence):
         noun.add_edge(add_extra_info("nmod", "compound", dep_type="HYPHEN", prevs=noun_rel), verb)
 
 
+passive_alteration_rest = compile_restriction(Restriction(name="predicate", nested=[
+    [
+        Restriction(name="subjpass", gov=".subjpass"),
+        Restriction(name="agent", gov="^(nmod(:agent)?)$", nested=[[
+            Restriction(form="^(?i:by)$")
+        ]])
+    ],
+    [Restriction(name="subjpass", gov=".subjpass")]
+]))
+
+
 # The bottle was broken by me.
 def extra_passive_alteration(sentence):
-    restriction = Restriction(name="predicate", nested=[
-        [
-            Restriction(name="subjpass", gov=".subjpass"),
-            Restriction(name="agent", gov="^(nmod(:agent)?)$", nested=[[
-                Restriction(form="^(?i:by)$")
-            ]])
-        ],
-        [Restriction(name="subjpass", gov=".subjpass")]
-    ])
-    
-    ret = match(sentence.values(), [[restriction]])
+    ret = match(sentence.values(), [[passive_alteration_rest]])
     if not ret:
         return
     
@@ -1527,103 +1570,388 @@ def extra_passive_alteration(sentence):
         subj.add_edge(add_extra_info(subj_new_rel, "passive", prevs=subj_rel), predicate)
     
 
-def convert_sentence(sentence, iids):
-    # The order of eud and eudpp is according to the order of the original CoreNLP.
-    # The extra are our enhancements in which been added where we thought it best.
+# The order of eud and eudpp is according to the order of the original CoreNLP.
+# The extra are our enhancements in which been added where we thought it best.
+conversion_order = [
+    eud_correct_subj_pass,  # correctDependencies - correctSubjPass
+    
+    eudpp_process_simple_2wp,  # processMultiwordPreps: processSimple2WP
+    eudpp_process_complex_2wp,  # processMultiwordPreps: processComplex2WP
+    eudpp_process_3wp,  # processMultiwordPreps: process3WP
+    eudpp_demote_quantificational_modifiers,  # demoteQuantificationalModifiers
+    
+    extra_nmod_advmod_reconstruction,
+    
+    extra_copula_reconstruction,
+    extra_evidential_reconstruction,
+    extra_aspectual_reconstruction,
+    extra_reported_evidentiality,
+    extra_fix_nmod_npmod,
+    extra_hyphen_reconstruction,
+    
+    eudpp_expand_pp_or_prep_conjunctions,  # add copy nodes: expandPPConjunctions, expandPrepConjunctions
+    
+    eud_passive_agent,  # addCaseMarkerInformation
+    eud_heads_of_conjuncts,  # treatCC
+    eud_prep_patterns,  # addCaseMarkerInformation
+    eud_conj_info,  # addConjInformation
+    
+    extra_add_ref_and_collapse,
+    eudpp_add_ref_and_collapse,  # referent: addRef, collapseReferent
+    
+    eud_subj_of_conjoined_verbs,  # treatCC
+    eud_xcomp_propagation,  # addExtraNSubj
+    
+    extra_of_prep_alteration,
+    extra_compound_propagation,
+    extra_xcomp_propagation_no_to,
+    extra_advcl_propagation,
+    extra_advcl_ambiguous_propagation,
+    extra_acl_propagation,
+    extra_amod_propagation,
+    extra_dep_propagation,
+    extra_conj_propagation_of_nmods,
+    extra_conj_propagation_of_poss,
+    extra_advmod_propagation,
+    extra_appos_propagation,
+    extra_subj_obj_nmod_propagation_of_nmods,
+    extra_passive_alteration,
+]
+# the conversions which number the alternatives they create (and so need the iids)
+iids_conversions = {extra_advcl_propagation, extra_advcl_ambiguous_propagation, extra_dep_propagation}
+conversion_names = frozenset([func.__name__ for func in conversion_order] + ["extra_inner_weak_modifier_verb_reconstruction"])
+
+# the labels the conversions read beyond the gov and no_sons_of patterns of their restrictions (see get_conversion_reads),
+#   e.g. by looking at a node's children. ".*" stands for any label, e.g. for conversions which move all of a node's edges.
+conversion_body_reads = {
+    eudpp_process_simple_2wp: ".*",  # create_mwe removes all of the words' edges
+    eudpp_process_complex_2wp: ".*",  # reattach_children
+    eudpp_process_3wp: ".*",  # reattach_children
+    eudpp_demote_quantificational_modifiers: ".*",  # moves all of gov2's head children
+    extra_nmod_advmod_reconstruction: ".*",  # get_parents
+    extra_copula_reconstruction: ".*",  # moves all of the old root's edges
+    extra_evidential_reconstruction: ".*",  # moves all of the old root's edges
+    extra_aspectual_reconstruction: ".*",  # moves all of the old root's edges
+    eudpp_expand_pp_or_prep_conjunctions: ".*",  # looks for previous copies of the node
+    eud_heads_of_conjuncts: ".*",  # compares to all of the conjunct's relations
+    eud_subj_of_conjoined_verbs: "^auxpass$",
+    extra_add_ref_and_collapse: ".*",  # looks at all of the relative clause's children
+    eudpp_add_ref_and_collapse: ".*",  # moves all of the relativizer's children
+    extra_compound_propagation: "(.obj|.subj.*)",
+    extra_advcl_propagation: ".subj.*",
+    extra_advcl_ambiguous_propagation: ".subj.*",
+    extra_dep_propagation: ".subj.*",
+    extra_conj_propagation_of_nmods: "(^cc$|conj)",  # the cc assignments
+    extra_conj_propagation_of_poss: "(^cc$|conj)",  # the cc assignments
+    extra_advmod_propagation: ".*",  # get_parents
+    extra_appos_propagation: ".*",  # propagates all of the governor's relations
+    extra_passive_alteration: ".*",  # looks at the subject's and predicate's children
+}
+
+
+def _referenced_restrictions(func, seen):
+    # the restrictions which a conversion function (or any function of this module it calls) refers to by a global name
+    code_objects = [func.__code__]
+    while code_objects:
+        code = code_objects.pop()
+        code_objects.extend(const for const in code.co_consts if isinstance(const, CodeType))
+        for name in code.co_names:
+            value = func.__globals__.get(name)
+            if isinstance(value, (Restriction, CompiledRestriction)):
+                yield compile_restriction(value)
+            elif isinstance(value, (list, tuple)) and all(isinstance(item, (Restriction, CompiledRestriction)) for item in value):
+                yield from (compile_restriction(item) for item in value)
+            elif isinstance(value, FunctionType) and (value.__module__ == __name__) and (value not in seen):
+                seen.add(value)
+                yield from _referenced_restrictions(value, seen)
+
+
+def _restriction_reads(restriction, is_nested=False):
+    # the label patterns a restriction reads, or None if it can match an edge of any label
+    if (not restriction.gov) and (is_nested or not restriction.nested):
+        return None
+    reads = [pattern for pattern in (restriction.gov, restriction.no_sons_of) if pattern]
+    for restriction_list in restriction.nested or ():
+        for nested_restriction in restriction_list:
+            nested_reads = _restriction_reads(nested_restriction, True)
+            if nested_reads is None:
+                return None
+            reads += nested_reads
+    return reads
+
+
+def get_conversion_reads(func):
+    """Purpose: derives the labels a conversion reads, from the restrictions it matches and its conversion_body_reads.
+    
+    returns:
+        (tuple(callable)) The predicates over labels, an edge whose label satisfies none of them can not change
+            what the conversion does. Or None if it reads edges of any label.
+    """
+    reads = []
+    for restriction in _referenced_restrictions(func, {func}):
+        restriction_reads = _restriction_reads(restriction)
+        if restriction_reads is None:
+            return None
+        reads += restriction_reads
+    body_reads = conversion_body_reads.get(func)
+    if body_reads == ".*":
+        return None
+    if body_reads:
+        reads.append(compile_pattern(body_reads))
+    return tuple(dict.fromkeys(reads))
+
+
+conversion_reads = {func: get_conversion_reads(func) for func in conversion_order}
+
+
+def get_conversion_requirement(func):
+    """Purpose: derives what a sentence must have for a conversion to change anything in it,
+        as a conversion changes nothing unless one of the restrictions it matches matches.
+    
+    returns:
+        (tuple) The requirement (see matcher.restriction_requirement), the empty one if nothing can be told.
+    """
+    requirements = tuple(dict.fromkeys(restriction_requirement(restriction) for restriction in _referenced_restrictions(func, {func})))
+    if (not requirements) or (not all(requirements)):
+        return ()
+    return requirements[0] if len(requirements) == 1 else (("any", requirements),)
+
+
+conversion_requirements = {func: get_conversion_requirement(func) for func in conversion_order}
+
+
+class ConversionPlan:
+    """Purpose: a conversion configuration, ready to be run: the enabled conversions (in order) and the label formatting flags.
+    
+    A plan never changes once built, and running it changes no module state (the running plan is held
+    in a context variable), so conversions with different plans can safely run concurrently,
+    whether in threads or in asyncio tasks. Use get_conversion_plan to get the (cached) plan of a configuration.
+    """
+    def __init__(self, canceled=(), remove_enhanced_extra_info=False, remove_bart_extra_info=False, remove_node_adding_conversions=False):
+        self.canceled = frozenset(canceled)
+        self.remove_enhanced_extra_info = remove_enhanced_extra_info
+        self.remove_bart_extra_info = remove_bart_extra_info
+        self.remove_node_adding_conversions = remove_node_adding_conversions
+        self.conversions = tuple((func, func in iids_conversions) for func in conversion_order if func.__name__ not in self.canceled)
+        # the dependency graph of the conversions: from a label to the conversions which read it (see get_readers)
+        self._reads = tuple(conversion_reads[func] for func, _ in self.conversions)
+        self._readers = dict()
+        # what each conversion needs to find in a sentence to change anything in it
+        self._requirements = tuple(conversion_requirements[func] for func, _ in self.conversions)
+    
+    def get_readers(self, label):
+        """
+        returns:
+            (tuple(int)) The (indices of the) conversions which an added edge of the given label may affect.
+        """
+        readers = self._readers.get(label)
+        if readers is None:
+            readers = tuple(i for i, reads in enumerate(self._reads) if (reads is None) or any(is_match(label) for is_match in reads))
+            self._readers[label] = readers
+        return readers
+    
+    def convert_sentence(self, sentence, iids, stats=None, pending=None, tracer=None):
+        """Purpose: runs the plan's conversions over the sentence, once (a single pass).
+        
+        Args:
+            (dict(Token)) The sentence.
+            (dict) The alternative ids given so far.
+            (ConversionStats) A collector of per conversion stats, or None.
+            (list(bool)) Per conversion, whether it should run in this pass, or None to run them all. It is updated
+                for the next pass: a conversion is pending once something it may depend on changed since it last ran.
+                That is, an edge of a label it reads was added, any edge was removed, or the conversion itself changed
+                the graph (as it may have more to do), so a conversion which is not pending would change nothing.
+                A pending conversion is skipped too when the sentence lacks the labels or words it needs (see SentenceSignature).
+            (incremental.ConversionTracer) The tracer of the sentence's conversion, which runs (or replays) each conversion, or None.
+        
+        returns:
+            (dict(Token)) The converted sentence.
+        """
+        token = current_plan.set(self)
+        try:
+            if tracer is not None:
+                tracer.start_pass()
+            if (stats is None) and (pending is None) and (tracer is None):
+                for func, needs_iids in self.conversions:
+                    if needs_iids:
+                        func(sentence, iids)
+                    else:
+                        func(sentence)
+            else:
+                self._convert_sentence_scheduled(sentence, iids, stats, pending, tracer)
+        finally:
+            current_plan.reset(token)
+        
+        return sentence
+    
+    def _convert_sentence_scheduled(self, sentence, iids, stats, pending, tracer):
+        edge_index = get_sentence_edge_index(sentence)
+        signature = SentenceSignature(sentence, edge_index)
+        if stats is not None:
+            stats.sentence_passes += 1
+        for i, (func, needs_iids) in enumerate(self.conversions):
+            if pending is not None:
+                if not pending[i]:
+                    if stats is not None:
+                        stats.get_rule_stats(func.__name__).skips += 1
+                    continue
+                pending[i] = False
+            if not signature.meets(self._requirements[i]):
+                # a run would change nothing, just like a run which found nothing to do
+                if stats is not None:
+                    stats.get_rule_stats(func.__name__).filtered += 1
+                continue
+            
+            n_added, n_removed = edge_index.n_added, edge_index.n_removed
+            edge_index.added_labels.clear()
+            if tracer is not None:
+                tracer.run_conversion(i, sentence, partial(self._run, func, needs_iids, sentence, iids, stats, edge_index))
+            elif stats is None:
+                if needs_iids:
+                    func(sentence, iids)
+                else:
+                    func(sentence)
+            else:
+                self._run_with_stats(func, needs_iids, sentence, iids, stats.get_rule_stats(func.__name__), edge_index)
+            
+            if (pending is None) or ((edge_index.n_added == n_added) and (edge_index.n_removed == n_removed)):
+                continue
+            pending[i] = True
+            if edge_index.n_removed != n_removed:
+                pending[:] = [True] * len(pending)
+            else:
+                for label in edge_index.added_labels:
+                    for reader in self.get_readers(label):
+                        pending[reader] = True
+    
+    @classmethod
+    def _run(cls, func, needs_iids, sentence, iids, stats, edge_index):
+        if stats is None:
+            if needs_iids:
+                func(sentence, iids)
+            else:
+                func(sentence)
+        else:
+            cls._run_with_stats(func, needs_iids, sentence, iids, stats.get_rule_stats(func.__name__), edge_index)
     
-    eud_correct_subj_pass(sentence)  # correctDependencies - correctSubjPass
-
-    eudpp_process_simple_2wp(sentence)  # processMultiwordPreps: processSimple2WP
-    eudpp_process_complex_2wp(sentence)  # processMultiwordPreps: processComplex2WP
-    eudpp_process_3wp(sentence)  # processMultiwordPreps: process3WP
-    eudpp_demote_quantificational_modifiers(sentence)  # demoteQuantificationalModifiers
+    @staticmethod
+    def _run_with_stats(func, needs_iids, sentence, iids, rule_stats, edge_index):
+        n_added, n_removed, n_nodes = edge_index.n_added, edge_index.n_removed, len(sentence)
+        token = current_rule_stats.set(rule_stats)
+        start = perf_counter()
+        try:
+            if needs_iids:
+                func(sentence, iids)
+            else:
+                func(sentence)
+        finally:
+            rule_stats.time += perf_counter() - start
+            current_rule_stats.reset(token)
+        rule_stats.calls += 1
+        rule_stats.edges_added += edge_index.n_added - n_added
+        rule_stats.edges_removed += edge_index.n_removed - n_removed
+        rule_stats.nodes_added += len(sentence) - n_nodes
+        if (edge_index.n_added != n_added) or (edge_index.n_removed != n_removed):
+            rule_stats.changes += 1
 
-    extra_nmod_advmod_reconstruction(sentence)
-    
-    extra_copula_reconstruction(sentence)
-    extra_evidential_reconstruction(sentence)
-    extra_aspectual_reconstruction(sentence)
-    extra_reported_evidentiality(sentence)
-    extra_fix_nmod_npmod(sentence)
-    extra_hyphen_reconstruction(sentence)
 
-    eudpp_expand_pp_or_prep_conjunctions(sentence)  # add copy nodes: expandPPConjunctions, expandPrepConjunctions
+# the plan of the running conversion, conversion functions which are called directly use the default plan
+current_plan = ContextVar("current_plan", default=ConversionPlan())
 
-    eud_passive_agent(sentence)  # addCaseMarkerInformation
-    eud_heads_of_conjuncts(sentence)  # treatCC
-    eud_prep_patterns(sentence)  # addCaseMarkerInformation
-    eud_conj_info(sentence)  # addConjInformation
 
-    extra_add_ref_and_collapse(sentence)
-    eudpp_add_ref_and_collapse(sentence)  # referent: addRef, collapseReferent
+def convert_sentence(sentence, iids, stats=None):
+    return current_plan.get().convert_sentence(sentence, iids, stats)
 
-    eud_subj_of_conjoined_verbs(sentence)  # treatCC
-    eud_xcomp_propagation(sentence)  # addExtraNSubj
 
-    extra_of_prep_alteration(sentence)
-    extra_compound_propagation(sentence)
-    extra_xcomp_propagation_no_to(sentence)
-    extra_advcl_propagation(sentence, iids)
-    extra_advcl_ambiguous_propagation(sentence, iids)
-    extra_acl_propagation(sentence)
-    extra_amod_propagation(sentence)
-    extra_dep_propagation(sentence, iids)
-    extra_conj_propagation_of_nmods(sentence)
-    extra_conj_propagation_of_poss(sentence)
-    extra_advmod_propagation(sentence)
-    extra_appos_propagation(sentence)
-    extra_subj_obj_nmod_propagation_of_nmods(sentence)
-    extra_passive_alteration(sentence)
+@lru_cache(maxsize=128)
+def _build_conversion_plan(enhanced, enhanced_plus_plus, enhanced_extra, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel):
+    for func_name in funcs_to_cancel:
+        if func_name not in conversion_names:
+            raise ValueError(f"{func_name} is not a real function name")
     
-    return sentence
-
-
-def override_funcs(enhanced, enhanced_plus_plus, enhanced_extra, remove_enhanced_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel):
+    canceled = set(funcs_to_cancel)
     if not enhanced:
-        funcs_to_cancel.update_funcs_by_prefix('eud_')
+        canceled.update(func_name for func_name in conversion_names if func_name.startswith('eud_'))
     if not enhanced_plus_plus:
-        funcs_to_cancel.update_funcs_by_prefix('eudpp_')
+        canceled.update(func_name for func_name in conversion_names if func_name.startswith('eudpp_'))
     if not enhanced_extra:
-        funcs_to_cancel.update_funcs_by_prefix('extra_')
+        canceled.update(func_name for func_name in conversion_names if func_name.startswith('extra_'))
     if remove_enhanced_extra_info:
-        funcs_to_cancel.update_funcs(['eud_passive_agent', 'eud_conj_info'])
+        canceled.update(['eud_passive_agent', 'eud_conj_info'])
     if remove_node_adding_conversions:
-        funcs_to_cancel.update_funcs(['eudpp_expand_pp_or_prep_conjunctions'])  # no need to cancel extra_inner_weak_modifier_verb_reconstruction as we have a special treatment there
+        canceled.update(['eudpp_expand_pp_or_prep_conjunctions'])  # no need to cancel extra_inner_weak_modifier_verb_reconstruction as we have a special treatment there
     if remove_unc:
-        funcs_to_cancel.update_funcs(['extra_dep_propagation', 'extra_compound_propagation', 'extra_conj_propagation_of_poss', 'extra_conj_propagation_of_nmods', 'extra_advmod_propagation', 'extra_advcl_ambiguous_propagation'])
+        canceled.update(['extra_dep_propagation', 'extra_compound_propagation', 'extra_conj_propagation_of_poss', 'extra_conj_propagation_of_nmods', 'extra_advmod_propagation', 'extra_advcl_ambiguous_propagation'])
     if query_mode:
-        all_funcs = ConvsCanceler.get_conversion_names()
-        all_funcs.difference_update(['extra_nmod_advmod_reconstruction', 'extra_copula_reconstruction', 'extra_evidential_reconstruction', 'extra_inner_weak_modifier_verb_reconstruction', 'extra_aspectual_reconstruction', 'eud_correct_subj_pass', 'eud_passive_agent', 'eud_conj_info', 'eud_prep_patterns', 'eudpp_process_simple_2wp', 'eudpp_process_complex_2wp', 'eudpp_process_3wp', 'eudpp_demote_quantificational_modifiers'])
-        funcs_to_cancel.update_funcs(all_funcs)
+        canceled.update(conversion_names.difference(['extra_nmod_advmod_reconstruction', 'extra_copula_reconstruction', 'extra_evidential_reconstruction', 'extra_inner_weak_modifier_verb_reconstruction', 'extra_aspectual_reconstruction', 'eud_correct_subj_pass', 'eud_passive_agent', 'eud_conj_info', 'eud_prep_patterns', 'eudpp_process_simple_2wp', 'eudpp_process_complex_2wp', 'eudpp_process_3wp', 'eudpp_demote_quantificational_modifiers']))
     
-    funcs_to_cancel.override_funcs()
+    return ConversionPlan(canceled, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions)
 
 
-def get_rel_set(converted_sentences):
-    return set([(head.get_conllu_field("form"), rel, tok.get_conllu_field("form")) for sent in converted_sentences for tok in sent.values() for (head, rel) in tok.get_new_relations()])
+def get_conversion_plan(enhanced=True, enhanced_plus_plus=True, enhanced_extra=True, remove_enhanced_extra_info=False, remove_bart_extra_info=False, remove_node_adding_conversions=False, remove_unc=False, query_mode=False, funcs_to_cancel=None):
+    """Purpose: returns the conversion plan of the given configuration, built once per configuration.
+    
+    Args:
+        (bool) flags: as in convert.
+        (ConvsCanceler or iterable(str)) The names of conversions to cancel, if any.
+    
+    returns:
+        (ConversionPlan) The plan.
+    
+    Raises:
+        ValueError: a conversion to cancel is not a real conversion name.
+    """
+    if isinstance(funcs_to_cancel, ConvsCanceler):
+        funcs_to_cancel = funcs_to_cancel.cancel_list
+    return _build_conversion_plan(enhanced, enhanced_plus_plus, enhanced_extra, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions, remove_unc, query_mode, frozenset(funcs_to_cancel or ()))
 
 
-def convert(parsed, enhanced, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel):
-    global g_remove_enhanced_extra_info, g_remove_bart_extra_info, g_remove_node_adding_conversions
-    g_remove_enhanced_extra_info = remove_enhanced_extra_info
-    g_remove_bart_extra_info = remove_bart_extra_info
-    g_remove_node_adding_conversions = remove_node_adding_conversions
+def convert(parsed, enhanced, enhanced_plus_plus, enhanced_extra, conv_iterations, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel, iid_log=None, stats=None, cache=None):
+    plan = get_conversion_plan(enhanced, enhanced_plus_plus, enhanced_extra, remove_enhanced_extra_info, remove_bart_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
+    if cache is not None:
+        # imported here, as the cache module builds on this one
+        from .cache import convert_with_cache
+        return convert_with_cache(cache, plan, parsed, conv_iterations, iid_log, stats)
+    return run_conversion_plan(plan, parsed, conv_iterations, iid_log, stats)
+
+
+def run_conversion_plan(plan, parsed, conv_iterations, iid_log=None, stats=None, tracers=None):
+    """Purpose: converts the parsed sentences (in place) by the given plan, see convert.
+    
+    Args:
+        (list(incremental.ConversionTracer)) Per sentence, the tracer of its conversion (see ConversionPlan.convert_sentence), or None.
+        (the rest as in convert)
+    
+    returns:
+        (list(dict(Token))) The converted sentences.
+        (list(int)) The number of conversion passes which changed each sentence.
+    """
     iids = dict()
     
-    override_funcs(enhanced, enhanced_plus_plus, enhanced_extra, remove_enhanced_extra_info, remove_node_adding_conversions, remove_unc, query_mode, funcs_to_cancel)
-    
-    # we iterate till convergence or till user defined maximum is reached - the first to come.
-    converted_sentences = parsed
-    i = 0
-    while i < conv_iterations:
-        last_converted_sentences = get_rel_set(converted_sentences)
-        temp = []
-        for sentence in converted_sentences:
-            temp.append(convert_sentence(sentence, iids))
-        converted_sentences = temp
-        if get_rel_set(converted_sentences) == last_converted_sentences:
-            break
-        i += 1
-    
-    funcs_to_cancel.restore_funcs()
-    return converted_sentences, i
+    # we iterate each sentence till its convergence or till user defined maximum is reached - the first to come.
+    #   a sentence converged once a whole pass left its edges as they were, as any further pass would do the same,
+    #   so converged sentences drop out of the loop, and each sentence counts the passes that changed it.
+    #   passes after the first run only the conversions which may have something new to do (see ConversionPlan.convert_sentence).
+    converted_sentences = list(parsed)
+    convs_done = [0] * len(converted_sentences)
+    unconverged = [(i, get_sentence_edge_index(sentence), [True] * len(plan.conversions)) for i, sentence in enumerate(converted_sentences)] if conv_iterations > 0 else []
+    pass_num = 0
+    while unconverged:
+        still_unconverged = []
+        for i, edge_index, pending in unconverged:
+            edge_index.reset_journal()
+            iids_before = len(iids)
+            converted_sentences[i] = plan.convert_sentence(converted_sentences[i], iids, stats, pending, tracers[i] if tracers else None)
+            # record which alternative ids each sentence got at each pass (see parallel.py for its use)
+            if (iid_log is not None) and (len(iids) != iids_before):
+                iid_log.append((pass_num, i, iids_before, len(iids)))
+            if edge_index.is_changed():
+                convs_done[i] += 1
+                if convs_done[i] < conv_iterations:
+                    still_unconverged.append((i, edge_index, pending))
+                    continue
+            edge_index.reset_journal()
+        unconverged = still_unconverged
+        pass_num += 1
+    
+    return converted_sentences, convs_done
@@ -0,0 +1,267 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from .graph_token import CopyNodeId, sentence_from_state
+from .labels import get_label
+
+# the first (and last) bytes of a corpus file, bump the digit when the layout changes
+CORPUS_MAGIC = b"PYBARTC1"
+# the offsets and sizes of the file's tables, at its end (before the closing magic)
+_trailer = struct.Struct("<8q")
+# the CoNLL-U fields of a token (after its id) which are kept as strings (the head is kept as a number)
+_string_fields = (1, 2, 3, 4, 5, 7, 8, 9)
+# the heads which are not token ids, by the numbers they are kept as
+_special_heads = {-1: None, -2: "_"}
+# a string of the strings table which was not read yet
+_undecoded = object()
+
+_little_endian = sys.byteorder == "little"
+
+
+def _to_bytes(values, typecode):
+    values = array(typecode, values)
+    if not _little_endian:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _pad(size):
+    # the tables start at multiples of 8 bytes, so their numbers are aligned
+    return b"\0" * (-size % 8)
+
+
+def write_corpus(out_file, converted):
+    """Purpose: writes converted sentences in the binary corpus format, to be read (with random access) by Corpus.
+    
+    A sentence is a record of int32 arrays: its nodes' ids, their CoNLL-U fields (as ids in the strings table),
+    their edges (as heads and ids in the labels table, in each node's order) with the extra info of edges,
+    and their children (in order), so the read sentence is the very same graph (see graph_token.sentence_to_state).
+    The strings (of the fields and labels) and the labels (each a relation and the source of the edge after its '@',
+    see labels.Label) are kept once per file, in tables after the sentences, followed by the offset of each sentence.
+    The sentences are written one at a time, so they can come from a generator.
+    
+    Args:
+        (file) The output (binary) stream.
+        (iterable(dict(Token))) The (converted) sentences.
+    
+    returns:
+        (int) The number of sentences written.
+    
+    Raises:
+        ValueError: a node id which is neither an int nor a copy node id, a head which is not an int (or '_'),
+            another field which is not a string, or an edge extra info which is not an int.
+    """
+    strings = dict()
+    labels = dict()
+    # the relation and source string ids of each label
+    labels_table = []
+    
+    def string_id(value):
+        if value is None:
+            return -1
+        if type(value) is not str:
+            raise ValueError(f"a CoNLL-U field (but the id and head) must be a string, got {value!r}.")
+        return strings.setdefault(value, len(strings))
+    
+    def label_id(rel):
+        rel = get_label(rel)
+        if rel not in labels:
+            labels[rel] = len(labels)
+            labels_table.extend((string_id(rel.relation), string_id(rel.source)))
+        return labels[rel]
+    
+    out_file.write(CORPUS_MAGIC)
+    offset = len(CORPUS_MAGIC)
+    sentence_offsets = [offset]
+    for sentence in converted:
+        position = {token: i for i, token in enumerate(sentence.values())}
+        ids = []
+        fields = []
+        heads = []
+        edge_offsets = [0]
+        edges = []
+        child_offsets = [0]
+        children = []
+        extra_info_edges = []
+        for key, token in sentence.items():
+            conllu_fields = token.get_conllu_fields()
+            ids.extend(_id_to_pair(key) + _id_to_pair(conllu_fields[0]))
+            fields.extend(string_id(conllu_fields[field]) for field in _string_fields)
+            heads.append(_head_to_int(conllu_fields[6]))
+            edges.extend(value for head, rel in token.get_new_relations() for value in (position[head], label_id(rel)))
+            edge_offsets.append(len(edges) // 2)
+            children.extend(position[child] for child in token.get_children())
+            child_offsets.append(len(children))
+            for (head, rel), info in token.get_extra_info_edges().items():
+                if type(info) is not int:
+                    raise ValueError(f"an edge extra info must be an int, got {info!r}.")
+                extra_info_edges.extend((position[token], position[head], label_id(rel), info))
+        
+        record = _to_bytes([len(sentence), len(edges) // 2, len(children), len(extra_info_edges) // 4] + ids + fields + heads + edge_offsets +
+                           edges + child_offsets + children + extra_info_edges, 'i')
+        out_file.write(record)
+        offset += len(record)
+        sentence_offsets.append(offset)
+    
+    # the strings table: the utf-8 bytes of all the strings, and the offset of each
+    encoded = [string.encode() for string in strings]
+    strings_offset = offset
+    blob = b"".join(encoded)
+    out_file.write(blob + _pad(len(blob)))
+    offset += len(blob) + len(_pad(len(blob)))
+    string_offsets_offset = offset
+    string_offsets = [0]
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    out_file.write(_to_bytes(string_offsets, 'q'))
+    offset += 8 * len(string_offsets)
+    
+    labels_offset = offset
+    out_file.write(_to_bytes(labels_table, 'i') + _pad(4 * len(labels_table)))
+    offset += 4 * len(labels_table) + len(_pad(4 * len(labels_table)))
+    
+    sentences_offset = offset
+    out_file.write(_to_bytes(sentence_offsets, 'q'))
+    out_file.write(_trailer.pack(strings_offset, len(blob), string_offsets_offset, len(strings), labels_offset, len(labels),
+                                 sentences_offset, len(sentence_offsets) - 1))
+    out_file.write(CORPUS_MAGIC)
+    return len(sentence_offsets) - 1
+
+
+def _id_to_pair(node_id):
+    if isinstance(node_id, CopyNodeId):
+        return [node_id.node_id, node_id.copy_index]
+    if type(node_id) is not int:
+        raise ValueError(f"a node id must be an int or a copy node id, got {node_id!r}.")
+    return [node_id, 0]
+
+
+def _head_to_int(head):
+    if head is None:
+        return -1
+    if head == "_":
+        return -2
+    if type(head) is not int:
+        raise ValueError(f"a head must be an int (or '_'), got {head!r}.")
+    return head
+
+
+class Corpus(object):
+    """Purpose: a corpus file written by write_corpus, read through mmap.
+    
+    Opening it reads only its tables' offsets, and the labels table. A sentence is read (and its Token graph built)
+    only once it is asked for, by its index, and its strings are decoded once per Corpus.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            (str) The corpus file.
+        
+        Raises:
+            ValueError: a file which is not a corpus file (of this version).
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mmap)
+        magic_size = len(CORPUS_MAGIC)
+        if (size < 2 * magic_size + _trailer.size) or (self._mmap[:magic_size] != CORPUS_MAGIC) or \
+                (self._mmap[size - magic_size:] != CORPUS_MAGIC):
+            self._mmap.close()
+            raise ValueError(f"{path} is not a pybart corpus file (of this version).")
+        strings_offset, _, string_offsets_offset, n_strings, labels_offset, n_labels, sentences_offset, n_sentences = \
+            _trailer.unpack_from(self._mmap, size - magic_size - _trailer.size)
+        
+        self._strings_offset = strings_offset
+        self._string_offsets = self._read(string_offsets_offset, n_strings + 1, 'q')
+        # (with a None at the end, for the string id -1)
+        self._strings = [_undecoded] * n_strings + [None]
+        self._sentence_offsets = self._read(sentences_offset, n_sentences + 1, 'q')
+        labels_table = self._read(labels_offset, 2 * n_labels, 'i')
+        self.labels = [get_label(self._get_string(labels_table[2 * i]) +
+                                 ("@" + self._get_string(labels_table[2 * i + 1]) if labels_table[2 * i + 1] != -1 else ""))
+                       for i in range(n_labels)]
+    
+    def _read(self, offset, count, typecode):
+        # the numbers at the offset (copied out of the mapped file, so it can be closed at any time)
+        values = array(typecode)
+        values.frombytes(self._mmap[offset:offset + count * values.itemsize])
+        if not _little_endian:
+            values.byteswap()
+        return values
+    
+    def _get_string(self, string_id):
+        string = self._strings[string_id]
+        if string is _undecoded:
+            start = self._strings_offset + self._string_offsets[string_id]
+            string = self._strings[string_id] = self._mmap[start:self._strings_offset + self._string_offsets[string_id + 1]].decode()
+        return string
+    
+    def __len__(self):
+        return len(self._sentence_offsets) - 1
+    
+    def __getitem__(self, index):
+        """
+        Args:
+            (int) The index of the sentence (negative ones count from the end).
+        
+        returns:
+            (dict(Token)) The sentence, a new graph on each call.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"sentence index out of range (the corpus has {len(self)} sentences)")
+        return sentence_from_state(self._get_state(index))
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+    
+    def _get_state(self, index):
+        # the sentence's record, as graph_token.sentence_to_state would have flattened it
+        start = self._sentence_offsets[index]
+        n_nodes, n_edges, n_children, n_extra = self._read(start, 4, 'i')
+        values = self._read(start + 16, (self._sentence_offsets[index + 1] - start - 16) // 4, 'i')
+        ids = values[:4 * n_nodes]
+        fields = values[4 * n_nodes:12 * n_nodes]
+        heads = [_special_heads.get(head, head) for head in values[12 * n_nodes:13 * n_nodes]]
+        edge_offsets = values[13 * n_nodes:14 * n_nodes + 1]
+        edges_start = 14 * n_nodes + 1
+        edges = values[edges_start:edges_start + 2 * n_edges]
+        child_offsets = values[edges_start + 2 * n_edges:edges_start + 2 * n_edges + n_nodes + 1]
+        children_start = edges_start + 2 * n_edges + n_nodes + 1
+        children = values[children_start:children_start + n_children]
+        extra = values[children_start + n_children:children_start + n_children + 4 * n_extra]
+        
+        extra_info_edges = [[] for _ in range(n_nodes)]
+        for i in range(n_extra):
+            child, head, label, info = extra[4 * i:4 * i + 4]
+            extra_info_edges[child].append((head, self.labels[label], info))
+        
+        strings = [self._strings[string_id] for string_id in fields]
+        if _undecoded in strings:
+            strings = [self._get_string(string_id) for string_id in fields]
+        
+        state = []
+        for i in range(n_nodes):
+            conllu_fields = (ids[4 * i + 2] if not ids[4 * i + 3] else (ids[4 * i + 2], ids[4 * i + 3]),) + tuple(strings[8 * i:8 * i + 5]) + \
+                (heads[i],) + tuple(strings[8 * i + 5:8 * i + 8])
+            new_deps = dict()
+            for j in range(edge_offsets[i], edge_offsets[i + 1]):
+                new_deps.setdefault(edges[2 * j], []).append(self.labels[edges[2 * j + 1]])
+            key = ids[4 * i] if not ids[4 * i + 1] else (ids[4 * i], ids[4 * i + 1])
+            state.append((key, conllu_fields, list(new_deps.items()), list(children[child_offsets[i]:child_offsets[i + 1]]),
+                          extra_info_edges[i]))
+        return state
+    
+    def close(self):
+        self._mmap.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
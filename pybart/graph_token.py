@@ -1,54 +1,181 @@
 import re
+from types import MappingProxyType
+
+from .labels import get_label
+
+
+class EdgeIndex(object):
+    """Purpose: indexes the edges of a single sentence by their relation label.
+    
+    All the tokens of a sentence share one index (see add_basic_edges),
+    and Token.add_edge/remove_edge keep it up to date.
+    It also journals the net edge edits since the last reset, so one can cheaply tell whether the sentence changed.
+    """
+    def __init__(self):
+        self._edges_by_label = dict()
+        self._journal = dict()
+        # the (gross) number of edge edits ever made, for the conversion stats and the conversion scheduling
+        self.n_added = 0
+        self.n_removed = 0
+        # the labels of the edges added since this was last cleared (see ConversionPlan.convert_sentence)
+        self.added_labels = set()
+    
+    def add(self, rel, child, head):
+        rel = get_label(rel)
+        # (short) lists rather than sets, as they take a fraction of the memory
+        if rel in self._edges_by_label:
+            self._edges_by_label[rel].append((child, head))
+        else:
+            self._edges_by_label[rel] = [(child, head)]
+        self._journal[(child, head, rel)] = self._journal.get((child, head, rel), 0) + 1
+        self.n_added += 1
+        self.added_labels.add(rel)
+    
+    def remove(self, rel, child, head):
+        edges = self._edges_by_label[rel]
+        edges.remove((child, head))
+        if not edges:
+            del self._edges_by_label[rel]
+        self._journal[(child, head, rel)] = self._journal.get((child, head, rel), 0) - 1
+        self.n_removed += 1
+    
+    def reset_journal(self):
+        self._journal.clear()
+    
+    def is_changed(self):
+        # an edge which was removed and then added back (or vice versa) is no change
+        return any(self._journal.values())
+    
+    def get_labels(self):
+        return self._edges_by_label.keys()
+    
+    def get_edges(self, rel):
+        return self._edges_by_label.get(rel, ())
+    
+    def get_matching_edges(self, is_match):
+        """Purpose: all (child, head) edges whose label satisfies the given predicate (e.g. a compiled pattern).
+        
+        This is how label prefixes (nmod:*, .subj*, ...) are looked up: the predicate is evaluated once per distinct
+        label, rather than once per edge (see Label.matches).
+        """
+        return [edge for rel, edges in self._edges_by_label.items() if rel.matches(is_match) for edge in edges]
+
+
+# the copies a single node can have (see CopyNodeId)
+MAX_COPIES = 999
+
+
+class CopyNodeId(float):
+    """Purpose: the id of a copy node (e.g. 3.2 for the second copy of node 3).
+    
+    It is a number between its node's id and the next one, so it sorts among (and compares with) the token ids,
+    but it keeps its copy index, so it is written as such: the tenth copy is 3.10, which comes after 3.9 (and is not 3.1).
+    """
+    __slots__ = ("node_id", "copy_index")
+    
+    def __new__(cls, node_id, copy_index):
+        if not 0 < copy_index <= MAX_COPIES:
+            raise ValueError(f"a node can have 1 to {MAX_COPIES} copies, got copy {copy_index}")
+        self = float.__new__(cls, node_id + copy_index / (MAX_COPIES + 1))
+        self.node_id = node_id
+        self.copy_index = copy_index
+        return self
+    
+    def __repr__(self):
+        return f"{self.node_id}.{self.copy_index}"
+    
+    __str__ = __repr__
+    
+    def __reduce__(self):
+        return CopyNodeId, (self.node_id, self.copy_index)
+
+
+def copy_node_id(node_id, nth=1):
+    """Purpose: the id of the nth copy of the given node (for a copy node, the nth copy after it, e.g. 3.2 for 3.1)."""
+    if isinstance(node_id, CopyNodeId):
+        return CopyNodeId(node_id.node_id, node_id.copy_index + nth)
+    return CopyNodeId(node_id, nth)
+
+
+# format of CoNLL-U as described here: https://universaldependencies.org/format.html
+conllu_fields = ("id", "form", "lemma", "upos", "xpos", "feats", "head", "deprel", "deps", "misc")
+# the Token slot of each CoNLL-U field
+_field_slots = {field: "_" + field for field in conllu_fields}
+_no_extra_info_edges = MappingProxyType(dict())
 
 
 class Token(object):
+    # slots rather than a per token __dict__ (and a dict of the CoNLL-U fields), as we keep lots of tokens in memory
+    __slots__ = tuple(_field_slots.values()) + ("_children", "_new_deps", "_extra_info_edges", "_edge_index")
+    
     def __init__(self, new_id, form, lemma, upos, xpos, feats, head, deprel, deps, misc):
-        # format of CoNLL-U as described here: https://universaldependencies.org/format.html
-        self._conllu_info = {"id": new_id, "form": form, "lemma": lemma, "upos": upos, "xpos": xpos,
-                             "feats": feats, "head": head, "deprel": deprel, "deps": deps, "misc": misc}
-        self._children_list = []
+        self._id = new_id
+        self._form = form
+        self._lemma = lemma
+        self._upos = upos
+        self._xpos = xpos
+        self._feats = feats
+        self._head = head
+        self._deprel = deprel
+        self._deps = deps
+        self._misc = misc
+        # an (insertion ordered) set of the children, for O(1) removal
+        self._children = dict()
         self._new_deps = dict()
-        self._extra_info_edges = dict()
+        # allocated on the first edge with extra info, as most tokens have none
+        self._extra_info_edges = None
+        self._edge_index = None
     
     def copy(self, new_id=None, form=None, lemma=None, upos=None, xpos=None, feats=None, head=None, deprel=None, deps=None, misc=None):
-        new_id_copy, form_copy, lemma_copy, upos_copy, xpos_copy, feats_copy, head_copy, deprel_copy, deps_copy, misc_copy = self._conllu_info.values()
-        return Token(new_id if new_id else new_id_copy,
-                     form if form else form_copy,
-                     lemma if lemma else lemma_copy,
-                     upos if upos else upos_copy,
-                     xpos if xpos else xpos_copy,
-                     feats if feats else feats_copy,
-                     head if head else head_copy,
-                     deprel if deprel else deprel_copy,
-                     deps if deps else deps_copy,
-                     misc if misc else misc_copy)
+        copied = Token(new_id if new_id else self._id,
+                       form if form else self._form,
+                       lemma if lemma else self._lemma,
+                       upos if upos else self._upos,
+                       xpos if xpos else self._xpos,
+                       feats if feats else self._feats,
+                       head if head else self._head,
+                       deprel if deprel else self._deprel,
+                       deps if deps else self._deps,
+                       misc if misc else self._misc)
+        # a copy (e.g. a copy node) is part of the same sentence
+        copied._edge_index = self._edge_index
+        return copied
     
     def add_child(self, child):
-        self._children_list.append(child)
+        self._children[child] = None
     
     def remove_child(self, child):
-        self._children_list.remove(child)
+        del self._children[child]
     
     def get_children(self):
-        return self._children_list
+        return self._children.keys()
     
     def get_children_with_rels(self):
         return [(child, relation[1]) for child in self.get_children() for relation in child.get_new_relations(self)]
     
-    def get_conllu_string(self):
-        # for 'deps' field, we need to sort the new relations and then add them with '|' separation,
+    def get_deps_string(self):
+        # for 'deps' field, we need to sort the new relations (by head id and then label) and then add them with '|' separation,
         # as required by the format.
-        self._conllu_info["deps"] = "|".join([str(a.get_conllu_field('id')) + ":" + b for (a, b) in sorted(self.get_new_relations())])
-        return "\t".join([str(v) for v in self._conllu_info.values()])
+        if len(self._new_deps) == 1:
+            (head, rels), = self._new_deps.items()
+            if len(rels) == 1:
+                return f"{head._id}:{rels[0]}"
+        return "|".join([f"{head_id}:{rel}" for head_id, rel in sorted((head._id, rel) for head, rels in self._new_deps.items() for rel in rels)])
+    
+    def get_conllu_string(self):
+        return f"{self._id}\t{self._form}\t{self._lemma}\t{self._upos}\t{self._xpos}\t{self._feats}\t{self._head}\t{self._deprel}\t{self.get_deps_string()}\t{self._misc}"
+    
+    def get_conllu_fields(self):
+        return (self._id, self._form, self._lemma, self._upos, self._xpos, self._feats, self._head, self._deprel, self._deps, self._misc)
     
     def set_conllu_field(self, field, val):
-        self._conllu_info[field] = val
+        setattr(self, _field_slots[field], val)
     
     def get_conllu_field(self, field):
-        return self._conllu_info[field]
+        return getattr(self, _field_slots[field])
     
     def is_root_node(self):
-        return 0 == self.get_conllu_field('id')
+        return 0 == self._id
     
     def is_root_rel(self):
         # TODO - maybe we want to validate here (or/and somewhere else) that a root is an only parent
@@ -58,7 +185,30 @@ class Token(object):
         return self._new_deps.keys()
     
     def get_extra_info_edges(self):
-        return self._extra_info_edges
+        return self._extra_info_edges if self._extra_info_edges is not None else _no_extra_info_edges
+    
+    def get_edge_index(self):
+        return self._edge_index
+    
+    def relabel_edges(self, relabel):
+        # rename (in place, keeping their order) the relations of this token to its heads
+        for head, rels in self._new_deps.items():
+            for i, rel in enumerate(rels):
+                new_rel = get_label(relabel(rel))
+                if new_rel == rel:
+                    continue
+                rels[i] = new_rel
+                if self._edge_index is not None:
+                    self._edge_index.remove(rel, self, head)
+                    self._edge_index.add(new_rel, self, head)
+                if (self._extra_info_edges is not None) and ((head, rel) in self._extra_info_edges):
+                    self._extra_info_edges[(head, new_rel)] = self._extra_info_edges.pop((head, rel))
+    
+    def set_edge_index(self, edge_index):
+        # index the edges we already have, as the index may be new to us
+        self._edge_index = edge_index
+        for head, edge in self.get_new_relations():
+            edge_index.add(edge, self, head)
     
     def get_new_relations(self, given_head=None):
         new_deps_pairs = []
@@ -71,15 +221,17 @@ class Token(object):
         return new_deps_pairs
     
     def match_rel(self, str_to_match, head):
+        # the pattern may also come precompiled (see matcher.compile_pattern)
+        is_match = str_to_match if callable(str_to_match) else re.compile(str_to_match).match
         ret = []
         # having more than one edge should really never happen
         for edge in self._new_deps[head]:
-            m = re.match(str_to_match, edge)
-            if m:
+            if edge.matches(is_match):
                 ret.append(edge)
         return ret
     
     def add_edge(self, rel, head, extra_info=None):
+        rel = get_label(rel)
         if head in self._new_deps:
             if rel in self._new_deps[head]:
                 return
@@ -87,7 +239,11 @@ class Token(object):
         else:
             self._new_deps[head] = [rel]
             head.add_child(self)
+        if self._edge_index is not None:
+            self._edge_index.add(rel, self, head)
         if extra_info:
+            if self._extra_info_edges is None:
+                self._extra_info_edges = dict()
             self._extra_info_edges[(head, rel)] = extra_info
     
     def remove_edge(self, rel, head):
@@ -96,7 +252,9 @@ class Token(object):
             if not self._new_deps[head]:
                 self._new_deps.pop(head)
                 head.remove_child(self)
-            if (head, rel) in self._extra_info_edges:
+            if self._edge_index is not None:
+                self._edge_index.remove(rel, self, head)
+            if (self._extra_info_edges is not None) and ((head, rel) in self._extra_info_edges):
                 self._extra_info_edges.pop((head, rel))
     
     def remove_all_edges(self):
@@ -109,18 +267,23 @@ class Token(object):
     
     # operator overloading: less than
     def __lt__(self, other):
-        return self.get_conllu_field('id') < other.get_conllu_field('id')
+        return self._id < other._id
     
     def dist(self, other):
-        return other.get_conllu_field('id') - self.get_conllu_field('id')
+        return other._id - self._id
 
 
 def add_basic_edges(sentence):
     """Purpose: adds each basic deprel relation and the relevant father to its son.
+        The sentence's tokens also get a fresh (shared) EdgeIndex.
 
     Args:
         (dict) The parsed sentence.
     """
+    edge_index = EdgeIndex()
+    for token in sentence.values():
+        token.set_edge_index(edge_index)
+    
     for (cur_id, token) in sentence.items():
         if cur_id == 0:
             continue
@@ -129,3 +292,72 @@ def add_basic_edges(sentence):
         head = token.get_conllu_field('head')
         if head != "_":
             sentence[cur_id].add_edge(token.get_conllu_field('deprel'), sentence[token.get_conllu_field('head')])
+    
+    # the basic edges are the starting point, not a change
+    edge_index.reset_journal()
+
+
+def get_sentence_edge_index(sentence):
+    """Purpose: returns the EdgeIndex of the sentence, attaching a new one if it has none (e.g. was built by hand).
+
+    Args:
+        (dict) The parsed sentence.
+    """
+    edge_index = next(iter(sentence.values())).get_edge_index() if sentence else None
+    if edge_index is None:
+        edge_index = EdgeIndex()
+        for token in sentence.values():
+            token.set_edge_index(edge_index)
+        edge_index.reset_journal()
+    return edge_index
+
+
+def sentence_to_state(sentence):
+    """Purpose: flattens a sentence graph into plain data, e.g. to send it to another process.
+        (pickling the tokens themselves recurses along the graph, which is too deep for long sentences)
+
+    Args:
+        (dict) The sentence.
+
+    returns:
+        (list(tuple)) per token: its key, CoNLL-U fields, new deps, children and extra info edges,
+            tokens are referred to by their position in the sentence.
+    """
+    position = {token: i for i, token in enumerate(sentence.values())}
+    return [(_id_to_state(key), (_id_to_state(token._id),) + token.get_conllu_fields()[1:],
+             [(position[head], list(rels)) for head, rels in token._new_deps.items()],
+             [position[child] for child in token._children],
+             [(position[head], rel, info) for (head, rel), info in token.get_extra_info_edges().items()])
+            for key, token in sentence.items()]
+
+
+def sentence_from_state(state):
+    """Purpose: rebuilds a sentence graph flattened by sentence_to_state.
+
+    Args:
+        (list(tuple)) The flattened sentence.
+
+    returns:
+        (dict) The sentence.
+    """
+    tokens = [Token(_id_from_state(conllu_fields[0]), *conllu_fields[1:]) for (_, conllu_fields, _, _, _) in state]
+    for token, (_, _, new_deps, children, extra_info_edges) in zip(tokens, state):
+        token._new_deps = {tokens[head]: [get_label(rel) for rel in rels] for head, rels in new_deps}
+        token._children = {tokens[child]: None for child in children}
+        if extra_info_edges:
+            token._extra_info_edges = {(tokens[head], get_label(rel)): info for head, rel, info in extra_info_edges}
+    
+    edge_index = EdgeIndex()
+    for token in tokens:
+        token.set_edge_index(edge_index)
+    edge_index.reset_journal()
+    return {_id_from_state(key): token for (key, _, _, _, _), token in zip(state, tokens)}
+
+
+def _id_to_state(node_id):
+    # copy node ids as plain data (e.g. for msgpack, which would keep just their float value)
+    return (node_id.node_id, node_id.copy_index) if isinstance(node_id, CopyNodeId) else node_id
+
+
+def _id_from_state(node_id):
+    return CopyNodeId(*node_id) if isinstance(node_id, (tuple, list)) else node_id
@@ -0,0 +1,348 @@
+from collections import namedtuple
+from contextvars import ContextVar
+from itertools import chain
+
+from .converter import conversion_reads, run_conversion_plan
+from .graph_token import Token, add_basic_edges, conllu_fields, get_sentence_edge_index
+from .labels import get_label
+from .stats import ConversionStats
+
+# the CoNLL-U fields of a word which an edit can change (the id and the enhanced deps are not part of the basic tree)
+EDITABLE_FIELDS = ("form", "lemma", "upos", "xpos", "feats", "head", "deprel", "misc")
+
+# a single change to the basic tree, e.g. BasicEdit(3, "head", 5) attaches the third word to the fifth one
+BasicEdit = namedtuple("BasicEdit", ("token_id", "field", "value"))
+
+_field_indices = {field: i for i, field in enumerate(conllu_fields)}
+
+
+def get_basic_sentence(sentence):
+    """Purpose: rebuilds the basic tree of a (parsed or converted) sentence.
+    
+    The conversions never change the CoNLL-U fields of the words, so the words (the tokens with integer ids,
+    that is, not the copy nodes) with their head and deprel fields are the basic tree they started from.
+    
+    Args:
+        (dict(Token)) The sentence.
+    
+    returns:
+        (dict(Token)) A new parsed sentence (as conllu_wrapper.parse_conllu_sentence gives it), of new tokens.
+    """
+    return _sentence_from_fields(_get_words_fields(sentence))
+
+
+def apply_basic_edits(sentence, edits):
+    """Purpose: the basic tree of the sentence after the given edits.
+    
+    Args:
+        (dict(Token)) The (parsed or converted) sentence, which is left as it is.
+        (list(BasicEdit)) The edits (or (token_id, field, value) tuples), applied in order.
+    
+    returns:
+        (dict(Token)) A new parsed sentence of the edited basic tree, or None if the edits left the tree as it was.
+    
+    Raises:
+        ValueError: an edit of a token which is not a word, of a field which is not editable,
+            or one which makes a cycle of heads.
+    """
+    fields = _get_words_fields(sentence)
+    for token_id, field, value in edits:
+        if token_id not in fields:
+            raise ValueError(f"an edit of {token_id}, which is not a word of the sentence.")
+        if field not in EDITABLE_FIELDS:
+            raise ValueError(f"an edit of the {field} field, the editable fields are {', '.join(EDITABLE_FIELDS)}.")
+        if (field == "head") and (value != 0) and (value not in fields):
+            raise ValueError(f"an edit of the head of {token_id} to {value}, which is not a word of the sentence.")
+        fields[token_id][_field_indices[field]] = value
+    
+    # (e.g. an edit which was undone by a later one)
+    if fields == _get_words_fields(sentence):
+        return None
+    
+    # a new cycle of heads goes through a word whose head was edited (a cycle the sentence came with is left to the conversions)
+    head_index = _field_indices["head"]
+    for edited_id in {token_id for token_id, field, _ in edits if field == "head"}:
+        seen = set()
+        token_id = fields[edited_id][head_index]
+        while (token_id != 0) and (token_id not in seen):
+            if token_id == edited_id:
+                raise ValueError(f"the edits make a cycle of heads, through {edited_id}.")
+            seen.add(token_id)
+            token_id = fields[token_id][head_index]
+    
+    return _sentence_from_fields(fields)
+
+
+def _get_words_fields(sentence):
+    return {token_id: list(token.get_conllu_fields()) for token_id, token in sentence.items() if (type(token_id) is int) and (token_id != 0)}
+
+
+def _sentence_from_fields(fields):
+    # the words in their order and then the root, as parsing adds them
+    sentence = {token_id: Token(*token_fields) for token_id, token_fields in fields.items()}
+    sentence[0] = Token(0, None, None, None, None, None, None, None, None, None)
+    add_basic_edges(sentence)
+    return sentence
+
+
+def get_changed_nodes(old_sentence, new_sentence):
+    """Purpose: the nodes which differ between two conversions of a sentence, e.g. before and after an edit.
+    
+    Args:
+        (dict(Token)) The first converted sentence.
+        (dict(Token)) The second one.
+    
+    returns:
+        (set) The ids of the nodes which are in only one of them, or whose CoNLL-U fields or edges (to their heads) differ.
+    """
+    changed = set()
+    for node_id in old_sentence.keys() | new_sentence.keys():
+        old_token = old_sentence.get(node_id)
+        new_token = new_sentence.get(node_id)
+        if (old_token is None) or (new_token is None) or (_get_node_state(old_token) != _get_node_state(new_token)):
+            changed.add(node_id)
+    return changed
+
+
+def _get_node_state(token):
+    return token.get_conllu_fields(), sorted((head.get_conllu_field("id"), rel) for head, rel in token.get_new_relations())
+
+
+def reconvert_sentence(plan, sentence, edits, conv_iterations, trace, stats=None):
+    """Purpose: converts a sentence again after edits to its basic tree, with the same results as converting the edited tree
+        from scratch, but replaying what the edits can not change from the trace of the sentence's last conversion (see ConversionTracer).
+    
+    Args:
+        (ConversionPlan) The plan to convert by.
+        (dict(Token)) The (converted or parsed) sentence, which is left as it is.
+        (list(BasicEdit)) The edits, applied in order (see apply_basic_edits).
+        (int) The most conversion passes which may change the sentence (see converter.convert).
+        (ConversionTrace) The trace of the sentence's last conversion, which is updated to the new one. If it is of another sentence
+            or configuration (e.g. a new ConversionTrace), the edited sentence is converted in full, even if there are no edits.
+        (ConversionStats) A collector of per conversion stats, or None.
+    
+    returns:
+        (dict(Token)) The converted sentence (the given one if the edits changed nothing and the trace is of it).
+        (set) The ids of its nodes which changed (see get_changed_nodes).
+    
+    Raises:
+        ValueError: (see apply_basic_edits)
+    """
+    edited = apply_basic_edits(sentence, edits)
+    is_traced = trace.is_of(sentence, plan, conv_iterations)
+    if edited is None:
+        if is_traced:
+            return sentence, set()
+        edited = get_basic_sentence(sentence)
+    
+    converted = None
+    changes = _get_edit_changes(sentence, edited) if is_traced else None
+    if changes is not None:
+        changed_labels, changed_nodes = changes
+        # the stats of a replay which could not be finished are left out
+        replay_stats = ConversionStats() if stats is not None else None
+        tracer = ConversionTracer(plan, replay_stats, trace, changed_labels, changed_nodes)
+        try:
+            converted, steps = _convert_traced(plan, edited, conv_iterations, replay_stats, tracer)
+        except _NodesChanged:
+            # the edited tree was converted in part, so it is rebuilt
+            edited = apply_basic_edits(sentence, edits)
+        else:
+            if stats is not None:
+                stats.merge(replay_stats)
+    if converted is None:
+        converted, steps = _convert_traced(plan, edited, conv_iterations, stats, ConversionTracer(plan, stats))
+    
+    trace.sentence, trace.plan, trace.conv_iterations, trace.steps = converted, plan, conv_iterations, steps
+    return converted, get_changed_nodes(sentence, converted)
+
+
+def _get_edit_changes(sentence, edited):
+    # the labels of the basic edges which the edits moved or relabeled, and the words whose other fields they changed
+    #   (with the words next to them, as the words around a cc are read by their position, see converter.get_assignment),
+    #   or None if a misc field changed (as copy nodes are looked up by the misc field of every node, see converter.expand_per_type)
+    old_fields = _get_words_fields(sentence)
+    head_index, deprel_index, misc_index = _field_indices["head"], _field_indices["deprel"], _field_indices["misc"]
+    changed_labels = set()
+    changed_nodes = set()
+    for token_id, fields in _get_words_fields(edited).items():
+        old = old_fields[token_id]
+        if fields[misc_index] != old[misc_index]:
+            return None
+        if fields[head_index:deprel_index + 1] != old[head_index:deprel_index + 1]:
+            changed_labels.update([get_label(old[deprel_index]), get_label(fields[deprel_index])])
+        if (fields[:head_index] != old[:head_index]) or (fields[deprel_index + 1:] != old[deprel_index + 1:]):
+            changed_nodes.update(node_id for node_id in (token_id - 1, token_id, token_id + 1) if node_id in old_fields)
+    return changed_labels, changed_nodes
+
+
+def _convert_traced(plan, parsed, conv_iterations, stats, tracer):
+    # the tokens record their edits while they are traced, and are plain tokens again once converted
+    for token in parsed.values():
+        token.__class__ = _TracedToken
+    try:
+        (converted,), _ = run_conversion_plan(plan, [parsed], conv_iterations, stats=stats, tracers=[tracer])
+    finally:
+        for token in parsed.values():
+            token.__class__ = Token
+    return converted, tracer.steps
+
+
+class ConversionTrace(object):
+    """Purpose: what each conversion rule did in the last conversion of a sentence, to convert it again after edits (see reconvert_sentence).
+    
+    Per run of a rule (a pass and a rule), the edits it made: the edges it added or removed (or tried to, when they were there
+    or not there already) and the nodes it copied, in order. So a trace takes about as much memory as the edges a conversion adds.
+    """
+    def __init__(self):
+        # the converted sentence, and how it was converted
+        self.sentence = None
+        self.plan = None
+        self.conv_iterations = None
+        # (pass, conversion index) to the edits of that run (see _TracedToken), in the order of the runs
+        self.steps = dict()
+    
+    def is_of(self, sentence, plan, conv_iterations):
+        return (self.sentence is sentence) and (self.plan is plan) and (self.conv_iterations == conv_iterations)
+
+
+# the edits of the running conversion rule, while it is traced (see ConversionTracer)
+current_edits = ContextVar("current_edits", default=None)
+
+
+class _TracedToken(Token):
+    # a token of a traced conversion, which records the edits made to it (as (kind, node id, label, head id, extra info or copied fields))
+    __slots__ = ()
+    
+    def add_edge(self, rel, head, extra_info=None):
+        edits = current_edits.get()
+        if edits is not None:
+            edits.append(("add", self.get_conllu_field("id"), get_label(rel), head.get_conllu_field("id"), extra_info))
+        super().add_edge(rel, head, extra_info)
+    
+    def remove_edge(self, rel, head):
+        edits = current_edits.get()
+        if edits is not None:
+            edits.append(("remove", self.get_conllu_field("id"), get_label(rel), head.get_conllu_field("id"), None))
+        super().remove_edge(rel, head)
+    
+    def copy(self, *args, **kwargs):
+        copied = super().copy(*args, **kwargs)
+        copied.__class__ = _TracedToken
+        edits = current_edits.get()
+        if edits is not None:
+            edits.append(("copy", copied.get_conllu_field("id"), None, None, copied.get_conllu_fields()))
+        return copied
+
+
+class _NodesChanged(Exception):
+    # a run copied other nodes than in the traced conversion, which the replay can not follow
+    pass
+
+
+class ConversionTracer(object):
+    """Purpose: runs the conversion rules of a sentence's conversion and traces their edits (see ConversionPlan.convert_sentence).
+    
+    Given the trace of the sentence's conversion before some edits, a run is replayed from it rather than run, when the edits
+    can not change it. That is, when its rule reads none of the changed labels (see converter.get_conversion_reads) and no edge
+    of a changed node (as the fields of a node are matched through its edges), and gives no alternative ids. It then gets just
+    what it got in the traced conversion, so it makes the same edits, and replaying them makes them as a run would.
+    The labels of the basic edges which the edits moved start the changed labels, and the words whose other fields the edits
+    changed are the changed nodes (see _get_edit_changes).
+    The edits of a run which differ from the traced ones (including the runs which ran in only one of the conversions)
+    add their labels to the changed labels. A run which copies other nodes than the traced one raises _NodesChanged.
+    """
+    def __init__(self, plan, stats=None, trace=None, changed_labels=(), changed_nodes=()):
+        self.plan = plan
+        self.stats = stats
+        # the trace of this conversion (see ConversionTrace.steps)
+        self.steps = dict()
+        self.pass_num = -1
+        self._traced_steps = trace.steps if trace is not None else None
+        self._traced_keys = list(trace.steps) if trace is not None else []
+        self._next_traced = 0
+        self._changed_labels = set()
+        # the conversions which read a changed label
+        self._changed_readers = set()
+        self._add_changed_labels(changed_labels)
+        self._changed_nodes = frozenset(changed_nodes)
+    
+    def start_pass(self):
+        self.pass_num += 1
+    
+    def run_conversion(self, i, sentence, run):
+        key = (self.pass_num, i)
+        traced_edits = self._get_traced_edits(key) if self._traced_steps is not None else None
+        if (traced_edits is not None) and self._can_replay(i, sentence, traced_edits):
+            self._replay(sentence, traced_edits)
+            edits = traced_edits
+            if self.stats is not None:
+                self.stats.get_rule_stats(self.plan.conversions[i][0].__name__).replays += 1
+        else:
+            edits = []
+            token = current_edits.set(edits)
+            try:
+                run()
+            finally:
+                current_edits.reset(token)
+            edits = tuple(edits)
+            if (self._traced_steps is not None) and (edits != (traced_edits or ())):
+                # (edits which were all made in both, but in another order, may leave the edges in another order)
+                self._add_changed_edits(set(edits).symmetric_difference(traced_edits or ()) or edits)
+        self.steps[key] = edits
+    
+    def _get_traced_edits(self, key):
+        # the traced runs before this one which did not run now, made edits which were not made now
+        while self._next_traced < len(self._traced_keys):
+            traced_key = self._traced_keys[self._next_traced]
+            if traced_key > key:
+                break
+            self._next_traced += 1
+            if traced_key == key:
+                return self._traced_steps[key]
+            self._add_changed_edits(self._traced_steps[traced_key])
+        return None
+    
+    def _add_changed_edits(self, edits):
+        if any(kind == "copy" for kind, _, _, _, _ in edits):
+            raise _NodesChanged()
+        self._add_changed_labels(label for _, _, label, _, _ in edits)
+    
+    def _add_changed_labels(self, labels):
+        for label in labels:
+            if label not in self._changed_labels:
+                self._changed_labels.add(label)
+                self._changed_readers.update(self.plan.get_readers(label))
+    
+    def _can_replay(self, i, sentence, edits):
+        func, needs_iids = self.plan.conversions[i]
+        if needs_iids or (conversion_reads[func] is None) or (i in self._changed_readers):
+            return False
+        for node_id in self._changed_nodes:
+            node = sentence[node_id]
+            for label in chain((rel for _, rel in node.get_new_relations()), (rel for child in node.get_children() for _, rel in child.get_new_relations(node))):
+                if i in self.plan.get_readers(label):
+                    return False
+        # (the copies of changed nodes would not get their new fields)
+        copied = set()
+        for kind, node_id, _, head_id, _ in edits:
+            if kind == "copy":
+                if int(node_id) in self._changed_nodes:
+                    return False
+                copied.add(node_id)
+            elif ((node_id not in sentence) and (node_id not in copied)) or ((head_id not in sentence) and (head_id not in copied)):
+                return False
+        return True
+    
+    @staticmethod
+    def _replay(sentence, edits):
+        edge_index = get_sentence_edge_index(sentence)
+        for kind, node_id, label, head_id, info in edits:
+            if kind == "add":
+                sentence[node_id].add_edge(label, sentence[head_id], info)
+            elif kind == "remove":
+                sentence[node_id].remove_edge(label, sentence[head_id])
+            else:
+                node = _TracedToken(*info)
+                node.set_edge_index(edge_index)
+                sentence[node_id] = node
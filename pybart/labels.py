@@ -0,0 +1,90 @@
+import re
+from collections import namedtuple
+
+# the interned labels (see get_label) are dropped all at once when they grow past this many,
+#   as the alternative ids (#iid) make the number of distinct labels grow with the corpus
+LABELS_CACHE_SIZE = 100000
+# the pattern results a single label keeps (see Label.matches), as patterns compiled on the fly would pile up
+MAX_MATCHES_PER_LABEL = 256
+
+# a '@' which starts the source of the label, rather than being the '@' preposition (e.g. "nmod:@")
+_source_separator = re.compile(r"(?<!:)@")
+
+# the parts of a label's BART source, e.g. "advcl(NULL, to, UNC)#3+..." is ("advcl", ("NULL", "to"), True, 3)
+LabelSource = namedtuple("LabelSource", ("relation", "args", "uncertain", "iid"))
+
+_labels = dict()
+
+
+class Label(str):
+    """Purpose: an edge label, which keeps its parts apart.
+    
+    A label is the relation, e.g. "nmod:of" (whose base is "nmod" and specifier is "of"), optionally followed by
+    the BART source of the edge, after a '@' (see converter.add_extra_info), e.g. "nsubj@advcl(NULL)#3".
+    It is a str (in the form it is written in the DEPS column), so it compares, hashes and matches like one.
+    Labels are interned (see get_label), so each distinct label is split into its parts once,
+    and each label pattern is checked once per label.
+    
+    The patterns of the restrictions (gov, no_sons_of) are matched against the whole label, not against its relation:
+    an anchored pattern, e.g. "^(nsubj|obj)$", is written to leave out the edges a conversion added with a source
+    (e.g. "nsubj@advcl(NULL)"), and matching the relation alone would let them in. As the result is kept per label
+    (see matches), the parsed parts would not make the matching cheaper either.
+    """
+    __slots__ = ("relation", "base", "specifier", "source", "source_info", "_matches")
+    
+    def __new__(cls, label):
+        self = str.__new__(cls, label)
+        parts = _source_separator.split(label)
+        self.relation = parts[0]
+        base, colon, specifier = parts[0].partition(":")
+        self.base = base
+        self.specifier = specifier if colon else None
+        self.source = parts[1] if len(parts) > 1 else None
+        # (LabelSource) the parts of the source, or None if it has none
+        self.source_info = _parse_source(self.source) if self.source is not None else None
+        self._matches = dict()
+        return self
+    
+    def __reduce__(self):
+        # so a label is interned once unpickled (and not pickled with its parts)
+        return get_label, (str(self),)
+    
+    def matches(self, is_match):
+        """Purpose: whether the label satisfies the predicate (e.g. a compiled pattern), checked once per predicate."""
+        matched = self._matches.get(is_match)
+        if matched is None:
+            matched = bool(is_match(self))
+            if len(self._matches) < MAX_MATCHES_PER_LABEL:
+                self._matches[is_match] = matched
+        return matched
+
+
+def _parse_source(source):
+    head, _, args = source.partition("(")
+    extras = args.split(")")[0].split(", ") if args else []
+    if '' in extras:
+        extras.remove('')
+    uncertain = "UNC" in extras
+    if uncertain:
+        extras.remove("UNC")
+    iid = source.split("#")[1].split("+")[0] if "#" in source else None
+    return LabelSource(head, tuple(extras), uncertain, int(iid) if (iid is not None) and iid.isdigit() else None)
+
+
+def get_label(label):
+    """Purpose: the interned Label of the given label string.
+    
+    Args:
+        (str) The label (a Label is returned as is).
+    
+    returns:
+        (Label) The label.
+    """
+    if type(label) is Label:
+        return label
+    interned = _labels.get(label)
+    if interned is None:
+        if len(_labels) >= LABELS_CACHE_SIZE:
+            _labels.clear()
+        interned = _labels[label] = Label(label)
+    return interned
@@ -1,8 +1,255 @@
 import re
 from collections import namedtuple
+from functools import lru_cache
+
+from .stats import current_rule_stats
 
 fields = ('name', 'gov', 'no_sons_of', 'form', 'lemma', 'xpos', 'follows', 'followed_by', 'diff', 'nested')
 Restriction = namedtuple('Restriction', fields, defaults=(None,) * len(fields))
+# the immutable match plan of a Restriction: same fields, but its patterns are predicates and its nested lists are tuples
+CompiledRestriction = namedtuple('CompiledRestriction', fields)
+
+# a pattern which is nothing but an anchored list of plain words, e.g. "^(seem|appear|be)$" or "(^(?i:to)$)"
+_word_list_pattern = re.compile(r"^(\()?\^\((\?i:)?([\w '-]+(?:\|[\w '-]+)*)\)\$(?(1)\))$")
+
+
+# ----------------------------------------- compiling functions ----------------------------------- #
+
+
+class _LazyPattern(object):
+    """Purpose: the re.match predicate of a pattern, which compiles the pattern on its first call."""
+    __slots__ = ("pattern", "_match")
+    
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._match = None
+    
+    def __call__(self, string):
+        if self._match is None:
+            self._match = re.compile(self.pattern).match
+        return self._match(string)
+
+
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern, lazy=False):
+    """Purpose: turns a restriction's pattern string into a predicate over strings.
+    
+    Anchored word lists become set lookups, any other pattern is compiled once.
+    Either way the predicate keeps the re.match semantics of the original string,
+    and the same pattern gives the same predicate (so the labels keep a single match result for it).
+    
+    Args:
+        (str) The pattern, or None.
+        (bool) Whether to compile the regex on the predicate's first call, rather than now. This is for the label patterns,
+            as the restrictions are compiled when the converter module is imported, and a label pattern is matched
+            once per label (see labels.Label.matches), if at all under a given configuration.
+    
+    returns:
+        (callable) The predicate, or None if no pattern was given.
+    """
+    if pattern is None:
+        return None
+    
+    words = _word_list_pattern.match(pattern)
+    if not words:
+        return _LazyPattern(pattern) if lazy else re.compile(pattern).match
+    
+    if words.group(2):
+        # case insensitive list: ascii case folding is trivial, so leave the rest to the regex
+        folded = frozenset(word.casefold() for word in words.group(3).split("|"))
+        regex = _LazyPattern(pattern)
+        return lambda string: (string.casefold() in folded) if string.isascii() else regex(string)
+    return frozenset(words.group(3).split("|")).__contains__
+
+
+def compile_restriction(restriction):
+    """Purpose: compiles a Restriction tree into a CompiledRestriction, once, so it can be matched over and over.
+    
+    Args:
+        (Restriction) The restriction (compiled ones are returned as is).
+    
+    returns:
+        (CompiledRestriction) The match plan of the restriction.
+    """
+    if isinstance(restriction, CompiledRestriction):
+        return restriction
+    
+    return CompiledRestriction(
+        name=restriction.name, gov=compile_pattern(restriction.gov, lazy=True),
+        no_sons_of=compile_pattern(restriction.no_sons_of, lazy=True),
+        form=compile_pattern(restriction.form), lemma=compile_pattern(restriction.lemma),
+        xpos=compile_pattern(restriction.xpos), follows=restriction.follows, followed_by=restriction.followed_by,
+        diff=restriction.diff,
+        nested=compile_restriction_lists(restriction.nested) if restriction.nested is not None else None)
+
+
+def compile_restriction_lists(restriction_lists):
+    return tuple(tuple(compile_restriction(restriction) for restriction in restriction_list)
+                 for restriction_list in restriction_lists)
+
+
+# ----------------------------------------- seeding functions ----------------------------------- #
+
+
+# The following functions use the sentence's EdgeIndex to compute supersets of the nodes that can satisfy
+# a restriction. Each returns None when the restriction does not constrain the graph (e.g. it has no gov),
+# in which case nothing can be pruned.
+
+
+def gov_edges(restriction, edge_index, candidates):
+    return [(child, head) for (child, head) in edge_index.get_matching_edges(restriction.gov)
+            if candidates is None or child in candidates]
+
+
+def node_candidates(restriction, edge_index):
+    """nodes that might satisfy the restriction (with any head)"""
+    candidates = head_candidates(restriction.nested, edge_index) if restriction.nested else None
+    if restriction.gov:
+        return {child for (child, _) in gov_edges(restriction, edge_index, candidates)}
+    return candidates
+
+
+def parent_candidates(restriction, edge_index):
+    """nodes that might have a child satisfying the restriction"""
+    candidates = head_candidates(restriction.nested, edge_index) if restriction.nested else None
+    if restriction.gov:
+        return {head for (_, head) in gov_edges(restriction, edge_index, candidates)}
+    if candidates is None:
+        return None
+    return {head for child in candidates for head in child.get_parents()}
+
+
+def head_candidates(restriction_lists, edge_index):
+    """nodes that might have children satisfying one of the restriction lists"""
+    heads = set()
+    for restriction_list in restriction_lists:
+        # every restriction of the list must be satisfied by one of the children
+        list_heads = None
+        for restriction in restriction_list:
+            parents = parent_candidates(restriction, edge_index)
+            if parents is not None:
+                list_heads = parents if list_heads is None else (list_heads & parents)
+        if list_heads is None:
+            return None
+        heads |= list_heads
+    return heads
+
+
+def seed_children(children, restriction_lists):
+    """Purpose: prunes the (first level) nodes to the ones which might satisfy the restrictions, using the edge index.
+    
+    The order of the given nodes is kept, so the matching results are exactly the same as without pruning.
+    
+    Args:
+        (iterable(Token)) The nodes of a single sentence.
+        (tuple(tuple(CompiledRestriction))) The compiled restrictions.
+    
+    returns:
+        (iterable(Token)) The nodes worth matching.
+    """
+    children = list(children)
+    edge_index = children[0].get_edge_index() if children else None
+    if edge_index is None:
+        return children
+    
+    candidates = set()
+    for restriction_list in restriction_lists:
+        if not restriction_list:
+            return children
+        # each restriction of the list can be satisfied by a different node, but all must be satisfiable
+        list_candidates = set()
+        for restriction in restriction_list:
+            nodes = node_candidates(restriction, edge_index)
+            if nodes is None:
+                return children
+            if not nodes:
+                list_candidates = set()
+                break
+            list_candidates |= nodes
+        candidates |= list_candidates
+    
+    return [child for child in children if child in candidates]
+
+
+# ----------------------------------------- signature functions ----------------------------------- #
+
+
+# The following functions tell, with no graph walk, that a restriction can not match in a sentence:
+# a restriction needs a label (and form, and lemma) satisfying each of its patterns somewhere in the sentence.
+# A requirement is a tuple of conditions which must all be met, each either a (field, predicate) pair
+# (field being "label", "form" or "lemma") or an ("any", requirements) pair of alternatives. The empty one is always met.
+
+
+def restriction_requirement(restriction):
+    """Purpose: the labels and words a sentence must have for the (compiled) restriction to match anything in it."""
+    conditions = [(field, is_match) for field, is_match in
+                  (("label", restriction.gov), ("form", restriction.form), ("lemma", restriction.lemma)) if is_match]
+    if restriction.nested:
+        alternatives = tuple(restriction_list_requirement(restriction_list) for restriction_list in restriction.nested)
+        if all(alternatives):
+            conditions.append(("any", alternatives))
+    return tuple(conditions)
+
+
+def restriction_list_requirement(restriction_list):
+    return tuple(condition for restriction in restriction_list for condition in restriction_requirement(restriction))
+
+
+def _has_matching_value(field, values, is_match):
+    if field == "label":
+        # (labels keep the results of the patterns they were checked against)
+        return any(label.matches(is_match) for label in values)
+    # anchored word lists are sets (see compile_pattern), so they are checked at once
+    words = getattr(is_match, "__self__", None)
+    if isinstance(words, frozenset):
+        return not words.isdisjoint(values)
+    return any(is_match(value) for value in values)
+
+
+class SentenceSignature(object):
+    """Purpose: the labels, forms and lemmas a single sentence has, to check requirements against (see restriction_requirement).
+    
+    It follows the sentence as it is converted: the labels are read from its EdgeIndex,
+    and the forms and lemmas are collected again once nodes were added.
+    Each condition is checked once, until the labels (or the nodes) change.
+    """
+    def __init__(self, sentence, edge_index):
+        self._sentence = sentence
+        self._edge_index = edge_index
+        self._words = None
+        self._n_nodes = None
+        self._version = None
+        self._met = dict()
+    
+    def _values(self, field):
+        if field == "label":
+            return self._edge_index.get_labels()
+        if self._n_nodes != len(self._sentence):
+            self._n_nodes = len(self._sentence)
+            tokens = [token for token in self._sentence.values() if not token.is_root_node()]
+            self._words = {"form": {token.get_conllu_field("form") for token in tokens},
+                           "lemma": {token.get_conllu_field("lemma") for token in tokens}}
+        return self._words[field]
+    
+    def meets(self, requirement):
+        version = (self._edge_index.n_added, self._edge_index.n_removed, len(self._sentence))
+        if version != self._version:
+            self._version = version
+            self._met.clear()
+        return self._meets(requirement)
+    
+    def _meets(self, requirement):
+        for field, condition in requirement:
+            if field == "any":
+                if not any(self._meets(alternative) for alternative in condition):
+                    return False
+                continue
+            met = self._met.get((field, condition))
+            if met is None:
+                met = self._met[(field, condition)] = _has_matching_value(field, self._values(field), condition)
+            if not met:
+                return False
+        return True
 
 
 # ----------------------------------------- matching functions ----------------------------------- #
@@ -34,15 +281,15 @@ def named_nodes_restrictions(restriction, named_nodes):
 
 def match_child(child, restriction, head):
     if restriction.form:
-        if child.is_root_node() or not re.match(restriction.form, child.get_conllu_field('form')):
+        if child.is_root_node() or not restriction.form(child.get_conllu_field('form')):
             return
     
     if restriction.lemma:
-        if child.is_root_node() or not re.match(restriction.lemma, child.get_conllu_field('lemma')):
+        if child.is_root_node() or not restriction.lemma(child.get_conllu_field('lemma')):
             return
     
     if restriction.xpos:
-        if child.is_root_node() or not re.match(restriction.xpos, child.get_conllu_field('xpos')):
+        if child.is_root_node() or not restriction.xpos(child.get_conllu_field('xpos')):
             return
     
     # if no head (first level words)
@@ -61,7 +308,7 @@ def match_child(child, restriction, head):
     
     nested = []
     if restriction.nested:
-        nested = match(child.get_children(), restriction.nested, child)
+        nested = _match(child.get_children(), restriction.nested, child)
         if nested is None:
             return
     
@@ -97,6 +344,58 @@ def match_rest(children, restriction, head):
     return ret
 
 
+def _join_key(name_spaces, new_name_spaces, restriction):
+    # a node which the restriction's node must follow (or be followed by), named in all of the name spaces so far
+    #   and in none of the new ones, with the offset from the restriction's node id to its id
+    for name, offset in ((restriction.follows, -1), (restriction.followed_by, 1)):
+        if name and all(name in name_space for name_space in name_spaces) and \
+                not any(name in new_name_space for new_name_space in new_name_spaces):
+            return name, offset
+    return None, 0
+
+
+def join_name_spaces(name_spaces, new_name_spaces, restriction):
+    """Purpose: merges each of the name spaces matched so far with each of the ones of the next restriction of a list.
+    
+    The merged name spaces are checked against the restriction's cross restrictions (see named_nodes_restrictions)
+    as they are joined. When the restriction's node must follow (or be followed by) a node named so far,
+    the name spaces so far are looked up by that node's id, rather than each pair being tried.
+    Equal name spaces are kept once (the last of them), and the order is that of each new name space
+    merged with each of the ones so far (the new names take precedence).
+    
+    Args:
+        (list(dict)) The name spaces so far, if none the new ones are taken as they are.
+        (list(dict)) The new name spaces.
+        (CompiledRestriction) The restriction of the new name spaces.
+    
+    returns:
+        (list(dict)) The joined name spaces.
+    """
+    if not name_spaces:
+        merged = new_name_spaces
+    else:
+        key_name, offset = _join_key(name_spaces, new_name_spaces, restriction) if restriction.name else (None, 0)
+        if key_name is None:
+            merged = ({**name_space, **new_name_space} for new_name_space in new_name_spaces for name_space in name_spaces)
+        else:
+            by_id = dict()
+            for name_space in name_spaces:
+                by_id.setdefault(name_space[key_name][0].get_conllu_field('id'), []).append(name_space)
+            merged = ({**name_space, **new_name_space} for new_name_space in new_name_spaces
+                      for name_space in by_id.get(new_name_space[restriction.name][0].get_conllu_field('id') + offset, ()))
+    checked = [name_space for name_space in merged if named_nodes_restrictions(restriction, name_space)]
+    
+    joined = []
+    seen = set()
+    for name_space in reversed(checked):
+        key = frozenset(name_space.items())
+        if key not in seen:
+            seen.add(key)
+            joined.append(name_space)
+    joined.reverse()
+    return joined
+
+
 def match_rl(children, restriction_list, head):
     ret = []
     for restriction in restriction_list:
@@ -106,33 +405,54 @@ def match_rl(children, restriction_list, head):
         if rest_ret is None:
             return None
         
-        # every new rest_ret should be merged to any previous rest_ret
-        ret = rest_ret if not ret else \
-            [{**ns_ret, **ns_rest_ret} for ns_rest_ret in rest_ret for ns_ret in ret]
-        # fix ret in case we have two identical name_spaces
-        ret = [r for i, r in enumerate(ret) if r not in ret[i + 1:]]
+        # every new rest_ret should be merged to any previous rest_ret,
+        #   checking the cross restrictions on the way (see join_name_spaces).
+        # TODO - move the following information from here:
+        #   rules regarding the usage of non graph restrictions (follows, followed_by, diff):
+        #   1. must be after sibling rest's that they refer to
+        #       or in the outer rest of a nested that they refer to
+        #   2. must have names for themselves
+        ret = join_name_spaces(ret, rest_ret, restriction)
         
-        ret_was_empty_beforehand = False
-        if not ret:
-            ret_was_empty_beforehand = True
-        for named_nodes in ret:
-            # this is done here because we want to check cross restrictions
-            # TODO - move the following information from here:
-            #   rules regarding the usage of non graph restrictions (follows, followed_by, diff):
-            #   1. must be after sibling rest's that they refer to
-            #       or in the outer rest of a nested that they refer to
-            #   2. must have names for themselves
-            if not named_nodes_restrictions(restriction, named_nodes):
-                ret.remove(named_nodes)
-        if (not ret) and (not ret_was_empty_beforehand):
+        # the cross restrictions violated every name space (there were some)
+        if (not ret) and rest_ret:
             return None
     
     return ret
     
 
-def match(children, restriction_lists, head=None):
+def _match(children, restriction_lists, head):
     for restriction_list in restriction_lists:
         ret = match_rl(children, restriction_list, head)
         if ret is not None:
             return ret
     return
+
+
+def match(children, restriction_lists, head=None):
+    """Purpose: finds all the ways the given restrictions can be satisfied by the given nodes.
+    
+    Args:
+        (iterable(Token)) The nodes to match (usually a sentence's values).
+        (list(list(Restriction))) Alternatives of restriction lists, the first satisfied one is used.
+            Prefer passing precompiled restrictions (see compile_restriction), plain ones are compiled on each call.
+        (Token) The head of the given nodes if any.
+    
+    returns:
+        (list(dict)) A list of name spaces, mapping each restriction name to a (node, head, relation) tuple,
+            or None if no alternative could be satisfied.
+    """
+    restriction_lists = compile_restriction_lists(restriction_lists)
+    if head is None:
+        children = seed_children(children, restriction_lists)
+    
+    rule_stats = current_rule_stats.get()
+    if rule_stats is None:
+        return _match(children, restriction_lists, head)
+    
+    children = list(children)
+    ret = _match(children, restriction_lists, head)
+    rule_stats.match_calls += 1
+    rule_stats.nodes_visited += len(children)
+    rule_stats.matches += len(ret) if ret else 0
+    return ret
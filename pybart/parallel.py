@@ -0,0 +1,335 @@
+import re
+import atexit
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+
+from .conllu_wrapper import parse_conllu, serialize_conllu, parse_odin, conllu_to_odin, parsed_tacred_json, sentence_to_edges
+from .conllu_index import parse_conllu_range
+from .converter import convert
+from .graph_token import sentence_to_state, sentence_from_state
+
+# how many chunks each worker gets (on average), so a slow chunk would not keep the others waiting
+CHUNKS_PER_WORKER = 4
+
+# alternative ids (iids) are written in the labels right after the closing parenthesis of the BART source,
+#   e.g. nsubj@advcl(to)#3
+iid_pattern = re.compile(r"\)#(\d+)")
+
+# persistent process pools, by number of workers
+_pools = dict()
+
+
+def get_pool(workers):
+    if workers not in _pools:
+        # imported here, as most processes (e.g. short lived ones) convert with no workers
+        import multiprocessing
+        _pools[workers] = multiprocessing.Pool(workers)
+    return _pools[workers]
+
+
+@atexit.register
+def close_pools():
+    for pool in _pools.values():
+        pool.terminate()
+    _pools.clear()
+
+
+def balanced_chunks(lengths, n_chunks):
+    """Purpose: splits a sequence into contiguous chunks of about the same total length.
+    
+    Args:
+        (list(int)) The length of each item.
+        (int) The maximal number of chunks.
+    
+    returns:
+        (list(tuple(int, int))) The (start, end) ranges of the chunks.
+    """
+    target = max(sum(lengths) / n_chunks, 1)
+    ranges = []
+    start = 0
+    cumulative = 0
+    for i, length in enumerate(lengths):
+        cumulative += length
+        if cumulative >= target * (len(ranges) + 1):
+            ranges.append((start, i + 1))
+            start = i + 1
+    if start < len(lengths):
+        ranges.append((start, len(lengths)))
+    return ranges
+
+
+def global_iid_mappings(iid_logs, chunk_starts):
+    """Purpose: maps each chunk's alternative ids to the ones a serial conversion would have given.
+    
+    A serial conversion numbers the alternatives in the order they are created, that is by pass,
+    then by sentence, then by their order within the sentence (which each chunk keeps as is).
+    
+    Args:
+        (list(list(tuple))) The iid log of each chunk (see convert).
+        (list(int)) The index of the first sentence of each chunk.
+    
+    returns:
+        (list(dict(int, int))) The mapping of each chunk, or None where it is the identity.
+    """
+    events = sorted((pass_num, chunk_start + i, chunk, first, last)
+                    for chunk, (iid_log, chunk_start) in enumerate(zip(iid_logs, chunk_starts))
+                    for (pass_num, i, first, last) in iid_log)
+    mappings = [dict() for _ in iid_logs]
+    next_iid = 0
+    for _, _, chunk, first, last in events:
+        for iid in range(first, last):
+            mappings[chunk][iid] = next_iid
+            next_iid += 1
+    
+    return [mapping if any(iid != global_iid for iid, global_iid in mapping.items()) else None for mapping in mappings]
+
+
+def doc_iid_mappings(iid_log, doc_starts):
+    """Purpose: maps the alternative ids of documents converted together (in one convert call)
+        to the ones each document would get if converted alone, that is, numbered from 0 in the order they were created.
+    
+    Args:
+        (list(tuple)) The iid log of the conversion (see convert).
+        (list(int)) The index of the first sentence of each document.
+    
+    returns:
+        (list(dict(int, int))) The mapping of each document, or None where it is the identity.
+    """
+    mappings = [dict() for _ in doc_starts]
+    for (_, i, first, last) in iid_log:
+        mapping = mappings[bisect_right(doc_starts, i) - 1]
+        for iid in range(first, last):
+            mapping[iid] = len(mapping)
+    
+    return [mapping if any(iid != doc_iid for iid, doc_iid in mapping.items()) else None for mapping in mappings]
+
+
+def get_relabel(mapping):
+    # (a label with no alternative id, that is most labels, is kept as is)
+    return lambda rel: iid_pattern.sub(lambda m: ")#" + str(mapping[int(m.group(1))]), rel) if ")#" in rel else rel
+
+
+def _head_key(head):
+    # the order of (copy) node ids, e.g. 3 < 3.2 < 3.10 < 4
+    node_id, _, copy_index = head.partition(".")
+    return int(node_id), int(copy_index or 0)
+
+
+def relabel_conllu(text, mapping):
+    # the alternative ids can only be found in the DEPS column, which keeps its (head, label) order
+    relabel = get_relabel(mapping)
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if (")#" not in line) or line.startswith("#"):
+            continue
+        columns = line.split("\t")
+        deps = [dep.split(":", 1) for dep in columns[8].split("|")]
+        deps = sorted((_head_key(head), head, relabel(rel)) for head, rel in deps)
+        columns[8] = "|".join(head + ":" + rel for _, head, rel in deps)
+        lines[i] = "\t".join(columns)
+    return "\n".join(lines)
+
+
+def relabel_sentences(sentences, mapping):
+    relabel = get_relabel(mapping)
+    for sentence in sentences:
+        for token in sentence.values():
+            token.relabel_edges(relabel)
+
+
+# ------------------------------------------ worker functions ------------------------------------------ #
+# each gets the convert_args: the configuration arguments of converter.convert followed by the cache (see cache.py) or None
+
+
+def _convert(parsed, convert_args, iid_log=None):
+    *config, cache = convert_args
+    return convert(parsed, *config, iid_log=iid_log, cache=cache)
+
+
+def _convert_conllu_chunk(task):
+    text, preserve_comments, convert_args = task
+    parsed, all_comments = parse_conllu(text)
+    iid_log = []
+    converted, _ = _convert(parsed, convert_args, iid_log)
+    return serialize_conllu(converted, all_comments, preserve_comments), iid_log
+
+
+def _convert_sentences_chunk(task):
+    parse, data, convert_args = task
+    iid_log = []
+    converted, _ = _convert(parse(data), convert_args, iid_log)
+    return [sentence_to_state(sentence) for sentence in converted], iid_log
+
+
+def _convert_odin_docs_chunk(task):
+    docs, convert_args = task
+    converted_docs = []
+    for doc in docs:
+        converted, _ = _convert(parse_odin(doc), convert_args)
+        converted_docs.append(conllu_to_odin(converted, doc))
+    return converted_docs
+
+
+def convert_tacred_edges_chunk(task):
+    """Purpose: converts a batch of TACRED examples into their compact edge lists (see conllu_wrapper.sentence_to_edges).
+        The alternative ids (#iid) are numbered per example, as if each was converted alone.
+    """
+    examples, convert_args = task
+    iid_log = []
+    converted, _ = _convert(parsed_tacred_json(examples), convert_args, iid_log)
+    for sentence, mapping in zip(converted, doc_iid_mappings(iid_log, list(range(len(converted))))):
+        if mapping:
+            relabel_sentences([sentence], mapping)
+    return [sentence_to_edges(sentence, len(example["token"])) for sentence, example in zip(converted, examples)]
+
+
+def convert_conllu_range_chunk(task):
+    """Purpose: converts shards of a CoNLL-U file, each given by its byte range (see conllu_index),
+        so a worker reads (and parses) only its own shards of the file.
+        The alternative ids (#iid) are numbered per shard, as if each was converted alone.
+    
+    returns:
+        (list(tuple(str, int))) Per shard, its converted text and its number of alternative ids.
+    """
+    shards, convert_args = task
+    results = []
+    for path, byte_start, byte_end, preserve_comments, _ in shards:
+        parsed, all_comments = parse_conllu_range(path, byte_start, byte_end)
+        iid_log = []
+        converted, _ = _convert(parsed, convert_args, iid_log)
+        results.append((serialize_conllu(converted, all_comments, preserve_comments), max((last for (_, _, _, last) in iid_log), default=0)))
+    return results
+
+
+def _parse_odin_sentences(odin_sentences):
+    return parse_odin({'sentences': odin_sentences})
+
+
+# ------------------------------------------ parallel conversions ------------------------------------------ #
+
+
+def _convert_sentences(parse, data, lengths, convert_args, workers):
+    ranges = balanced_chunks(lengths, workers * CHUNKS_PER_WORKER)
+    results = get_pool(workers).map(
+        _convert_sentences_chunk, [(parse, data[start:end], convert_args) for start, end in ranges], chunksize=1)
+    mappings = global_iid_mappings([iid_log for _, iid_log in results], [start for start, _ in ranges])
+    
+    converted = []
+    for (states, _), mapping in zip(results, mappings):
+        sentences = [sentence_from_state(state) for state in states]
+        if mapping:
+            relabel_sentences(sentences, mapping)
+        converted += sentences
+    return converted
+
+
+def parallel_convert_conllu(conllu_text, preserve_comments, convert_args, workers):
+    """Purpose: the parallel version of api.convert_bart_conllu, with the same output.
+    
+    Args:
+        (str) The CoNLL-U text.
+        (bool) Whether to keep the sentences' comments.
+        (tuple) The configuration arguments of converter.convert, and the cache (or None).
+        (int) The number of worker processes.
+    
+    returns:
+        (str) the converted CoNLL-U text.
+    """
+    # split the same way parse_conllu does
+    sentences = conllu_text.strip().split('\n\n')
+    ranges = balanced_chunks([sentence.count('\n') + 1 for sentence in sentences], workers * CHUNKS_PER_WORKER)
+    results = get_pool(workers).map(
+        _convert_conllu_chunk, [("\n\n".join(sentences[start:end]), preserve_comments, convert_args) for start, end in ranges],
+        chunksize=1)
+    mappings = global_iid_mappings([iid_log for _, iid_log in results], [start for start, _ in ranges])
+    
+    return "\n".join(relabel_conllu(text, mapping) if mapping else text for (text, _), mapping in zip(results, mappings))
+
+
+def parallel_convert_odin(odin_json, convert_args, workers):
+    """Purpose: the parallel version of api.convert_bart_odin, with the same output.
+        Documents are converted independently of each other, so they are simply spread over the workers,
+        while a single document is spread by its sentences.
+    
+    Args:
+        (dict) The odin json.
+        (tuple) The configuration arguments of converter.convert, and the cache (or None).
+        (int) The number of worker processes.
+    
+    returns:
+        (dict) the converted odin json.
+    """
+    if "documents" in odin_json:
+        doc_keys = list(odin_json["documents"].keys())
+        docs = [odin_json["documents"][doc_key] for doc_key in doc_keys]
+        ranges = balanced_chunks([sum(len(sent['words']) for sent in doc['sentences']) for doc in docs], workers * CHUNKS_PER_WORKER)
+        results = get_pool(workers).map(
+            _convert_odin_docs_chunk, [(docs[start:end], convert_args) for start, end in ranges], chunksize=1)
+        for doc_key, converted_doc in zip(doc_keys, (doc for converted_docs in results for doc in converted_docs)):
+            odin_json["documents"][doc_key] = converted_doc
+        return odin_json
+    
+    odin_sentences = odin_json['sentences']
+    converted = _convert_sentences(
+        _parse_odin_sentences, odin_sentences, [len(sent['words']) for sent in odin_sentences], convert_args, workers)
+    return conllu_to_odin(converted, odin_json)
+
+
+def map_batches(worker, items, convert_args, workers, batch_size):
+    """Purpose: runs a worker function over a stream of items, a batch of items per task.
+        Only a couple of batches per worker are read ahead, so the memory in use does not depend on the stream's length.
+    
+    Args:
+        (function) The worker function, gets a (batch, convert_args) task and returns a list of results (one per item).
+        (iterable) The items.
+        (tuple) The configuration arguments of converter.convert, and the cache (or None).
+        (int) The number of worker processes, a single one converts in this process.
+        (int) The number of items per task.
+    
+    returns:
+        (generator(tuple(list, list))) Each batch (in order) and its results.
+    """
+    items = iter(items)
+    if workers <= 1:
+        for batch in iter(lambda: list(islice(items, batch_size)), []):
+            yield batch, worker((batch, convert_args))
+        return
+    
+    pool = get_pool(workers)
+    pending = deque()
+    while True:
+        while len(pending) < 2 * workers:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            pending.append((batch, pool.apply_async(worker, ((batch, convert_args),))))
+        if not pending:
+            break
+        batch, result = pending.popleft()
+        yield batch, result.get()
+
+
+def parallel_convert_odin_docs(docs, convert_args, workers, batch_size):
+    """Purpose: converts a stream of odin documents over the workers (see map_batches).
+    
+    returns:
+        (generator(dict)) The converted documents, in order.
+    """
+    for _, converted_docs in map_batches(_convert_odin_docs_chunk, docs, convert_args, workers, batch_size):
+        yield from converted_docs
+
+
+def parallel_convert_tacred(tacred_json, convert_args, workers):
+    """Purpose: the parallel version of api.convert_bart_tacred, with the same output.
+    
+    Args:
+        (list(dict)) The tacred json.
+        (tuple) The configuration arguments of converter.convert, and the cache (or None).
+        (int) The number of worker processes.
+    
+    returns:
+        (list(dict(Token))) the converted sentences.
+    """
+    return _convert_sentences(
+        parsed_tacred_json, tacred_json, [len(d["token"]) for d in tacred_json], convert_args, workers)
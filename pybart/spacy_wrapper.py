@@ -1,15 +1,43 @@
 import struct
-from spacy.tokens import Doc, Token as SpacyToken
-from spacy import attrs
-import numpy as np
 
-from .graph_token import Token, add_basic_edges
+from .graph_token import Token, add_basic_edges, sentence_to_state, sentence_from_state
+from .labels import get_label
 
 NUM_OF_BITS = struct.calcsize("P") * 8
 
+# the conversion results are kept as plain data in the doc's user data, so they are serialized with the doc
+#   (e.g. when spaCy sends it back from a worker process, see nlp.pipe's n_process), and are read by the extensions below
+PARENTS_KEY = ("pybart", "parents")
+PARSED_DOC_KEY = ("pybart", "parsed_doc")
 
-# this is here because it needs to happen only once (per import)
-SpacyToken.set_extension("parent_list", default=[])
+
+def get_parent_list(token):
+    parents = token.doc.user_data.get(PARENTS_KEY)
+    if parents is None:
+        return []
+    # (serialization turns tuples into lists)
+    return [{'head': token.doc[head_i], 'rel': rel, 'src': tuple(src) if isinstance(src, list) else src, 'alt': alt, 'unc': unc}
+            for head_i, rel, src, alt, unc in parents[token.i]]
+
+
+def get_parsed_doc(doc):
+    # the converted graphs of the doc's sentences (rebuilt on each call)
+    states = doc.user_data.get(PARSED_DOC_KEY)
+    return None if states is None else [sentence_from_state(state) for state in states]
+
+
+def register_extensions():
+    """Purpose: registers the extensions the converted docs are read by: token._.parent_list, doc._.parsed_doc and doc._.convs_done.
+    
+    They are registered once a doc is converted (or a Converter is made), rather than when this module is imported,
+    so spaCy (and NumPy) are imported only by the processes which use them. Registering them again does nothing.
+    """
+    from spacy.tokens import Doc, Token as SpacyToken
+    if Doc.has_extension("convs_done"):
+        return
+    SpacyToken.set_extension("parent_list", getter=get_parent_list)
+    Doc.set_extension("parsed_doc", getter=get_parsed_doc)
+    Doc.set_extension("convs_done", default=None)
 
 
 def parse_spacy_sent(sent):
@@ -34,92 +62,90 @@ def parse_spacy_sent(sent):
 
 
 def parse_bart_label(rel, is_state_head_node):
-    # For the rare case which involvs a '@' preposition,
-    # we temporarily replace it with 'at', instead of simply doing rel.split("@")
-    rel_l = [x.replace(":at", ":@") for x in rel.replace(":@", ":at").split("@")]
-    
-    # defaults
-    src = "UD" if not is_state_head_node else "BART"
-    alt = None
-    unc = False
-    
-    # if new info exists parse it
-    if len(rel_l) > 1:
-        # alternatives info
-        if len(rel_l[1].split("#")) > 1:
-            alt = int(rel_l[1].split("#")[1].split("+")[0])
-        # extra info
-        src = rel_l[1].split("(")[0]
-        extras = rel_l[1].split("(")[1].split(")")[0].split(", ")
-        if '' in extras:
-            extras.remove('')
-        # uncertinty info
-        if "UNC" in extras:
-            unc = True
-            extras.remove("UNC")
-        if len(extras) > 0:
-            src = (src,) + tuple(extras)
-    new_rel = rel_l[0]
+    # the label's parts were parsed once, when it was interned (see labels.Label)
+    label = get_label(rel)
+    source = label.source_info
+    if source is None:
+        return label.relation, "UD" if not is_state_head_node else "BART", False, None
     
-    return new_rel, src, unc, alt
+    src = ((source.relation,) + source.args) if source.args else source.relation
+    return label.relation, src, source.uncertain, source.iid
 
 
 def serialize_spacy_doc(orig_doc, converted_sentences):
-    words = []
-    spaces = []
-    total_attrs = []
+    import numpy as np
+    from spacy import attrs
+    from spacy.tokens import Doc
+    
+    register_extensions()
     attrs_ = list(attrs.NAMES)
     attrs_.remove('SENT_START')  # this clashes HEAD (see spacy documentation)
     attrs_.remove('SPACY')  # we dont want to override the spaces we assign later on
+    head_column = attrs_.index('HEAD')
+    
+    # get attributes of original doc, at once: a copy of the whole doc gives the same rows as a copy of each sentence,
+    #   as the (relative) heads of a sentence are within it
+    orig_attrs = orig_doc[:].as_doc().to_array(attrs_)
     
+    # the row of the original doc each new token takes its attributes from (new nodes take these of the node they copy),
+    #   and the (relative) heads of the new nodes
+    words = []
+    spaces = []
+    source_rows = []
+    new_nodes_rows = []
+    new_nodes_heads = []
+    sentences = []
     for orig_span, converted_sentence in zip(orig_doc.sents, converted_sentences):
         # remove redundant dummy-root-node
-        converted = {iid: tok for iid, tok in converted_sentence.items() if iid != 0}
-        orig = orig_span.as_doc()
-        
-        # get attributes of original doc
-        orig_attrs = orig.to_array(attrs_)
+        converted = [(iid, tok) for iid, tok in converted_sentence.items() if iid != 0]
+        sentences.append(converted)
+        new_nodes_count = 0
         
-        # append copied attributes for new nodes
-        new_nodes_attrs = []
-        for iid, tok in converted.items():
+        for iid, tok in converted:
             if int(iid) != iid:
-                new_node_attrs = list(orig_attrs[int(iid) - 1])
-                
                 # here we fix the relative head he is pointing to,
                 # in case it is a negative number we need to cast it to its unsigned synonym
-                relative = int(iid) - (len(orig_attrs) + len(new_nodes_attrs) + 1)
-                new_node_attrs[attrs_.index('HEAD')] = relative + (2**NUM_OF_BITS if relative < 0 else 0)
-                
-                new_nodes_attrs.append(new_node_attrs)
-        if new_nodes_attrs:
-            new_attrs = np.append(orig_attrs, new_nodes_attrs, axis=0)
-        else:
-            new_attrs = orig_attrs
-        total_attrs = np.append(total_attrs, new_attrs, axis=0) if len(total_attrs) > 0 else new_attrs
+                relative = int(iid) - (len(orig_span) + new_nodes_count + 1)
+                new_nodes_rows.append(len(source_rows))
+                new_nodes_heads.append(relative + (2**NUM_OF_BITS if relative < 0 else 0))
+                source_rows.append(orig_span.start + int(iid) - 1)
+                new_nodes_count += 1
+            else:
+                source_rows.append(orig_span.start + int(iid) - 1)
         
         # fix whitespaces in case of new nodes: take original spaces. change the last one if there are new nodes.
         #   add spaces for each new nodes, except for last
-        spaces += [t.whitespace_ if not ((i + 1 == len(orig)) and (len(new_nodes_attrs) > 0)) else ' ' for i, t in enumerate(orig)] + \
-                  [' ' if i + 1 < len(converted.keys()) else '' for i, iid in enumerate(converted.keys()) if int(iid) != iid]
+        spaces += [t.whitespace_ if not ((i + 1 == len(orig_span)) and (new_nodes_count > 0)) else ' ' for i, t in enumerate(orig_span)] + \
+                  [' ' if i + 1 < len(converted) else '' for i, (iid, _) in enumerate(converted) if int(iid) != iid]
         spaces[-1] = ' '
-        words += [t.get_conllu_field("form") for iid, t in converted.items()]
+        words += [t.get_conllu_field("form") for iid, t in converted]
+    
+    # a single (gathered) allocation of all the rows, and then the heads of the new nodes
+    total_attrs = orig_attrs[np.array(source_rows, dtype=np.intp)]
+    if new_nodes_rows:
+        total_attrs[new_nodes_rows, head_column] = np.array(new_nodes_heads, dtype=total_attrs.dtype)
     
     # form new doc including new nodes and set attributes
     spaces[-1] = ''
     new_doc = Doc(orig_doc.vocab, words=words, spaces=spaces)
     new_doc.from_array(attrs_, total_attrs)
     
+    # the sentence boundaries, as a column of their own (spaCy takes no SENT_START together with HEAD):
+    #   1 for the first token of each sentence and -1 for the rest, as setting is_sent_start gives them
+    sent_starts = np.full(len(words), -1, dtype=np.int64)
+    sent_starts[np.cumsum([0] + [len(converted) for converted in sentences[:-1]])] = 1
+    new_doc.from_array([attrs.SENT_START], sent_starts.astype(np.uint64).reshape(-1, 1))
+    
+    parents = []
     j = 0
-    for converted_sentence in converted_sentences:
-        converted = {iid: tok for iid, tok in converted_sentence.items() if iid != 0}
-
+    for converted in sentences:
         # store spacy ids for head indices extraction later on
-        spacy_ids = {iid: (spacy_i + j) for spacy_i, iid in enumerate(converted.keys())}
+        spacy_ids = {iid: (spacy_i + j) for spacy_i, (iid, _) in enumerate(converted)}
         
         # set new info for all tokens per their head lists
-        for i, bart_tok in enumerate(converted.values()):
+        for i, (_, bart_tok) in enumerate(converted):
             spacy_tok = new_doc[i + j]
+            token_parents = []
             for head, rel in bart_tok.get_new_relations():
                 # extract spacy correspondent head id
                 head_tok = new_doc[spacy_ids[head.get_conllu_field("id")] if head.get_conllu_field("id") != 0 else spacy_tok.i]
@@ -127,14 +153,19 @@ def serialize_spacy_doc(orig_doc, converted_sentences):
                 is_state_head_node = ((head_tok.text == "STATE") and (head.get_conllu_field("id") != int(head.get_conllu_field("id")))) or \
                                      (bart_tok.get_conllu_field("id") != int(bart_tok.get_conllu_field("id")))
                 new_rel, src, unc, alt = parse_bart_label(rel, is_state_head_node=is_state_head_node)
-                # add info to token
-                spacy_tok._.parent_list.append({'head': head_tok, 'rel': new_rel, 'src': src, 'alt': alt, 'unc': unc})
-            
-            # fix sentence boundaries, need to turn off is_parsed bool as it prevents setting the boundaries
-            new_doc.is_parsed = False
-            spacy_tok.is_sent_start = False if i != 0 else True
-            new_doc.is_parsed = True
+                # add info to token (see get_parent_list)
+                token_parents.append((head_tok.i, new_rel, src, alt, unc))
+            parents.append(token_parents)
         
         j += len(converted)
     
+    new_doc.user_data[PARENTS_KEY] = parents
     return new_doc
+
+
+def set_conversion_results(doc, converted_sentences, convs_done):
+    """Purpose: stores the converted graphs of the doc's sentences (see get_parsed_doc), and the number of conversion passes
+        which changed each of them, on the (serialized) doc.
+    """
+    doc.user_data[PARSED_DOC_KEY] = [sentence_to_state(sentence) for sentence in converted_sentences]
+    doc._.convs_done = list(convs_done)
@@ -0,0 +1,89 @@
+from contextvars import ContextVar
+
+# the counters of the running conversion rule, when stats are collected (see ConversionPlan.convert_sentence)
+current_rule_stats = ContextVar("current_rule_stats", default=None)
+
+
+class RuleStats(object):
+    """Purpose: the counters of a single conversion rule.
+    
+    calls: the times the rule ran (once per sentence per pass).
+    changes: the runs which changed the graph (added or removed an edge).
+    time: the total wall time, in seconds.
+    match_calls: the calls to matcher.match.
+    nodes_visited: the (first level) nodes these calls tried to match, after the edge index pruning.
+    matches: the name spaces these calls returned.
+    edges_added, edges_removed, nodes_added: the rule's edits.
+    skips: the passes the rule did not run in, as nothing it depends on changed since it last ran.
+    filtered: the passes the rule did not run in, as the sentence lacked the labels or words it needs.
+    replays: the runs which were replayed from the trace of an earlier conversion rather than run, as an edit could not change them
+        (see incremental.reconvert_sentence).
+    """
+    __slots__ = ("calls", "changes", "time", "match_calls", "nodes_visited", "matches", "edges_added", "edges_removed", "nodes_added", "skips",
+                 "filtered", "replays")
+    
+    def __init__(self):
+        for counter in self.__slots__:
+            setattr(self, counter, 0)
+    
+    def as_dict(self):
+        return {counter: getattr(self, counter) for counter in self.__slots__}
+    
+    def merge(self, other):
+        for counter in self.__slots__:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+
+
+class ConversionStats(object):
+    """Purpose: collects per rule stats of conversions (pass it as the stats argument of converter.convert).
+    
+    Nothing is collected when no collector is given, so it costs nothing then.
+    A collector can be passed to many conversions, and sums up their stats.
+    """
+    def __init__(self):
+        self.rules = dict()
+        # the times the conversion rules ran over a sentence, that is the sum of the sentences' passes
+        self.sentence_passes = 0
+    
+    def get_rule_stats(self, rule_name):
+        if rule_name not in self.rules:
+            self.rules[rule_name] = RuleStats()
+        return self.rules[rule_name]
+    
+    def merge(self, other):
+        for rule_name, rule_stats in other.rules.items():
+            self.get_rule_stats(rule_name).merge(rule_stats)
+        self.sentence_passes += other.sentence_passes
+    
+    def as_dict(self):
+        """
+        returns:
+            (dict(str, dict(str, number))) The counters of each rule (see RuleStats), in the order the rules ran.
+        """
+        return {rule_name: rule_stats.as_dict() for rule_name, rule_stats in self.rules.items()}
+    
+    def report(self, sort_by="time", top=None):
+        """Purpose: formats the stats as a (text) table, a line per rule.
+        
+        Args:
+            (str) The counter to sort the rules by (descending), or None to keep the order the rules ran.
+            (int) The number of rules to show, or None for all of them.
+        
+        returns:
+            (str) The table.
+        """
+        rules = list(self.rules.items())
+        if sort_by:
+            rules.sort(key=lambda item: getattr(item[1], sort_by), reverse=True)
+        if top is not None:
+            rules = rules[:top]
+        
+        total_time = sum(rule_stats.time for rule_stats in self.rules.values()) or 1
+        counters = [counter for counter in RuleStats.__slots__ if counter != "time"]
+        name_width = max([len("rule")] + [len(rule_name) for rule_name, _ in rules])
+        lines = [f"{'rule':<{name_width}} {'time (ms)':>10} {'%':>6} " + " ".join(f"{counter:>13}" for counter in counters)]
+        for rule_name, rule_stats in rules:
+            lines.append(f"{rule_name:<{name_width}} {rule_stats.time * 1000:>10.2f} {100 * rule_stats.time / total_time:>6.1f} " +
+                         " ".join(f"{getattr(rule_stats, counter):>13}" for counter in counters))
+        lines.append(f"({self.sentence_passes} sentence passes)")
+        return "\n".join(lines)
@@ -0,0 +1,99 @@
+import gc
+import json
+import pathlib
+import pickle
+import sqlite3
+
+from pybart import api, cache as cache_module
+from pybart.cache import ConversionCache
+from pybart.converter import ConvsCanceler
+
+
+class TestCache:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.text = f.read()
+        cls.n_sentences = len(cls.text.strip().split("\n\n"))
+        cls.expected = api.convert_bart_conllu(cls.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler())
+    
+    def test_same_as_no_cache(self):
+        cache = ConversionCache()
+        assert api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), cache=cache) == self.expected
+        assert cache.stats.misses + cache.stats.batch_hits == self.n_sentences
+        assert cache.stats.memory_hits == 0
+        
+        # the second time around, everything comes from the cache (and the cached entries were not changed by the first use)
+        misses = cache.stats.misses
+        assert api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), cache=cache) == self.expected
+        assert cache.stats.misses == misses
+        assert cache.stats.memory_hits == misses
+        assert cache.stats.as_dict()["hit_rate"] >= 0.5
+    
+    def test_iids_same_as_no_cache(self):
+        # repeated sentences get their own alternative ids (#iid), in the order a conversion with no cache gives them
+        text = "\n\n".join([self.text.strip()] * 3) + "\n"
+        expected = api.convert_bart_conllu(text, funcs_to_cancel=ConvsCanceler())
+        assert ")#" in expected
+        cache = ConversionCache()
+        assert api.convert_bart_conllu(self.text, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        assert api.convert_bart_conllu(text, funcs_to_cancel=ConvsCanceler(), cache=cache) == expected
+        assert api.convert_bart_tacred([], cache=cache) == []
+    
+    def test_config_is_part_of_the_key(self):
+        cache = ConversionCache()
+        api.convert_bart_conllu(self.text, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        misses = cache.stats.misses
+        assert api.convert_bart_conllu(self.text, enhanced_extra=False, funcs_to_cancel=ConvsCanceler(), cache=cache) == \
+            api.convert_bart_conllu(self.text, enhanced_extra=False, funcs_to_cancel=ConvsCanceler())
+        assert cache.stats.misses == 2 * misses
+    
+    def test_lru(self):
+        cache = ConversionCache(max_size=2)
+        first, second, third = self.text.strip().split("\n\n")[:3]
+        for sentence in [first, second, first, third]:
+            api.convert_bart_conllu(sentence, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        assert len(cache) == 2
+        assert cache.stats.memory_hits == 1
+        # the second sentence was the least recently used one
+        api.convert_bart_conllu(first, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        api.convert_bart_conllu(second, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        assert (cache.stats.memory_hits, cache.stats.misses) == (2, 4)
+    
+    def test_disk_tier(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        cache = ConversionCache(path=path)
+        api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        cache.close()
+        
+        # a new cache (e.g. of another process) over the same file
+        cache = ConversionCache(max_size=10, path=path)
+        assert api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), cache=cache) == self.expected
+        assert cache.stats.misses == 0
+        assert cache.stats.disk_hits > 0
+        cache.clear()
+        api.convert_bart_conllu(self.text, funcs_to_cancel=ConvsCanceler(), cache=cache)
+        assert cache.stats.misses > 0
+        cache.close()
+        
+        # the entries are stored as JSON, not as pickles (which could run code when read)
+        with sqlite3.connect(path) as connection:
+            values = [value for value, in connection.execute("SELECT value FROM entries")]
+        assert values and all(json.loads(value) for value in values)
+    
+    def test_workers(self, tmp_path):
+        cache = ConversionCache(path=str(tmp_path / "cache.sqlite"))
+        for _ in range(2):
+            assert api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), workers=2, cache=cache) == self.expected
+        cache.close()
+    
+    def test_no_leak(self):
+        caches = [ConversionCache() for _ in range(100)]
+        assert not any(cache._id in cache_module._process_caches for cache in caches)
+        # the worker side caches (as a pickled cache is read by a worker process) are kept only while in use
+        worker_caches = [pickle.loads(pickle.dumps(cache)) for cache in caches]
+        assert pickle.loads(pickle.dumps(caches[-1])) is worker_caches[-1]
+        del caches, worker_caches
+        gc.collect()
+        assert len(cache_module._process_caches) <= cache_module.PROCESS_CACHES
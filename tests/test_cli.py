@@ -0,0 +1,70 @@
+import io
+import json
+import pathlib
+
+import pytest
+
+from pybart import api
+from pybart.__main__ import main
+from pybart.converter import ConvsCanceler
+from test_odin import odin_docs
+from test_tacred import tacred_examples
+
+
+class TestCli:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        cls.conllu_path = dir_ + "/handcrafted_tests.conllu"
+        with open(cls.conllu_path) as f:
+            cls.text = f.read()
+    
+    def run(self, tmp_path, text, *args):
+        in_path = tmp_path / "in"
+        in_path.write_text(text)
+        out_path = tmp_path / "out"
+        assert main([str(in_path), str(out_path)] + list(args)) == 0
+        return out_path.read_text()
+    
+    def test_conllu(self, tmp_path, capsys):
+        for workers in ["1", "2"]:
+            converted = self.run(tmp_path, self.text, "--workers", workers, "--batch-size", "7", "--preserve-comments")
+            expected = io.StringIO()
+            api.convert_bart_conllu_stream(io.StringIO(self.text), expected, preserve_comments=True, batch_size=7)
+            assert converted == expected.getvalue()
+        # the progress (and the rate) are reported on stderr
+        n_sentences = len(self.text.strip().split("\n\n"))
+        assert f"done: {n_sentences} sentences" in capsys.readouterr().err
+    
+    def test_conversion_options(self, tmp_path):
+        converted = self.run(tmp_path, self.text, "--quiet", "--no-enhanced-extra", "--remove-extra-info", "--conv-iterations", "2",
+                             "--cancel", "eud_conj_info")
+        assert converted == api.convert_bart_conllu(self.text, enhanced_extra=False, remove_extra_info=True, conv_iterations=2,
+                                                    funcs_to_cancel=ConvsCanceler(["eud_conj_info"]))
+        sentences = self.text.strip().split("\n\n")
+        assert self.run(tmp_path, self.text, "--quiet", "--sentences", "10", "20") == api.convert_bart_conllu("\n\n".join(sentences[10:20]))
+    
+    def test_odin_and_tacred(self, tmp_path):
+        docs = odin_docs("\n")
+        converted = self.run(tmp_path, "".join(json.dumps(doc) + "\n" for doc in docs), "--quiet", "--format", "odin-lines", "--workers", "2")
+        assert [json.loads(line) for line in converted.splitlines()] == [api.convert_bart_odin(json.loads(json.dumps(doc))) for doc in docs]
+        odin_json = {"documents": {doc["id"]: doc for doc in docs}, "mentions": []}
+        converted = self.run(tmp_path, json.dumps(odin_json), "--quiet", "--format", "odin")
+        assert json.loads(converted) == api.convert_bart_odin(json.loads(json.dumps(odin_json)))
+        
+        examples = tacred_examples()
+        label_ids_path = str(tmp_path / "labels.json")
+        converted = self.run(tmp_path, json.dumps(examples), "--quiet", "--format", "tacred", "--label-ids", label_ids_path)
+        with open(label_ids_path) as f:
+            label_ids = json.load(f)
+        expected = list(api.convert_bart_tacred_stream(iter(examples), label_ids=dict()))
+        assert [json.loads(line) for line in converted.splitlines()] == expected
+        assert len(label_ids) == len({label for example in expected for _, _, label in example["bart_edges"]})
+    
+    def test_errors(self, tmp_path, capsys):
+        with pytest.raises(SystemExit):
+            main([self.conllu_path, "--cancel", "no_such_conversion"])
+        with pytest.raises(SystemExit):
+            main(["-", "--workers", "2"])
+        assert main(["--list-conversions"]) == 0
+        assert "eud_conj_info" in capsys.readouterr().out.split()
@@ -0,0 +1,70 @@
+import io
+import os
+import pathlib
+
+from pybart import api
+from pybart.conllu_index import index_conllu, read_index, get_index_path, ConlluFile
+from pybart.conllu_wrapper import parse_conllu, serialize_conllu
+from pybart.converter import ConvsCanceler
+
+
+class TestConlluIndex:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.text = f.read()
+        cls.sentences = cls.text.strip().split("\n\n")
+    
+    def write(self, tmp_path, text):
+        path = str(tmp_path / "in.conllu")
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+    
+    def test_index(self, tmp_path):
+        # blank lines of whitespace, and more than one of them, split sentences as iter_conllu splits them
+        path = self.write(tmp_path, "\n \n" + "\n\n\n".join(self.sentences) + "\n\n")
+        starts, ends = index_conllu(path)
+        assert len(starts) == len(ends) == len(self.sentences)
+        with open(path, "rb") as f:
+            data = f.read()
+        assert [data[start:end].decode().strip() for start, end in zip(starts, ends)] == self.sentences
+    
+    def test_sidecar(self, tmp_path):
+        path = self.write(tmp_path, self.text)
+        assert read_index(path) is None
+        conllu_file = ConlluFile(path)
+        assert os.path.exists(get_index_path(path))
+        assert list(read_index(path)[0]) == list(conllu_file.starts)
+        # a changed file is indexed again
+        self.write(tmp_path, "\n\n".join(self.sentences[:3]) + "\n")
+        assert read_index(path) is None
+        assert len(ConlluFile(path)) == 3
+    
+    def test_random_access(self, tmp_path):
+        conllu_file = ConlluFile(self.write(tmp_path, self.text))
+        for start, end in [(0, 1), (17, 20), (len(self.sentences) - 1, len(self.sentences)), (5, 5)]:
+            expected, expected_comments = parse_conllu("\n\n".join(self.sentences[start:end])) if start < end else ([], [])
+            parsed, comments = conllu_file.parse(start, end)
+            assert comments == expected_comments
+            assert serialize_conllu(parsed, comments, True) == serialize_conllu(expected, expected_comments, True)
+            assert conllu_file.get_text(start, end).strip() == "\n\n".join(self.sentences[start:end])
+        shards = conllu_file.get_shards(4)
+        assert len(shards) == 4
+        assert [start for start, _ in shards[1:]] == [end for _, end in shards[:-1]]
+        assert (shards[0][0], shards[-1][1]) == (0, len(self.sentences))
+    
+    def test_convert_file_same_as_stream(self, tmp_path):
+        path = self.write(tmp_path, "\n\n".join([self.text.strip()] * 2) + "\n")
+        for workers in [1, 2]:
+            out_file = io.StringIO()
+            api.convert_bart_conllu_file(path, out_file, preserve_comments=True, batch_size=15, workers=workers)
+            expected = io.StringIO()
+            with open(path) as in_file:
+                api.convert_bart_conllu_stream(in_file, expected, preserve_comments=True, batch_size=15)
+            assert out_file.getvalue() == expected.getvalue()
+        
+        out_file = io.StringIO()
+        api.convert_bart_conllu_file(path, out_file, sentences=(20, 40))
+        assert out_file.getvalue() == api.convert_bart_conllu("\n\n".join(self.sentences[20:40]), funcs_to_cancel=ConvsCanceler())
@@ -0,0 +1,54 @@
+import io
+import math
+import pathlib
+
+from pybart import api
+from pybart.conllu_wrapper import parse_conllu, iter_conllu, serialize_conllu, write_conllu
+from pybart.graph_token import copy_node_id
+from pybart.converter import convert, ConvsCanceler
+
+
+class TestConlluStream:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.text = f.read()
+    
+    def test_iter_conllu_same_as_parse_conllu(self):
+        parsed, all_comments = parse_conllu(self.text)
+        streamed = list(iter_conllu(io.StringIO("\n\n" + self.text + "\n\n\n")))
+        assert [comments for _, comments in streamed] == all_comments
+        assert serialize_conllu([sentence for sentence, _ in streamed], all_comments) == serialize_conllu(parsed, all_comments)
+    
+    def test_stream_same_as_convert_bart_conllu(self):
+        for preserve_comments in [False, True]:
+            expected = api.convert_bart_conllu(self.text, preserve_comments=preserve_comments, funcs_to_cancel=ConvsCanceler())
+            for batch_size in [1, 10, 100000]:
+                out_file = io.StringIO()
+                api.convert_bart_conllu_stream(io.StringIO(self.text), out_file, preserve_comments=preserve_comments, batch_size=batch_size)
+                assert out_file.getvalue() == expected
+    
+    def test_iids_unique_over_batches(self):
+        text = "\n\n".join([self.text.strip()] * 2)
+        out_file = io.StringIO()
+        api.convert_bart_conllu_stream(io.StringIO(text), out_file, batch_size=5)
+        assert out_file.getvalue() == api.convert_bart_conllu(text, funcs_to_cancel=ConvsCanceler())
+    
+    def test_write_conllu_same_as_serialize_conllu(self):
+        parsed, all_comments = parse_conllu(self.text)
+        converted, _ = convert(parsed, True, True, True, math.inf, False, False, False, False, False, ConvsCanceler())
+        for preserve_comments in [False, True]:
+            out_file = io.StringIO()
+            write_conllu(out_file, converted, all_comments, preserve_comments)
+            assert out_file.getvalue() == serialize_conllu(converted, all_comments, preserve_comments)
+    
+    def test_copy_nodes_order(self):
+        (sentence,), all_comments = parse_conllu("1\tJohn\tjohn\t_\t_\t_\t2\tnsubj\t_\t_\n2\tate\teat\t_\t_\t_\t0\troot\t_\t_\n")
+        for nth in range(10, 0, -1):
+            copy = sentence[2].copy(new_id=copy_node_id(2, nth), head="_", deprel="_")
+            copy.add_edge("conj", sentence[2])
+            sentence[copy.get_conllu_field("id")] = copy
+        lines = serialize_conllu([sentence], all_comments).strip().split("\n")
+        assert [line.split("\t")[0] for line in lines] == ["1", "2"] + [f"2.{nth}" for nth in range(1, 11)]
+        assert [line.split("\t")[8] for line in lines[2:]] == ["2:conj"] * 10
@@ -1,13 +1,15 @@
 import pathlib
 import math
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
 #from pytest import fail
 
-import pybart
 from pybart.conllu_wrapper import parse_conllu, serialize_conllu
 from pybart import converter
 from pybart import api
-from pybart.graph_token import add_basic_edges
-from pybart.converter import convert, ConvsCanceler
+from pybart.graph_token import add_basic_edges, get_sentence_edge_index
+from pybart.converter import convert, ConvsCanceler, get_conversion_plan
 
 
 class TestConversions:
@@ -55,12 +57,6 @@ class TestConversions:
                     else:
                         cur_gold[test_name] = {specification: [gold_line.split()]}
     
-    @staticmethod
-    def setup_method():
-        pybart.converter.g_remove_enhanced_extra_info = False
-        pybart.converter.g_remove_aryeh_extra_info = False
-        pybart.converter.g_remove_node_adding_conversions = False
-    
     @classmethod
     def common_logic(cls, cur_name):
         name = cur_name.split("test_")[1]
@@ -99,3 +95,84 @@ for cur_func_name in api.get_conversion_names():
     setattr(TestConversions, test_func_name, staticmethod(lambda func_name=test_func_name: TestConversions.common_logic(func_name)))
     combined_func_name = "test_combined_" + cur_func_name
     setattr(TestConversions, combined_func_name, staticmethod(lambda func_name=combined_func_name: TestConversions.common_logic_combined(func_name)))
+
+
+class TestConvergence:
+    text = "1\tHe\the\tPRON\tPRP\t_\t2\tnsubj\t_\t_\n" \
+           "2\tslept\tsleep\tVERB\tVBD\t_\t0\troot\t_\t_\n" \
+           "\n" \
+           "1\tJohn\tJohn\tPROPN\tNNP\t_\t2\tnsubj\t_\t_\n" \
+           "2\tate\teat\tVERB\tVBD\t_\t0\troot\t_\t_\n" \
+           "3\tand\tand\tCCONJ\tCC\t_\t4\tcc\t_\t_\n" \
+           "4\tdrank\tdrink\tVERB\tVBD\t_\t2\tconj\t_\t_\n"
+    
+    def test_convs_done_per_sentence(self):
+        parsed, _ = parse_conllu(self.text)
+        _, convs_done = convert(parsed, True, True, True, math.inf, False, False, False, False, False, ConvsCanceler())
+        assert convs_done == [0, 1]
+    
+    def test_conv_iterations_limit(self):
+        parsed, _ = parse_conllu(self.text)
+        _, convs_done = convert(parsed, True, True, True, 0, False, False, False, False, False, ConvsCanceler())
+        assert convs_done == [0, 0]
+        assert all(len(token.get_new_relations()) <= 1 for sentence in parsed for token in sentence.values())
+
+
+class TestConversionPlan:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.text = f.read()
+    
+    def test_plans_are_cached(self):
+        assert get_conversion_plan(query_mode=True) is get_conversion_plan(query_mode=True, funcs_to_cancel=ConvsCanceler())
+        assert get_conversion_plan(funcs_to_cancel=["eud_conj_info"]) is get_conversion_plan(funcs_to_cancel=ConvsCanceler(["eud_conj_info"]))
+        assert get_conversion_plan() is not get_conversion_plan(remove_unc=True)
+    
+    def test_bad_conversion_name(self):
+        with pytest.raises(ValueError):
+            get_conversion_plan(funcs_to_cancel=["no_such_conversion"])
+    
+    def test_canceler_is_not_changed(self):
+        canceler = ConvsCanceler(["eud_conj_info"])
+        api.convert_bart_conllu(self.text, enhanced_extra=False, query_mode=True, funcs_to_cancel=canceler)
+        assert canceler.cancel_list == ["eud_conj_info"]
+    
+    def test_concurrent_configurations(self):
+        configs = [dict(), dict(enhanced_extra=False), dict(remove_extra_info=True, remove_eud_info=True), dict(remove_node_adding_conversions=True)]
+        expected = [api.convert_bart_conllu(self.text, **config) for config in configs]
+        with ThreadPoolExecutor(max_workers=len(configs)) as executor:
+            for _ in range(2):
+                assert list(executor.map(lambda config: api.convert_bart_conllu(self.text, **config), configs)) == expected
+    
+    def test_readers(self):
+        plan = get_conversion_plan()
+        names = [func.__name__ for func, _ in plan.conversions]
+        conj_readers = {names[i] for i in plan.get_readers("conj")}
+        punct_readers = {names[i] for i in plan.get_readers("punct")}
+        assert {"eud_conj_info", "eud_heads_of_conjuncts", "extra_conj_propagation_of_nmods"} <= conj_readers
+        assert "eud_correct_subj_pass" not in conj_readers
+        # conversions which move all of a node's edges read every label
+        assert "extra_copula_reconstruction" in punct_readers
+        assert not {"eud_conj_info", "eud_passive_agent"} & punct_readers
+        assert converter.get_conversion_reads(converter.extra_appos_propagation) is None
+    
+    def test_scheduled_passes_same_as_full_passes(self):
+        # later passes run only the conversions with something new to read, a full pass of them all would change nothing more
+        for config in [dict(), dict(remove_node_adding_conversions=True), dict(enhanced_extra=False)]:
+            plan = get_conversion_plan(**config)
+            for block in self.text.strip().split("\n\n"):
+                (expected,), comments = parse_conllu(block)
+                convert([expected], True, config.get("enhanced_plus_plus", True), config.get("enhanced_extra", True), math.inf, False, False,
+                        config.get("remove_node_adding_conversions", False), False, False, ConvsCanceler())
+                
+                (sentence,), _ = parse_conllu(block)
+                edge_index = get_sentence_edge_index(sentence)
+                iids = dict()
+                while True:
+                    edge_index.reset_journal()
+                    plan.convert_sentence(sentence, iids)
+                    if not edge_index.is_changed():
+                        break
+                assert serialize_conllu([sentence], comments) == serialize_conllu([expected], comments)
@@ -0,0 +1,55 @@
+import pathlib
+
+import pytest
+
+from pybart.conllu_wrapper import parse_conllu, serialize_conllu
+from pybart.converter import convert, ConvsCanceler
+from pybart.corpus import write_corpus, Corpus
+from pybart.graph_token import sentence_to_state
+
+
+class TestCorpus:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            parsed, cls.all_comments = parse_conllu(f.read())
+        cls.converted, _ = convert(parsed, True, True, True, float("inf"), False, False, False, False, False, ConvsCanceler())
+        cls.expected = serialize_conllu(cls.converted, cls.all_comments, True)
+    
+    def write(self, tmp_path, sentences):
+        path = str(tmp_path / "corpus.bin")
+        with open(path, "wb") as f:
+            write_corpus(f, sentences)
+        return path
+    
+    def test_round_trip(self, tmp_path):
+        # from a generator, as a stream of converted sentences would be written
+        with Corpus(self.write(tmp_path, (sentence for sentence in self.converted))) as corpus:
+            assert len(corpus) == len(self.converted)
+            read = list(corpus)
+        assert serialize_conllu(read, self.all_comments, True) == self.expected
+        # the very same graphs, copy nodes, children order and extra info edges included
+        assert [sentence_to_state(sentence) for sentence in read] == [sentence_to_state(sentence) for sentence in self.converted]
+        assert any(token.get_extra_info_edges() for sentence in read for token in sentence.values())
+    
+    def test_random_access(self, tmp_path):
+        with Corpus(self.write(tmp_path, self.converted)) as corpus:
+            for index in [5, 0, -1, 17, 5]:
+                assert serialize_conllu([corpus[index]], [[]]) == serialize_conllu([self.converted[index]], [[]])
+            # each read is a graph of its own
+            assert corpus[3] is not corpus[3]
+            with pytest.raises(IndexError):
+                corpus[len(self.converted)]
+            assert set(corpus.labels) == {rel for sentence in self.converted for token in sentence.values() for _, rel in token.get_new_relations()}
+    
+    def test_empty(self, tmp_path):
+        with Corpus(self.write(tmp_path, [])) as corpus:
+            assert len(corpus) == 0
+            assert list(corpus) == []
+    
+    def test_not_a_corpus(self, tmp_path):
+        path = tmp_path / "corpus.conllu"
+        path.write_text(self.expected)
+        with pytest.raises(ValueError):
+            Corpus(str(path))
@@ -0,0 +1,68 @@
+import pytest
+
+from pybart.graph_token import Token, MAX_COPIES, add_basic_edges, copy_node_id, sentence_to_state, sentence_from_state
+
+
+class TestToken:
+    def setup_method(self):
+        self.sentence = {0: Token(0, None, None, None, None, None, None, None, None, None)}
+        for i, (form, head, deprel) in enumerate([("John", 2, "nsubj"), ("ate", 0, "root"), ("apples", 2, "obj")]):
+            self.sentence[i + 1] = Token(i + 1, form, form.lower(), "_", "_", "_", head, deprel, "_", "_")
+        add_basic_edges(self.sentence)
+    
+    def test_fields(self):
+        token = self.sentence[1]
+        assert token.get_conllu_field("id") == 1
+        assert token.get_conllu_field("form") == "John"
+        token.set_conllu_field("lemma", "john")
+        assert token.get_conllu_fields() == (1, "John", "john", "_", "_", "_", 2, "nsubj", "_", "_")
+        assert token.get_conllu_string() == "1\tJohn\tjohn\t_\t_\t_\t2\tnsubj\t2:nsubj\t_"
+        with pytest.raises(KeyError):
+            token.get_conllu_field("no_such_field")
+        with pytest.raises(AttributeError):
+            token.no_such_attribute = None
+    
+    def test_children(self):
+        ate = self.sentence[2]
+        assert list(ate.get_children()) == [self.sentence[1], self.sentence[3]]
+        self.sentence[1].remove_edge("nsubj", ate)
+        assert list(ate.get_children()) == [self.sentence[3]]
+        self.sentence[1].add_edge("nsubj", ate, extra_info=1)
+        assert list(ate.get_children()) == [self.sentence[3], self.sentence[1]]
+        assert self.sentence[1].get_extra_info_edges() == {(ate, "nsubj"): 1}
+        assert self.sentence[3].get_extra_info_edges() == {}
+    
+    def test_state_round_trip(self):
+        self.sentence[1].add_edge("nsubj", self.sentence[3], extra_info=1)
+        copy = sentence_from_state(sentence_to_state(self.sentence))
+        assert [token.get_conllu_string() for token in copy.values()] == [token.get_conllu_string() for token in self.sentence.values()]
+        assert list(copy[2].get_children()) == [copy[1], copy[3]]
+        assert copy[1].get_extra_info_edges() == {(copy[3], "nsubj"): 1}
+        assert copy[1].get_edge_index() is copy[3].get_edge_index()
+        assert not copy[1].get_edge_index().is_changed()
+    
+    def test_many_copy_nodes(self):
+        ate = self.sentence[2]
+        copies = []
+        for nth in range(1, 11):
+            copies.append(ate.copy(new_id=copy_node_id(2, nth), head="_", deprel="_"))
+            copies[-1].add_edge("conj", ate)
+        assert [str(copy.get_conllu_field("id")) for copy in copies] == [f"2.{nth}" for nth in range(1, 11)]
+        assert sorted(copies[::-1]) == copies
+        assert copies[0] < copies[9] < self.sentence[3]
+        assert copy_node_id(copies[0].get_conllu_field("id")) == copies[1].get_conllu_field("id")
+        with pytest.raises(ValueError):
+            copy_node_id(2, MAX_COPIES + 1)
+        
+        for copy in copies:
+            self.sentence[copy.get_conllu_field("id")] = copy
+        restored = sentence_from_state(sentence_to_state(self.sentence))
+        assert [str(i) for i in restored] == [str(i) for i in self.sentence]
+        assert restored[copies[9].get_conllu_field("id")].get_conllu_string() == copies[9].get_conllu_string()
+    
+    def test_conllu_string_does_not_change_token(self):
+        john = self.sentence[1]
+        john.add_edge("nsubj:xsubj", self.sentence[3])
+        fields = john.get_conllu_fields()
+        assert john.get_conllu_string() == "1\tJohn\tjohn\t_\t_\t_\t2\tnsubj\t2:nsubj|3:nsubj:xsubj\t_"
+        assert john.get_conllu_fields() == fields
@@ -0,0 +1,141 @@
+import pathlib
+import random
+
+import pytest
+
+from pybart import api
+from pybart.cache import ConversionCache
+from pybart.conllu_wrapper import parse_conllu, serialize_conllu
+from pybart.converter import ConvsCanceler
+from pybart.incremental import BasicEdit, ConversionTrace, get_basic_sentence
+from pybart.stats import ConversionStats
+
+
+def edit_conllu(sentence_text, edits):
+    # the edits applied to the CoNLL-U text itself, for the expected (from scratch) conversion
+    columns = {"form": 1, "lemma": 2, "head": 6, "deprel": 7}
+    lines = [line.split() for line in sentence_text.split("\n")]
+    by_id = {line[0]: line for line in lines}
+    for token_id, field, value in edits:
+        by_id[str(token_id)][columns[field]] = str(value)
+    return "\n".join("\t".join(line) for line in lines)
+
+
+def random_edits(rng, sentence):
+    words = [token_id for token_id in sentence if (type(token_id) is int) and (token_id != 0)]
+    # (the root word keeps its head and deprel, the conversions expect a single root relation)
+    token_id = rng.choice([word for word in words if sentence[word].get_conllu_field("head") != 0])
+    edits = [BasicEdit(token_id, "deprel", rng.choice(["nsubj", "obj", "conj", "nmod", "advcl", "xcomp", "cop", "case"]))]
+    # a new head out of the word's subtree, so the heads still form a tree
+    subtree = {token_id}
+    for _ in words:
+        subtree |= {other for other in words if sentence[other].get_conllu_field("head") in subtree}
+    heads = [other for other in words if other not in subtree]
+    edits.append(BasicEdit(token_id, "head", rng.choice(heads)))
+    edits.append(BasicEdit(rng.choice(words), "form", "whose"))
+    return edits
+
+
+def count(stats, counter):
+    return sum(getattr(rule_stats, counter) for rule_stats in stats.rules.values())
+
+
+class TestReconvert:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.sentence_texts = [text.strip() for text in f.read().strip().split("\n\n")]
+    
+    def convert_text(self, text):
+        converted, _ = api.convert(parse_conllu(text)[0], True, True, True, float("inf"), False, False, False, False, False, ConvsCanceler())
+        return converted[0]
+    
+    def test_same_as_full_conversion(self):
+        rng = random.Random(0)
+        for text in self.sentence_texts:
+            text = "\n".join(line for line in text.split("\n") if not line.startswith("#"))
+            converted = self.convert_text(text)
+            edits = random_edits(rng, converted)
+            reconverted, changed = api.reconvert_bart_sentence(converted, edits, funcs_to_cancel=ConvsCanceler())
+            expected = api.convert_bart_conllu(edit_conllu(text, edits), funcs_to_cancel=ConvsCanceler())
+            assert serialize_conllu([reconverted], [[]], False) == expected
+            # the word of the new form changed, and the given sentence was left as it was
+            assert edits[-1].token_id in changed
+            assert serialize_conllu([converted], [[]], False) == api.convert_bart_conllu(text, funcs_to_cancel=ConvsCanceler())
+    
+    def test_basic_tree_of_converted(self):
+        text = "\n".join(line for line in self.sentence_texts[0].split("\n") if not line.startswith("#"))
+        basic = get_basic_sentence(self.convert_text(text))
+        assert serialize_conllu([basic], [[]], False) == serialize_conllu(parse_conllu(text)[0], [[]], False)
+    
+    def test_no_change(self):
+        converted = self.convert_text(self.sentence_texts[0])
+        form = converted[1].get_conllu_field("form")
+        assert api.reconvert_bart_sentence(converted, [(1, "form", "other"), (1, "form", form)]) == (converted, set())
+    
+    def test_undo_hits_cache(self):
+        cache = ConversionCache()
+        converted = self.convert_text(self.sentence_texts[0])
+        edited, _ = api.reconvert_bart_sentence(converted, [BasicEdit(1, "lemma", "other")], cache=cache)
+        undone, changed = api.reconvert_bart_sentence(edited, [BasicEdit(1, "lemma", converted[1].get_conllu_field("lemma"))], cache=cache)
+        assert cache.stats.memory_hits == 0
+        assert api.reconvert_bart_sentence(undone, [BasicEdit(1, "lemma", "other")], cache=cache)[1] == changed
+        assert cache.stats.memory_hits == 1
+    
+    def test_invalid_edits(self):
+        converted = self.convert_text(self.sentence_texts[0])
+        with pytest.raises(ValueError):
+            api.reconvert_bart_sentence(converted, [BasicEdit(0, "form", "x")])
+        with pytest.raises(ValueError):
+            api.reconvert_bart_sentence(converted, [BasicEdit(1, "deps", "2:x")])
+        with pytest.raises(ValueError):
+            api.reconvert_bart_sentence(converted, [BasicEdit(1, "head", len(converted) + 5)])
+        root_word = next(token_id for token_id, token in converted.items() if token.get_conllu_field("head") == 0)
+        child = next(token_id for token_id, token in converted.items() if token.get_conllu_field("head") == root_word)
+        with pytest.raises(ValueError):
+            api.reconvert_bart_sentence(converted, [BasicEdit(root_word, "head", child)])
+    
+    def test_trace_same_as_full_conversion(self):
+        rng = random.Random(0)
+        replays = 0
+        for text in self.sentence_texts:
+            text = "\n".join(line for line in text.split("\n") if not line.startswith("#"))
+            trace = ConversionTrace()
+            # (a new trace has the sentence converted in full)
+            converted, _ = api.reconvert_bart_sentence(parse_conllu(text)[0][0], [], funcs_to_cancel=ConvsCanceler(), trace=trace)
+            assert serialize_conllu([converted], [[]], False) == api.convert_bart_conllu(text, funcs_to_cancel=ConvsCanceler())
+            edits = random_edits(rng, converted)
+            stats = ConversionStats()
+            reconverted, _ = api.reconvert_bart_sentence(converted, edits, funcs_to_cancel=ConvsCanceler(), stats=stats, trace=trace)
+            assert serialize_conllu([reconverted], [[]], False) == api.convert_bart_conllu(edit_conllu(text, edits), funcs_to_cancel=ConvsCanceler())
+            replays += count(stats, "replays")
+        assert replays > 0
+    
+    def test_trace_replays(self):
+        words = [("He", 3, "nsubjpass"), ("was", 3, "auxpass"), ("admired", 0, "root"), ("by", 5, "case"), ("them", 3, "nmod"), ("and", 3, "cc"),
+                 ("I", 9, "nsubjpass"), ("was", 9, "auxpass"), ("seen", 3, "conj"), ("in", 12, "case"), ("the", 12, "det"), ("park", 9, "nmod")]
+        text = "\n".join(f"{i}\t{form}\t_\t_\tNN\t_\t{head}\t{deprel}\t_\t_" for i, (form, head, deprel) in enumerate(words, 1))
+        trace = ConversionTrace()
+        converted, _ = api.reconvert_bart_sentence(parse_conllu(text)[0][0], [], trace=trace)
+        for edits in ([BasicEdit(12, "head", 3)], [BasicEdit(11, "form", "a")], [BasicEdit(12, "head", 9)]):
+            text = edit_conllu(text, edits)
+            stats = ConversionStats()
+            converted, changed = api.reconvert_bart_sentence(converted, edits, stats=stats, trace=trace)
+            full_stats = ConversionStats()
+            api.reconvert_bart_sentence(parse_conllu(text)[0][0], [], stats=full_stats, trace=ConversionTrace())
+            assert serialize_conllu([converted], [[]], False) == api.convert_bart_conllu(text)
+            assert changed == {edits[0].token_id}
+            # the rules run in the same passes as in a full conversion, but some of the runs are replayed
+            assert count(stats, "calls") + count(stats, "replays") == count(full_stats, "calls")
+            assert 0 < count(stats, "calls") < count(full_stats, "calls")
+    
+    def test_trace_of_other_sentence(self):
+        trace = ConversionTrace()
+        api.reconvert_bart_sentence(self.convert_text(self.sentence_texts[0]), [], trace=trace)
+        converted = self.convert_text(self.sentence_texts[1])
+        stats = ConversionStats()
+        reconverted, _ = api.reconvert_bart_sentence(converted, [BasicEdit(1, "lemma", "other")], stats=stats, trace=trace)
+        assert (count(stats, "replays") == 0) and (trace.sentence is reconverted)
+        # and once the trace is of the sentence, edits which change nothing convert nothing
+        assert api.reconvert_bart_sentence(reconverted, [BasicEdit(1, "lemma", "other")], trace=trace) == (reconverted, set())
@@ -0,0 +1,53 @@
+import pickle
+import re
+
+from pybart.converter import add_eud_info, add_extra_info
+from pybart.graph_token import Token, add_basic_edges, sentence_to_state, sentence_from_state
+from pybart.labels import Label, LabelSource, get_label
+
+
+class TestLabel:
+    def test_parts(self):
+        label = get_label("nsubj:xcomp(INF)@advcl(NULL, to, UNC)#3+acl(REDUCED)#1")
+        assert label == "nsubj:xcomp(INF)@advcl(NULL, to, UNC)#3+acl(REDUCED)#1"
+        assert (label.relation, label.base, label.specifier) == ("nsubj:xcomp(INF)", "nsubj", "xcomp(INF)")
+        assert label.source == "advcl(NULL, to, UNC)#3+acl(REDUCED)#1"
+        assert label.source_info == LabelSource("advcl", ("NULL", "to"), True, 3)
+        
+        label = get_label("nmod")
+        assert (label.relation, label.base, label.specifier, label.source, label.source_info) == ("nmod", "nmod", None, None, None)
+        # the '@' preposition is part of the relation, and 'at' is kept as is
+        assert (get_label("nmod:@").specifier, get_label("nmod:@").source) == ("@", None)
+        assert get_label("nmod:@@conj(UNC)").source_info == LabelSource("conj", (), True, None)
+        assert get_label("nmod:at").relation == "nmod:at"
+    
+    def test_interned(self):
+        label = get_label("obl:tmod")
+        assert isinstance(label, Label)
+        assert get_label("obl:tmod") is label
+        assert get_label(label) is label
+        assert pickle.loads(pickle.dumps(label)) is label
+        assert {label: 1}["obl:tmod"] == 1
+        
+        is_match = re.compile("obl.*").match
+        assert label.matches(is_match) and label.matches(is_match)
+        assert not label.matches(re.compile("nmod").match)
+    
+    def test_edges_are_labels(self):
+        sentence = {0: Token(0, None, None, None, None, None, None, None, None, None),
+                    1: Token(1, "John", "John", "_", "_", "_", 2, "nsubj", "_", "_"),
+                    2: Token(2, "left", "leave", "_", "_", "_", 0, "root", "_", "_")}
+        add_basic_edges(sentence)
+        sentence[1].add_edge("nsubj:xsubj", sentence[2])
+        for token in sentence_from_state(sentence_to_state(sentence)).values():
+            assert all(isinstance(rel, Label) for _, rel in token.get_new_relations())
+        assert [type(rel) for _, rel in sentence[1].get_new_relations()] == [Label, Label]
+    
+    def test_label_building(self):
+        assert add_eud_info("nmod", "of") == "nmod:of"
+        assert add_eud_info("nmod:poss@conj(UNC)", "and") == "nmod:and@conj(UNC)"
+        assert add_eud_info("nmod:@", "and") == "nmod:and"
+        label = add_extra_info("nsubj", "advcl", phrase="to", iid=2, prevs="nsubj@acl(NULL)#1")
+        assert label == "nsubj@advcl(to)#2+acl(NULL)#1"
+        assert label.source_info == LabelSource("advcl", ("to",), False, 2)
+        assert add_extra_info("nmod:at", "conj", prevs="nmod:at") == "nmod:at@conj()"
@@ -0,0 +1,152 @@
+import re
+
+from pybart.conllu_wrapper import parse_conllu
+from pybart.graph_token import add_basic_edges
+from pybart.matcher import compile_pattern, compile_restriction, compile_restriction_lists, match, _match, seed_children, Restriction, \
+    restriction_requirement, SentenceSignature, join_name_spaces
+
+
+class TestCompilePattern:
+    patterns = ["^(seem|appear|be)$", "(^(?i:to)$)", "^(?i:by)$", "(^(TO)$)", "^(cc)$", "auxpass", "(?i:of)",
+                "(?!(^(?i:all)$)).", "^( depending|across)$"]
+    strings = ["seem", "seemed", "be", "To", "TO", "to", "tO", "by", "BY", "bye", "cc", "ccomp", "auxpass",
+               "auxpass@x", "Of", "offer", "all", "All", "ally", " depending", "depending", "across", ""]
+    
+    def test_same_as_re_match(self):
+        for pattern in self.patterns:
+            compiled = compile_pattern(pattern)
+            for string in self.strings:
+                assert bool(compiled(string)) == bool(re.match(pattern, string)), (pattern, string)
+    
+    def test_word_lists_become_set_lookups(self):
+        assert isinstance(compile_pattern("^(seem|appear|be)$").__self__, frozenset)
+        assert isinstance(compile_pattern("(^(TO)$)").__self__, frozenset)
+        assert not isinstance(getattr(compile_pattern("auxpass"), "__self__", None), frozenset)
+    
+    def test_no_pattern(self):
+        assert compile_pattern(None) is None
+
+
+class TestEdgeIndex:
+    text = "1\tJohn\tJohn\tPROPN\tNNP\t_\t2\tnsubj\t_\t_\n" \
+           "2\tate\teat\tVERB\tVBD\t_\t0\troot\t_\t_\n" \
+           "3\tand\tand\tCCONJ\tCC\t_\t4\tcc\t_\t_\n" \
+           "4\tdrank\tdrink\tVERB\tVBD\t_\t2\tconj\t_\t_\n" \
+           "5\ttea\ttea\tNOUN\tNN\t_\t4\tobj\t_\t_\n"
+    
+    def setup_method(self):
+        (self.sentence,), _ = parse_conllu(self.text)
+        add_basic_edges(self.sentence)
+    
+    def test_index_follows_edges(self):
+        edge_index = self.sentence[1].get_edge_index()
+        assert all(token.get_edge_index() is edge_index for token in self.sentence.values())
+        assert set(edge_index.get_edges("nsubj")) == {(self.sentence[1], self.sentence[2])}
+        
+        self.sentence[1].add_edge("nsubj", self.sentence[4])
+        assert len(edge_index.get_edges("nsubj")) == 2
+        self.sentence[1].replace_edge("nsubj", "obj", self.sentence[2], self.sentence[2])
+        assert set(edge_index.get_edges("nsubj")) == {(self.sentence[1], self.sentence[4])}
+        assert len(edge_index.get_edges("obj")) == 2
+        
+        copy_node = self.sentence[4].copy(new_id=4.1)
+        assert copy_node.get_edge_index() is edge_index
+        copy_node.add_edge("conj", self.sentence[2])
+        assert len(edge_index.get_edges("conj")) == 2
+        
+        self.sentence[3].remove_all_edges()
+        assert "cc" not in edge_index.get_labels()
+    
+    def test_seeding_keeps_results(self):
+        restrictions = [
+            [Restriction(name="father", nested=[[Restriction(name="subj", gov="nsubj"), Restriction(name="conj", gov="conj")]])],
+            [Restriction(name="father", nested=[[Restriction(name="obj", gov="obj")]])],
+            [Restriction(name="father", nested=[[Restriction(name="conj", gov="conj", nested=[[Restriction(gov="^cc$")]])]])],
+            [Restriction(name="father", nested=[[Restriction(gov="xcomp")]])],
+            [Restriction(name="father", xpos="VBD")],
+        ]
+        for restriction in restrictions:
+            seeded = match(self.sentence.values(), [restriction])
+            unseeded = _match(list(self.sentence.values()), compile_restriction_lists([restriction]), None)
+            assert seeded == unseeded, restriction
+        
+        assert match(self.sentence.values(), [restrictions[3]]) is None
+        assert seed_children(self.sentence.values(), compile_restriction_lists([restrictions[0]])) == [self.sentence[2]]
+    
+    def test_journal(self):
+        edge_index = self.sentence[1].get_edge_index()
+        edge_index.reset_journal()
+        assert not edge_index.is_changed()
+        self.sentence[1].replace_edge("nsubj", "nsubj", self.sentence[2], self.sentence[2])
+        assert not edge_index.is_changed()
+        self.sentence[1].add_edge("nsubj", self.sentence[4])
+        assert edge_index.is_changed()
+    
+    def test_signature(self):
+        edge_index = self.sentence[1].get_edge_index()
+        signature = SentenceSignature(self.sentence, edge_index)
+        restrictions = [
+            (Restriction(name="father", nested=[[Restriction(gov="nsubj", lemma="^(john|John)$"), Restriction(gov="conj")]]), True),
+            (Restriction(name="father", nested=[[Restriction(gov="conj", form="(?i:DRANK)")]]), True),
+            (Restriction(name="father", nested=[[Restriction(gov="conj", form="^(eats)$")]]), False),
+            (Restriction(name="father", nested=[[Restriction(gov="xcomp")], [Restriction(gov="obj")]]), True),
+            (Restriction(name="father", nested=[[Restriction(gov="xcomp")], [Restriction(gov="iobj")]]), False),
+            (Restriction(name="father", nested=[[Restriction(gov="xcomp")], [Restriction(xpos="NN")]]), True),
+        ]
+        for restriction, can_match in restrictions:
+            requirement = restriction_requirement(compile_restriction(restriction))
+            assert signature.meets(requirement) == can_match, restriction
+            if not can_match:
+                assert match(self.sentence.values(), [[restriction]]) is None
+        # an unconstrained restriction can match anywhere
+        assert restriction_requirement(compile_restriction(restrictions[-1][0])) == ()
+        
+        # it follows the edits of the sentence
+        requirement = restriction_requirement(compile_restriction(Restriction(gov="xcomp")))
+        assert not signature.meets(requirement)
+        self.sentence[5].add_edge("xcomp", self.sentence[4])
+        assert signature.meets(requirement)
+        requirement = restriction_requirement(compile_restriction(Restriction(form="^(tea)$", lemma="^(tea)$")))
+        assert signature.meets(requirement)
+
+
+class TestJoin:
+    # a run of adjectives, each one follows the previous
+    text = "\n".join(f"{i}\tw{i}\tw{i}\tADJ\tJJ\t_\t6\tamod\t_\t_" for i in range(1, 6)) + "\n" \
+        "6\tthings\tthing\tNOUN\tNNS\t_\t0\troot\t_\t_\n"
+    
+    def setup_method(self):
+        (self.sentence,), _ = parse_conllu(self.text)
+        add_basic_edges(self.sentence)
+    
+    def pairs(self, restriction_list):
+        ret = match(self.sentence.values(), [[Restriction(name="noun", nested=[restriction_list])]])
+        return sorted((ns["first"][0].get_conllu_field("id"), ns["second"][0].get_conllu_field("id")) for ns in ret) if ret else ret
+    
+    def test_cross_restrictions(self):
+        # every failing pair is dropped, even when it comes right after another failing one
+        assert self.pairs([Restriction(name="first", gov="amod"), Restriction(name="second", gov="amod", follows="first")]) == \
+            [(i, i + 1) for i in range(1, 5)]
+        assert self.pairs([Restriction(name="second", gov="amod"), Restriction(name="first", gov="amod", followed_by="second")]) == \
+            [(i, i + 1) for i in range(1, 5)]
+        assert self.pairs([Restriction(name="first", gov="amod"), Restriction(name="second", gov="amod", diff="first")]) == \
+            [(i, j) for i in range(1, 6) for j in range(1, 6) if i != j]
+        assert self.pairs([Restriction(name="first", gov="amod", form="w5"), Restriction(name="second", gov="amod", follows="first")]) is None
+    
+    def test_same_as_pairwise(self):
+        first = [{"first": (self.sentence[i], self.sentence[6], "amod")} for i in [1, 2, 3, 2]]
+        second = [{"second": (self.sentence[i], self.sentence[6], "amod")} for i in [4, 3, 2, 4]]
+        for restriction in [Restriction(name="second", follows="first"), Restriction(name="second", diff="first"), Restriction(name="second")]:
+            restriction = compile_restriction(restriction)
+            joined = join_name_spaces(first, second, restriction)
+            expected = []
+            for new in second:
+                for old in first:
+                    merged = {**old, **new}
+                    if ((not restriction.follows) or merged["second"][0].get_conllu_field("id") - 1 == merged["first"][0].get_conllu_field("id")) and \
+                            ((not restriction.diff) or merged["second"][0] != merged["first"][0]):
+                        expected.append(merged)
+            # equal name spaces are kept once, where the last of them is
+            expected = [name_space for i, name_space in enumerate(expected) if name_space not in expected[i + 1:]]
+            assert joined == expected, restriction
+        assert join_name_spaces([], second, compile_restriction(Restriction(name="second"))) == second[1:]
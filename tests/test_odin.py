@@ -0,0 +1,59 @@
+import io
+import json
+import pathlib
+
+from pybart import api
+from pybart.conllu_wrapper import parse_conllu
+
+
+def odin_docs(separator, prefix="", sentences_per_doc=8):
+    # odin documents of the well formed trees of the handcrafted tests, whose sentences are separated by the given text
+    with open(str(pathlib.Path(__file__).parent.absolute()) + "/handcrafted_tests.conllu") as f:
+        parsed, _ = parse_conllu(f.read())
+    trees = [[sentence[i] for i in range(1, len(sentence))] for sentence in parsed
+             if sorted(sentence) == list(range(len(sentence))) and
+             all(token.get_conllu_field("head") in sentence and token.get_conllu_field("head") != i for i, token in sentence.items() if i)]
+    
+    docs = []
+    for d in range(0, len(trees), sentences_per_doc):
+        text = prefix
+        odin_sentences = []
+        for tokens in trees[d:d + sentences_per_doc]:
+            if odin_sentences:
+                text += separator
+            starts, ends = [], []
+            for token in tokens:
+                if token is not tokens[0]:
+                    text += " "
+                starts.append(len(text))
+                text += token.get_conllu_field("form")
+                ends.append(len(text))
+            odin_sentences.append({
+                "words": [token.get_conllu_field("form") for token in tokens], "lemmas": [token.get_conllu_field("lemma") for token in tokens],
+                "tags": [token.get_conllu_field("xpos") for token in tokens], "startOffsets": starts, "endOffsets": ends,
+                "graphs": {"universal-basic": {
+                    "edges": [{"source": token.get_conllu_field("head") - 1, "destination": i, "relation": token.get_conllu_field("deprel")}
+                              for i, token in enumerate(tokens) if token.get_conllu_field("head") != 0],
+                    "roots": [i for i, token in enumerate(tokens) if token.get_conllu_field("head") == 0]}}})
+        docs.append({"id": "doc%d" % d, "text": text, "sentences": odin_sentences})
+    return docs
+
+
+class TestOdin:
+    def test_offsets(self):
+        for separator, prefix in ((" ", ""), ("\n\n", "  "), ("\n", "Title.\n")):
+            converted = api.convert_bart_odin({"documents": {doc["id"]: doc for doc in odin_docs(separator, prefix)}, "mentions": []})
+            copy_nodes = 0
+            for doc in converted["documents"].values():
+                for sentence in doc["sentences"]:
+                    copy_nodes += len(sentence["words"]) - len(sentence["graphs"]["universal-basic"]["edges"]) - len(sentence["graphs"]["universal-basic"]["roots"])
+                    assert [doc["text"][start:end] for start, end in zip(sentence["startOffsets"], sentence["endOffsets"])] == sentence["words"]
+            assert copy_nodes > 0
+    
+    def test_stream(self):
+        docs = odin_docs("\n")
+        expected = [api.convert_bart_odin(json.loads(json.dumps(doc))) for doc in docs]
+        for workers in (1, 2):
+            out_file = io.StringIO()
+            api.convert_bart_odin_stream(io.StringIO("".join(json.dumps(doc) + "\n" for doc in docs)), out_file, workers=workers, batch_size=2)
+            assert [json.loads(line) for line in out_file.getvalue().splitlines()] == expected
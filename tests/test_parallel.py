@@ -0,0 +1,54 @@
+import pathlib
+
+from pybart import api
+from pybart.converter import ConvsCanceler
+from pybart.conllu_wrapper import parse_conllu
+from pybart.parallel import balanced_chunks, global_iid_mappings
+
+
+class TestParallel:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            text = f.read()
+        # repeating the corpus makes the alternative ids (#iid) span all the chunks
+        cls.text = "\n\n".join([text.strip()] * 2) + "\n"
+
+    def test_balanced_chunks(self):
+        assert balanced_chunks([1] * 8, 4) == [(0, 2), (2, 4), (4, 6), (6, 8)]
+        assert balanced_chunks([10, 1, 1, 1, 1], 2) == [(0, 1), (1, 5)]
+        assert balanced_chunks([1, 1], 4) == [(0, 1), (1, 2)]
+        assert balanced_chunks([], 4) == []
+
+    def test_global_iid_mappings(self):
+        # chunk 0 holds sentences 0-1, chunk 1 holds sentences 2-3; logs are (pass, sentence, first iid, end iid)
+        mappings = global_iid_mappings([[(0, 1, 0, 2), (1, 0, 2, 3)], [(0, 0, 0, 1), (1, 1, 1, 2)]], [0, 2])
+        assert mappings == [{0: 0, 1: 1, 2: 3}, {0: 2, 1: 4}]
+        assert global_iid_mappings([[(0, 0, 0, 2)], []], [0, 1]) == [None, None]
+
+    def test_conllu_same_as_serial(self):
+        serial = api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler())
+        parallel = api.convert_bart_conllu(self.text, preserve_comments=True, funcs_to_cancel=ConvsCanceler(), workers=2)
+        assert ")#" in serial
+        assert parallel == serial
+
+    def test_tacred_same_as_serial(self):
+        sentences, _ = parse_conllu(self.text)
+        tacred = []
+        for sentence in sentences:
+            tokens = [sentence[i] for i in sorted(sentence) if i != 0]
+            if [token.get_conllu_field("id") for token in tokens] != list(range(1, len(tokens) + 1)):
+                continue
+            tacred.append({"token": [token.get_conllu_field("form") for token in tokens],
+                           "stanford_pos": [token.get_conllu_field("xpos") for token in tokens],
+                           "stanford_head": [token.get_conllu_field("head") for token in tokens],
+                           "stanford_deprel": [token.get_conllu_field("deprel") for token in tokens]})
+
+        def edges(converted):
+            return [[(token.get_conllu_field("id"), token.get_conllu_field("form"), [(head.get_conllu_field("id"), rel) for head, rel in token.get_new_relations()])
+                     for token in sentence.values()] for sentence in converted]
+
+        serial = api.convert_bart_tacred(tacred, funcs_to_cancel=ConvsCanceler())
+        parallel = api.convert_bart_tacred(tacred, funcs_to_cancel=ConvsCanceler(), workers=2)
+        assert edges(parallel) == edges(serial)
@@ -0,0 +1,112 @@
+import math
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+spacy = pytest.importorskip("spacy")
+np = pytest.importorskip("numpy")
+
+from spacy import attrs
+from spacy.tokens import Doc
+
+from pybart.api import Converter, convert_spacy_doc
+from pybart.converter import convert, ConvsCanceler
+from pybart.conllu_wrapper import parse_conllu, serialize_conllu
+from pybart.spacy_wrapper import parse_spacy_sent, serialize_spacy_doc
+
+# (form, tag, head, deprel) of two sentences, the second gets a copy node (of "flies", for the conjoined "from Serbia")
+sentences = [
+    [("He", "PRP", 2, "nsubj"), ("slept", "VBD", 0, "root"), (".", ".", 2, "punct")],
+    [("Bill", "NNP", 2, "nsubj"), ("flies", "VBZ", 0, "root"), ("to", "IN", 4, "case"), ("France", "NNP", 2, "nmod"),
+     ("and", "CC", 4, "cc"), ("from", "IN", 7, "case"), ("Serbia", "NNP", 4, "conj")],
+]
+
+
+def make_doc(nlp, sentences=sentences):
+    doc = Doc(nlp.vocab, words=[form for sentence in sentences for form, _, _, _ in sentence])
+    rows = [[((head - i - 1) if head else 0) % 2 ** 64, nlp.vocab.strings.add("ROOT" if head == 0 else deprel), nlp.vocab.strings.add(tag)]
+            for sentence in sentences for i, (_, tag, head, deprel) in enumerate(sentence)]
+    doc.from_array([attrs.HEAD, attrs.DEP, attrs.TAG], np.array(rows, dtype="uint64"))
+    return doc
+
+
+class TestSerializeSpacyDoc:
+    def test_serialize(self):
+        doc = make_doc(spacy.blank("en"))
+        parsed = [parse_spacy_sent(sent) for sent in doc.sents]
+        converted, _ = convert(parsed, True, True, True, math.inf, False, False, False, False, False, ConvsCanceler())
+        new_doc = serialize_spacy_doc(doc, converted)
+        
+        converted_tokens = [[token for iid, token in sentence.items() if iid != 0] for sentence in converted]
+        assert any(token.get_conllu_field("id") != int(token.get_conllu_field("id")) for token in converted_tokens[1])
+        assert [token.text for token in new_doc] == [token.get_conllu_field("form") for tokens in converted_tokens for token in tokens]
+        assert [len(sent) for sent in new_doc.sents] == [len(tokens) for tokens in converted_tokens]
+        assert new_doc.text.endswith(" ") is False
+        
+        # the original tokens keep their attributes, and copy nodes take those of the node they copy
+        offset = len(converted_tokens[0])
+        for i, token in enumerate(converted_tokens[1]):
+            copied = new_doc[offset + int(token.get_conllu_field("id")) - 1]
+            assert (new_doc[offset + i].tag_, new_doc[offset + i].dep_) == (copied.tag_, copied.dep_)
+            # (a copy node is headed by the node it copies)
+            assert new_doc[offset + i].head.i == (copied.head.i if i < len(sentences[1]) else copied.i)
+        
+        for tokens, start in ((converted_tokens[0], 0), (converted_tokens[1], offset)):
+            for i, token in enumerate(tokens):
+                assert len(new_doc[start + i]._.parent_list) == len(token.get_new_relations())
+
+
+def handcrafted_docs(nlp, sentences_per_doc=5):
+    # the well formed trees of the handcrafted tests, a few sentences per doc
+    with open(str(pathlib.Path(__file__).parent.absolute()) + "/handcrafted_tests.conllu") as f:
+        parsed, _ = parse_conllu(f.read())
+    trees = [[(sentence[i].get_conllu_field("form"), sentence[i].get_conllu_field("xpos"), sentence[i].get_conllu_field("head"), sentence[i].get_conllu_field("deprel"))
+              for i in range(1, len(sentence))]
+             for sentence in parsed if sorted(sentence) == list(range(len(sentence))) and
+             all(token.get_conllu_field("head") in sentence and token.get_conllu_field("head") != i for i, token in sentence.items() if i)]
+    return [make_doc(nlp, trees[i:i + sentences_per_doc]) for i in range(0, len(trees), sentences_per_doc)]
+
+
+def results(doc):
+    return ([token.text for token in doc],
+            [[(parent['head'].i, parent['rel'], parent['src'], parent['alt'], parent['unc']) for parent in token._.parent_list] for token in doc],
+            doc._.convs_done, serialize_conllu(doc._.parsed_doc, [[]] * len(doc._.parsed_doc)))
+
+
+class TestConverterComponent:
+    def test_pipe_same_as_call(self):
+        nlp = spacy.blank("en")
+        docs = handcrafted_docs(nlp)
+        converter = Converter()
+        called = [results(converter(doc)) for doc in docs]
+        piped = [results(doc) for doc in converter.pipe(docs, batch_size=4)]
+        # alternative ids are numbered per doc
+        assert sum(any(alt is not None for parents in parent_lists for _, _, _, alt, _ in parents) for _, parent_lists, _, _ in called) > 1
+        assert piped == called
+        assert Converter.get_max_convs(converter(docs[0])) == max(called[0][2])
+        assert convert_spacy_doc(docs[0])[2] == max(called[0][2])
+        # the results are on the docs, so the methods which used to take no doc say where they are
+        with pytest.raises(TypeError, match="convs_done"):
+            converter.get_max_convs()
+        with pytest.raises(TypeError, match="parsed_doc"):
+            converter.get_parsed_doc()
+    
+    def test_n_process(self):
+        nlp = spacy.blank("en")
+        docs = handcrafted_docs(nlp)
+        by_text = {doc.text: doc for doc in docs}
+        # a stand in for a parser, giving the handcrafted parse of each text
+        nlp.add_pipe(lambda doc: by_text[doc.text], name="parse")
+        nlp.add_pipe(Converter(), name="BART")
+        
+        expected = [results(nlp(doc.text)) for doc in docs]
+        assert [results(doc) for doc in nlp.pipe([doc.text for doc in docs], batch_size=3, n_process=2)] == expected
+    
+    def test_lazy_import(self):
+        # importing pybart (even its spaCy wrapper) imports neither spaCy nor NumPy, nor multiprocessing, until they are used
+        code = "import sys, pybart.api, pybart.spacy_wrapper; print(sorted(set(sys.modules) & {'spacy', 'numpy', 'multiprocessing'}))"
+        out = subprocess.run([sys.executable, "-c", code], cwd=str(pathlib.Path(__file__).parent.parent.absolute()),
+                             stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        assert out.strip() == "[]"
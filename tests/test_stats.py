@@ -0,0 +1,59 @@
+import re
+import pathlib
+import math
+
+from pybart.conllu_wrapper import parse_conllu, serialize_conllu
+from pybart.converter import convert, ConvsCanceler, get_conversion_plan
+from pybart.stats import ConversionStats
+
+
+class TestConversionStats:
+    @classmethod
+    def setup_class(cls):
+        dir_ = str(pathlib.Path(__file__).parent.absolute())
+        with open(dir_ + "/handcrafted_tests.conllu") as f:
+            cls.text = f.read()
+    
+    def convert(self, stats=None):
+        parsed, all_comments = parse_conllu(self.text)
+        converted, convs_done = convert(parsed, True, True, True, math.inf, False, False, False, False, False, ConvsCanceler(), stats=stats)
+        return serialize_conllu(converted, all_comments, True), convs_done
+    
+    def test_same_output(self):
+        assert self.convert(ConversionStats()) == self.convert()
+    
+    def test_counters(self):
+        stats = ConversionStats()
+        output, convs_done = self.convert(stats)
+        rules = stats.as_dict()
+        
+        # every rule of the plan ran (or was skipped) once per sentence pass, in the plan's order
+        assert list(rules) == [func.__name__ for func, _ in get_conversion_plan().conversions]
+        # a sentence runs one more pass than the ones that changed it (the pass that found it converged)
+        assert stats.sentence_passes == sum(convs_done) + len(convs_done)
+        assert all(counters["calls"] + counters["skips"] + counters["filtered"] == stats.sentence_passes for counters in rules.values())
+        # every rule is considered in the first pass, and only the ones with something new to read are later on,
+        #   but they run only in the sentences which have the labels and words they need
+        assert all(counters["calls"] + counters["filtered"] >= len(convs_done) for counters in rules.values())
+        assert sum(counters["skips"] for counters in rules.values()) > 0
+        assert sum(counters["filtered"] for counters in rules.values()) > 0
+        assert rules["eudpp_process_3wp"]["calls"] < len(convs_done)
+        assert all(counters["changes"] <= counters["calls"] for counters in rules.values())
+        assert rules["eud_conj_info"]["match_calls"] == rules["eud_conj_info"]["calls"]
+        assert rules["eud_conj_info"]["edges_added"] > 0
+        assert rules["eudpp_expand_pp_or_prep_conjunctions"]["nodes_added"] > 0
+        assert sum(counters["nodes_added"] for counters in rules.values()) == len(re.findall(r"^\d+\.\d+\t", output, re.M))
+    
+    def test_merge_and_report(self):
+        stats = ConversionStats()
+        self.convert(stats)
+        merged = ConversionStats()
+        merged.merge(stats)
+        merged.merge(stats)
+        assert merged.sentence_passes == 2 * stats.sentence_passes
+        assert merged.rules["eud_conj_info"].edges_added == 2 * stats.rules["eud_conj_info"].edges_added
+        
+        report = stats.report(top=5).split("\n")
+        assert len(report) == 1 + 5 + 1
+        times = [stats.rules[line.split()[0]].time for line in report[1:-1]]
+        assert times == sorted(times, reverse=True)
@@ -0,0 +1,70 @@
+import io
+import json
+import math
+import pathlib
+
+from pybart import api
+from pybart import conllu_wrapper
+from pybart.conllu_wrapper import parse_conllu, iter_tacred, sentence_to_edges
+from pybart.converter import convert, ConvsCanceler
+
+
+def tacred_examples():
+    with open(str(pathlib.Path(__file__).parent.absolute()) + "/handcrafted_tests.conllu") as f:
+        parsed, _ = parse_conllu(f.read())
+    examples = []
+    for sentence in parsed:
+        tokens = [sentence[i] for i in sorted(sentence) if i != 0]
+        if [token.get_conllu_field("id") for token in tokens] != list(range(1, len(tokens) + 1)):
+            continue
+        examples.append({"id": str(len(examples)),
+                         "token": [token.get_conllu_field("form") for token in tokens],
+                         "stanford_pos": [token.get_conllu_field("xpos") for token in tokens],
+                         "stanford_head": [token.get_conllu_field("head") for token in tokens],
+                         "stanford_deprel": [token.get_conllu_field("deprel") for token in tokens]})
+    return examples
+
+
+class TestTacredStream:
+    @classmethod
+    def setup_class(cls):
+        cls.examples = tacred_examples()
+    
+    def test_iter_tacred(self, monkeypatch):
+        # small reads, so examples are split between them
+        monkeypatch.setattr(conllu_wrapper, "TACRED_READ_SIZE", 7)
+        assert list(iter_tacred(io.StringIO(json.dumps(self.examples, indent=1)))) == self.examples
+        assert list(iter_tacred(io.StringIO("".join(json.dumps(example) + "\n" for example in self.examples)))) == self.examples
+        assert list(iter_tacred(io.StringIO(" [ ] "))) == []
+    
+    def test_stream(self):
+        # as if each example was converted alone
+        expected = []
+        for example in self.examples:
+            (sentence,) = api.convert_bart_tacred([example])
+            expected.append(sentence_to_edges(sentence, len(example["token"])))
+        assert any(copies for _, copies in expected)
+        assert any(")#" in rel for edges, _ in expected for _, _, rel in edges)
+        
+        for workers in (1, 2):
+            label_ids = dict()
+            converted = list(api.convert_bart_tacred_stream(iter(self.examples), batch_size=10, workers=workers, label_ids=label_ids))
+            labels = {label_id: label for label, label_id in label_ids.items()}
+            assert sorted(labels) == list(range(len(labels)))
+            assert [example["id"] for example in converted] == [example["id"] for example in self.examples]
+            assert [([(head, dep, labels[label_id]) for head, dep, label_id in example["bart_edges"]], example["bart_copy_nodes"]) for example in converted] == expected
+    
+    def test_state_nodes(self):
+        # a STATE node (3.1) and a copy of it (3.2, CopyOf=3), of the copula reconstruction
+        #   (which TACRED inputs do not get, as they have no root edge)
+        text = "\n".join("\t".join(fields) for fields in [
+            ("1", "The", "the", "DT", "DT", "_", "2", "det", "_", "_"), ("2", "street", "street", "NN", "NN", "_", "6", "nsubj", "_", "_"),
+            ("3", "is", "be", "VBZ", "VBZ", "_", "6", "cop", "_", "_"), ("4", "across", "across", "IN", "IN", "_", "6", "advmod", "_", "_"),
+            ("5", "from", "from", "IN", "IN", "_", "6", "case", "_", "_"), ("6", "you", "you", "PRP", "PRP", "_", "0", "root", "_", "_"),
+            ("7", "and", "and", "CC", "CC", "_", "6", "cc", "_", "_"), ("8", "aside", "aside", "IN", "IN", "_", "10", "advmod", "_", "_"),
+            ("9", "from", "from", "IN", "IN", "_", "10", "case", "_", "_"), ("10", "me", "me", "PRP", "PRP", "_", "6", "conj", "_", "_")])
+        (sentence,), _ = convert(parse_conllu(text)[0], True, True, True, math.inf, False, False, False, False, False, ConvsCanceler())
+        edges, copies = sentence_to_edges(sentence, 10)
+        assert copies == [-1, 2]
+        assert (-1, 10, "root") in edges
+        assert (10, 11, "conj:and") in edges